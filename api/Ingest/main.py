@@ -1,129 +1,321 @@
 from fastapi import FastAPI, File, UploadFile, Form
 from fastapi import HTTPException
+import asyncio
+import io
 import os
 import uuid
-from fastapi.responses import JSONResponse
-from .utils.tokenizer import extract_text_from_pdf, extract_text_from_csv, chunk_text, extract_cleanCSV_sentence, extract_text_from_txt
+from itertools import islice
+from typing import Iterator, List
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+import numpy as np
+from .utils.tokenizer import extract_pages_from_pdf, extract_text_from_csv, chunk_text, chunk_texts_by_tokens, extract_cleanCSV_sentence, extract_text_from_txt, extract_text_from_xlsx, CHUNK_MODE
+from .utils.pipeline import ChunkLike, IngestPipeline
+from .utils.jobs import get_ingest_job_manager
+from .utils.collection_ops import delete_where, truncate_collection
 from services.embedding_service import get_embedding_service
-import chromadb
+from services.embedding_cache import get_embedding_cache
+from services.embedding_compression import (
+    EMBEDDING_COMPRESSION_DTYPES,
+    EMBEDDING_COMPRESSION_METHODS,
+    configure_collection,
+    save_projection,
+)
+from services.lexical_index import ensure_lexical_index, get_lexical_index, iter_collection_documents
+from services.retrieval_cache import bump_collection_version, get_retrieval_cache
+from services.sparse_index import ensure_sparse_index, get_sparse_index, iter_collection_sparse
+from services.vector_store import get_vector_store
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Kích thước mỗi lần đọc file upload (bytes) khi stream xuống disk
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+SUPPORTED_EXTENSIONS = (".pdf", ".csv", ".txt", ".xlsx")
+# Thư mục chứa file embeddings export (raw float32) khi client yêu cầu return_embeddings
+INGEST_EXPORT_DIR = os.getenv("INGEST_EXPORT_DIR", "./tmp_uploads/exports")
+# append: chỉ thêm chunk mới; sync: thêm chunk mới và xoá chunk của source không còn trong file
+INGEST_MODES = ("append", "sync")
+
+
+async def save_upload_file(file: UploadFile, dest_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> int:
+    """Stream file upload xuống disk theo từng phần cố định, trả về số bytes đã ghi"""
+    size = 0
+    with open(dest_path, "wb") as f:
+        while True:
+            piece = await file.read(chunk_size)
+            if not piece:
+                break
+            f.write(piece)
+            size += len(piece)
+    return size
+
+
+# Số page PDF tokenize chung 1 lần gọi tokenizer khi CHUNK_MODE=token
+CHUNK_PAGE_BATCH = 16
+
+
+def chunk_texts(texts: List[str]) -> List[List[str]]:
+    """Chunk nhiều text theo CHUNK_MODE: char (RecursiveCharacterTextSplitter) hoặc token (tokenizer của model)"""
+    if CHUNK_MODE == "token":
+        embedding_service = get_embedding_service()
+        return chunk_texts_by_tokens(
+            texts, embedding_service.tokenizer, max_seq_length=embedding_service.max_seq_length
+        )
+    return [chunk_text(text) for text in texts]
+
+
+def iter_file_chunks(file_path: str, file_extension: str, clean_csv: bool = False) -> Iterator[ChunkLike]:
+    """Chọn extractor theo đuôi file và yield chunk lazily (PDF kèm metadata page)"""
+    if file_extension == ".pdf":
+        pages = extract_pages_from_pdf(file_path)
+        while True:
+            batch = list(islice(pages, CHUNK_PAGE_BATCH))
+            if not batch:
+                break
+            for (page_number, _), page_chunks in zip(batch, chunk_texts([text for _, text in batch])):
+                for chunk in page_chunks:
+                    yield chunk, {"page": page_number}
+    elif file_extension == ".csv":
+        if clean_csv:
+            yield from extract_cleanCSV_sentence(file_path)
+        else:
+            yield from extract_text_from_csv(file_path)
+    elif file_extension == ".txt":
+        yield from extract_text_from_txt(file_path)
+    elif file_extension == ".xlsx":
+        yield from extract_text_from_xlsx(file_path)
+
 
 def create_ingest_app() -> FastAPI:
     ingest_app = FastAPI()
-    # Dùng EmbeddingService thay vì tự load model
-    embedding_service = get_embedding_service()
-    chroma_client = chromadb.PersistentClient(path=os.getenv("CHROMADB_PATH", "./chroma_db"))
+    # Model, cache và Chroma client được lấy lazy qua singleton factory (warm-up ở lifespan
+    # của app chính), tạo app không load gì nặng
+    job_manager = get_ingest_job_manager()
+
+    async def _job_response(job, wait: bool):
+        """Trả job id ngay; nếu wait=True thì await job xong (không block event loop)"""
+        if wait:
+            await asyncio.wrap_future(job.future)
+            job_data = job.to_dict()
+            if job_data["status"] != "completed":
+                raise HTTPException(status_code=500, detail=f"Ingest job {job_data['status']}: {job_data['error']}")
+            return job_data["result"]
+        return {
+            "status": job.status,
+            "job_id": job.job_id,
+            "collection": job.collection_name,
+            "status_url": f"/ingest-service/jobs/{job.job_id}",
+        }
+
+    async def _prepare_collection(collection_name: str, compression: str, compression_dim: int, compression_dtype: str):
+        """Tạo collection nếu chưa có và chốt setting nén embedding trước khi nhận job (sai setting → 400)"""
+        if compression is not None and compression not in EMBEDDING_COMPRESSION_METHODS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported compression '{compression}', expected one of {EMBEDDING_COMPRESSION_METHODS}",
+            )
+        if compression_dtype is not None and compression_dtype not in EMBEDDING_COMPRESSION_DTYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported compression_dtype '{compression_dtype}', expected one of {EMBEDDING_COMPRESSION_DTYPES}",
+            )
+
+        def prepare():
+            collection = get_vector_store().get_or_create_collection(name=collection_name)
+            return configure_collection(collection, compression, compression_dim, compression_dtype)
+
+        try:
+            return await asyncio.to_thread(prepare)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def _run_ingest(
+        job, collection_name: str, chunks, source: str, mode: str, return_embeddings: bool, compressor
+    ) -> dict:
+        """
+        Chạy pipeline trên worker thread: append (thêm chunk mới) hoặc sync (thêm mới + xoá chunk đã mất).
+        Kết quả chỉ là summary; embeddings (nếu được yêu cầu) được ghi ra file float32 để tải riêng.
+        Vector được nén theo setting của collection (compressor) trước khi ghi.
+        """
+        embeddings_path = None
+        if return_embeddings:
+            os.makedirs(INGEST_EXPORT_DIR, exist_ok=True)
+            embeddings_path = os.path.join(INGEST_EXPORT_DIR, f"{job.job_id}.f32")
+            job.update_progress(embeddings_path=embeddings_path)
+        collection = get_vector_store().get_or_create_collection(name=collection_name)
+        # Collection có từ trước khi bật lexical index → build index từ documents hiện có trước
+        lexical_index = ensure_lexical_index(collection)
+        embedding_service = get_embedding_service()
+        sparse_index = ensure_sparse_index(collection, embedding_service, get_embedding_cache())
+        pipeline = IngestPipeline(
+            embedding_service,
+            collection,
+            cancel_event=job.cancel_event,
+            progress_callback=job.update_progress,
+            embedding_cache=get_embedding_cache(),
+            compressor=None if compressor.is_identity else compressor,
+            on_compressor_fit=lambda fitted: save_projection(collection_name, fitted),
+            lexical_index=lexical_index,
+            sparse_index=sparse_index,
+            # Batch đã ghi thấy được ngay qua retrieval → không phục vụ / cache kết quả cũ giữa job
+            on_write=lambda: bump_collection_version(collection_name),
+        )
+        try:
+            if mode == "sync":
+                result = pipeline.sync(chunks, metadata={"source": source}, embeddings_path=embeddings_path)
+            else:
+                result = pipeline.run(chunks, metadata={"source": source}, embeddings_path=embeddings_path)
+        finally:
+            # Bump cuối: lexical / sparse index chỉ commit khi pipeline kết thúc (kể cả job lỗi / bị huỷ)
+            bump_collection_version(collection_name)
+        print(
+            f"[Ingest] {source}: {result['added_count']} added, {result['skipped_count']} skipped, "
+            f"timings: {result['timings']}"
+        )
+        response = {
+            "status": "success",
+            "collection": collection_name,
+            "mode": mode,
+            "chunk_count": result["chunk_count"],
+            "added_count": result["added_count"],
+            "skipped_count": result["skipped_count"],
+            "deleted_count": result.get("deleted_count", 0),
+            "cache_hits": result["cache_hits"],
+            "encode_stats": result["encode_stats"],
+            "embedding_dim": result["embedding_dim"],
+            "compression": compressor.to_dict(),
+            "ids": result["ids"],
+            "timings": result["timings"],
+        }
+        if embeddings_path:
+            response["embeddings_url"] = f"/ingest-service/jobs/{job.job_id}/embeddings"
+        return response
+
     @ingest_app.post("/ingest_file")
     async def ingest_file(
         file: UploadFile = File(...),
         collection_name: str = Form("default_collection"),
         clean_csv: bool = Form(False),
+        mode: str = Form("append"),
+        return_embeddings: bool = Form(False),
+        wait: bool = Form(False),
+        compression: str = Form(None),
+        compression_dim: int = Form(None),
+        compression_dtype: str = Form(None),
     ):
+        file_extension = os.path.splitext(file.filename)[1]
+        if file_extension not in SUPPORTED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail="Unsupported file type")
+        if mode not in INGEST_MODES:
+            raise HTTPException(status_code=400, detail=f"Unsupported mode '{mode}', expected one of {INGEST_MODES}")
+        # Setting nén chỉ áp dụng khi collection còn rỗng; collection đã có setting thì giữ nguyên
+        compressor = await _prepare_collection(collection_name, compression, compression_dim, compression_dtype)
     
-        # save file to temporary directory  
+        # Stream file xuống temporary directory (không đọc toàn bộ vào memory)
         tmp_dir = "./tmp_uploads"
         os.makedirs(tmp_dir, exist_ok=True)
-        tmp_path = os.path.join(tmp_dir, file.filename)
-        
-        with open(tmp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        
-        # Parse file
-        file_extension = os.path.splitext(file.filename)[1]
-        chunks = []
-        if file_extension == ".pdf":
-            text = extract_text_from_pdf(tmp_path)
-            chunks = chunk_text(text)
-        elif file_extension == ".csv":
-            if clean_csv:
-                chunks = extract_cleanCSV_sentence(tmp_path)
-            else:
-                chunks = extract_text_from_csv(tmp_path)
-        elif file_extension == ".txt":
-            chunks = extract_text_from_txt(tmp_path)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-            
-        print("=== DEBUG CHUNKS ===")
-        print("file_extension:", file_extension)
-        print("type(chunks):", type(chunks))
-        print("len(chunks):", len(chunks))
-        if chunks:
-            print("type(chunks[0]):", type(chunks[0]))
-            print("first chunk sample (truncated):", repr(chunks[0][:200]))
-            if len(chunks) > 1:
-                print("second chunk sample (truncated):", repr(chunks[1][:200]))
-        print("===============")
-        # Embed chunks sử dụng EmbeddingService
-        embeddings_list = []
-        try:
-            embeddings_numpy = embedding_service.encode(
-                chunks, 
-                batch_size=64,
-                show_progress_bar=True,
-                convert_to_numpy=True
-            )
-            embeddings_list = embeddings_numpy.tolist()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error embedding chunks: {e}")
-        collection = chroma_client.get_or_create_collection(name=collection_name)
+        tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}_{file.filename}")
+        file_size = await save_upload_file(file, tmp_path)
+        print(f"[Ingest] Saved upload {file.filename} ({file_size} bytes)")
+        filename = file.filename
 
-        ids = [str(uuid.uuid4()) for _ in chunks]
+        # Parse → embed → store chạy trên worker thread của job queue
+        def work(job):
+            chunks = iter_file_chunks(tmp_path, file_extension, clean_csv)
+            return _run_ingest(job, collection_name, chunks, filename, mode, return_embeddings, compressor)
 
-        collection.add(
-            documents=chunks,
-            embeddings=embeddings_list,
-            ids=ids,
-            metadatas=[{"source": file.filename} for _ in chunks],
+        job = job_manager.submit(
+            "file", filename, collection_name, work, cleanup=lambda: os.remove(tmp_path)
         )
-        
-        os.remove(tmp_path)
-
+        return await _job_response(job, wait)
 
-        return {
-        "status": "success",
-        "embeddings": embeddings_list,
-        "collection": collection_name,
-        "chunk_count": len(chunks),
-        "ids": ids,  
-    }
-    
-
-    
     @ingest_app.post("/ingest_text")
     async def ingest_text(
         text: str = Form(...),
         collection_name: str = Form("default_collection"),
+        source: str = Form("text"),
+        mode: str = Form("append"),
+        return_embeddings: bool = Form(False),
+        wait: bool = Form(False),
+        compression: str = Form(None),
+        compression_dim: int = Form(None),
+        compression_dtype: str = Form(None),
     ):
-        chunks = chunk_text(text)
-        # Embed chunks sử dụng EmbeddingService
-        embeddings_numpy = embedding_service.encode(
-            chunks,
-            batch_size=64,
-            show_progress_bar=True,
-            convert_to_numpy=True
-        )
-        embeddings_list = embeddings_numpy.tolist()
-        collection = chroma_client.get_or_create_collection(name=collection_name)
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        collection.add(
-            documents=chunks,
-            embeddings=embeddings_list,
-            ids=ids,
-            metadatas=[{"source": "text"} for _ in chunks],
+        if mode not in INGEST_MODES:
+            raise HTTPException(status_code=400, detail=f"Unsupported mode '{mode}', expected one of {INGEST_MODES}")
+        compressor = await _prepare_collection(collection_name, compression, compression_dim, compression_dtype)
+
+        def work(job):
+            chunks = chunk_texts([text])[0]
+            job.update_progress(chunks_expected=len(chunks))
+            return _run_ingest(job, collection_name, chunks, source, mode, return_embeddings, compressor)
+
+        job = job_manager.submit("text", source, collection_name, work)
+        return await _job_response(job, wait)
+
+    @ingest_app.get("/jobs")
+    async def list_jobs(limit: int = 50):
+        """Danh sách ingest job gần nhất (không kèm result)"""
+        return {"jobs": [job.to_dict(include_result=False) for job in job_manager.list_jobs(limit)]}
+
+    @ingest_app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        """Trạng thái job: số chunk, throughput, ETA và result khi hoàn thành"""
+        job = job_manager.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+        return job.to_dict()
+
+    @ingest_app.get("/jobs/{job_id}/embeddings")
+    async def download_job_embeddings(job_id: str, format: str = "npy"):
+        """
+        Tải embeddings của các chunk mới (cùng thứ tự với ids trong result).
+        format=npy: file .npy (float32, shape [added_count, embedding_dim]); format=f32: raw float32.
+        """
+        job = job_manager.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+        job_data = job.to_dict()
+        if job_data["status"] != "completed" or not job.embeddings_path or not os.path.exists(job.embeddings_path):
+            raise HTTPException(status_code=404, detail=f"No embeddings exported for job '{job_id}'")
+        count = job_data["result"]["added_count"]
+        dim = job_data["result"]["embedding_dim"] or 0
+        headers = {"X-Embedding-Count": str(count), "X-Embedding-Dim": str(dim)}
+        if format == "f32":
+            return FileResponse(
+                job.embeddings_path,
+                media_type="application/octet-stream",
+                filename=f"{job_id}.f32",
+                headers=headers,
+            )
+        if format != "npy":
+            raise HTTPException(status_code=400, detail="format must be 'npy' or 'f32'")
+
+        # Header .npy + stream nội dung raw float32 (không load file vào memory)
+        npy_header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            npy_header, {"descr": "<f4", "fortran_order": False, "shape": (count, dim)}
         )
-        return {
-        "status": "success",
-        "embeddings": embeddings_list,
-        "collection": collection_name,
-        "chunk_count": len(chunks),
-        "ids": ids,
-    }
+
+        def iter_npy():
+            yield npy_header.getvalue()
+            with open(job.embeddings_path, "rb") as f:
+                while True:
+                    piece = f.read(UPLOAD_CHUNK_SIZE)
+                    if not piece:
+                        break
+                    yield piece
+
+        headers["Content-Disposition"] = f'attachment; filename="{job_id}.npy"'
+        return StreamingResponse(iter_npy(), media_type="application/octet-stream", headers=headers)
+
+    @ingest_app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        """Huỷ job; các batch đã ghi vào collection trước khi huỷ vẫn được giữ lại"""
+        job = job_manager.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+        return job.to_dict(include_result=False)
     
     @ingest_app.delete("/clean_collection")
     async def clean_collection(
@@ -132,35 +324,20 @@ def create_ingest_app() -> FastAPI:
         """
         Xóa tất cả documents trong collection ChromaDB.
         Dùng để clean collection trước khi embedding lại, tránh duplicate.
+        Collection được drop và tạo lại với cùng metadata/configuration.
         """
         try:
             # Kiểm tra collection có tồn tại không
+            def truncate():
+                result = truncate_collection(get_vector_store(), collection_name)
+                for index in (get_lexical_index(collection_name), get_sparse_index(collection_name)):
+                    if index is not None and index.exists:
+                        index.clear()
+                bump_collection_version(collection_name)
+                return result
+
             try:
-                collection = chroma_client.get_collection(name=collection_name)
-                # Đếm số documents trước khi xóa
-                count_before = collection.count()
-                
-                # Lấy tất cả IDs để xóa
-                all_data = collection.get()
-                if all_data and all_data.get("ids"):
-                    collection.delete(ids=all_data["ids"])
-                    count_after = collection.count()
-                    
-                    return {
-                        "status": "success",
-                        "collection": collection_name,
-                        "deleted_count": count_before,
-                        "remaining_count": count_after,
-                        "message": f"Đã xóa {count_before} documents từ collection '{collection_name}'"
-                    }
-                else:
-                    return {
-                        "status": "success",
-                        "collection": collection_name,
-                        "deleted_count": 0,
-                        "remaining_count": 0,
-                        "message": f"Collection '{collection_name}' đã trống"
-                    }
+                count_before, collection = await asyncio.to_thread(truncate)
             except Exception as e:
                 # Collection không tồn tại
                 return {
@@ -168,7 +345,139 @@ def create_ingest_app() -> FastAPI:
                     "collection": collection_name,
                     "message": f"Collection '{collection_name}' không tồn tại: {str(e)}"
                 }
+            if count_before == 0:
+                return {
+                    "status": "success",
+                    "collection": collection_name,
+                    "deleted_count": 0,
+                    "remaining_count": 0,
+                    "message": f"Collection '{collection_name}' đã trống"
+                }
+            return {
+                "status": "success",
+                "collection": collection_name,
+                "deleted_count": count_before,
+                "remaining_count": await asyncio.to_thread(collection.count),
+                "message": f"Đã xóa {count_before} documents từ collection '{collection_name}'"
+            }
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error cleaning collection: {e}")
+
+    @ingest_app.delete("/delete_documents")
+    async def delete_documents(
+        collection_name: str = Form(...),
+        source: str = Form(...),
+    ):
+        """
+        Xóa các documents của một source (metadata "source") theo từng trang ids.
+        """
+        try:
+            collection = await asyncio.to_thread(lambda: get_vector_store().get_collection(name=collection_name))
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' không tồn tại: {e}")
+        indexes = [
+            index for index in (get_lexical_index(collection_name), get_sparse_index(collection_name))
+            if index is not None and index.exists
+        ]
+
+        def on_delete(ids):
+            for index in indexes:
+                index.delete(ids)
+            bump_collection_version(collection_name)
+
+        try:
+            deleted = await asyncio.to_thread(delete_where, collection, {"source": source}, on_delete=on_delete)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error deleting documents: {e}")
+        finally:
+            bump_collection_version(collection_name)
+        return {
+            "status": "success",
+            "collection": collection_name,
+            "source": source,
+            "deleted_count": deleted,
+            "remaining_count": await asyncio.to_thread(collection.count),
+        }
+
+    @ingest_app.post("/lexical_index/rebuild")
+    async def rebuild_lexical_index(
+        collection_name: str = Form(...),
+        wait: bool = Form(False),
+    ):
+        """Build lại BM25 index của collection từ documents trong Chroma (chạy như 1 ingest job)"""
+        lexical_index = get_lexical_index(collection_name)
+        if lexical_index is None:
+            raise HTTPException(status_code=400, detail="Lexical index is disabled (LEXICAL_INDEX_ENABLED=false)")
+        try:
+            collection = get_vector_store().get_collection(name=collection_name)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' không tồn tại: {e}")
+
+        def work(job):
+            count = lexical_index.rebuild(iter_collection_documents(collection))
+            bump_collection_version(collection_name)
+            return {"status": "success", "collection": collection_name, "indexed_count": count, **lexical_index.stats()}
+
+        job = job_manager.submit("lexical_index", "rebuild", collection_name, work)
+        return await _job_response(job, wait)
+
+    @ingest_app.get("/lexical_index/{collection_name}")
+    async def lexical_index_stats(collection_name: str):
+        """Số segment / document / postings của BM25 index"""
+        lexical_index = get_lexical_index(collection_name)
+        if lexical_index is None:
+            return {"enabled": False}
+        if not lexical_index.exists:
+            return {"enabled": True, "built": False}
+        return {"enabled": True, "built": True, **await asyncio.to_thread(lexical_index.stats)}
+
+    @ingest_app.post("/sparse_index/rebuild")
+    async def rebuild_sparse_index(
+        collection_name: str = Form(...),
+        wait: bool = Form(False),
+    ):
+        """Encode lại documents trong Chroma để build sparse (bge-m3 lexical weights) index"""
+        sparse_index = get_sparse_index(collection_name)
+        if sparse_index is None:
+            raise HTTPException(status_code=400, detail="Sparse index is disabled (SPARSE_INDEX_ENABLED=false)")
+        try:
+            collection = get_vector_store().get_collection(name=collection_name)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' không tồn tại: {e}")
+
+        def work(job):
+            pages = iter_collection_sparse(collection, get_embedding_service(), get_embedding_cache())
+            count = sparse_index.rebuild(pages)
+            bump_collection_version(collection_name)
+            return {"status": "success", "collection": collection_name, "indexed_count": count, **sparse_index.stats()}
+
+        job = job_manager.submit("sparse_index", "rebuild", collection_name, work)
+        return await _job_response(job, wait)
+
+    @ingest_app.get("/sparse_index/{collection_name}")
+    async def sparse_index_stats(collection_name: str):
+        """Số segment / document / postings của sparse index"""
+        sparse_index = get_sparse_index(collection_name)
+        if sparse_index is None:
+            return {"enabled": False}
+        if not sparse_index.exists:
+            return {"enabled": True, "built": False}
+        return {"enabled": True, "built": True, **await asyncio.to_thread(sparse_index.stats)}
+
+    @ingest_app.get("/embedding_cache")
+    async def embedding_cache_stats():
+        """Thống kê cache embeddings trên disk: số entry, dung lượng, hit rate"""
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **embedding_cache.stats()}
+
+    @ingest_app.get("/retrieval_cache")
+    async def retrieval_cache_stats():
+        """Thống kê cache kết quả retrieval của process này: số entry, hit rate, số lần bump version"""
+        retrieval_cache = get_retrieval_cache()
+        if retrieval_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **retrieval_cache.stats()}
         
     return ingest_app
\ No newline at end of file
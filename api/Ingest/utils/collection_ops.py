@@ -0,0 +1,89 @@
+import os
+from typing import Callable, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from services.embedding_compression import delete_projection
+
+load_dotenv()
+
+# Số id mỗi lần get/delete trên Chroma (tránh 1 request khổng lồ)
+CHROMA_PAGE_SIZE = int(os.getenv("CHROMA_PAGE_SIZE", 1000))
+
+
+def iter_ids(collection, where: Dict = None, page_size: int = None) -> Iterator[List[str]]:
+    """
+    Duyệt ids của collection theo từng trang (chỉ lấy ids, không load documents/embeddings).
+    """
+    page_size = page_size or CHROMA_PAGE_SIZE
+    offset = 0
+    while True:
+        page = collection.get(where=where, limit=page_size, offset=offset, include=[])
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        yield ids
+        if len(ids) < page_size:
+            break
+        offset += len(ids)
+
+
+def delete_ids(collection, ids: List[str], batch_size: int = None) -> int:
+    """Xoá ids theo từng batch, trả về số id đã xoá"""
+    batch_size = batch_size or CHROMA_PAGE_SIZE
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        collection.delete(ids=batch)
+        deleted += len(batch)
+    return deleted
+
+
+def delete_where(
+    collection, where: Dict, page_size: int = None, on_delete: Callable[[List[str]], object] = None
+) -> int:
+    """
+    Xoá mọi document khớp filter (ví dụ {"source": "books.csv"}) theo từng trang ids,
+    không bao giờ load documents/embeddings vào memory. on_delete(ids) được gọi sau mỗi trang
+    (đồng bộ index phụ như lexical index).
+    """
+    page_size = page_size or CHROMA_PAGE_SIZE
+    deleted = 0
+    while True:
+        # Trang vừa lấy bị xoá ngay nên luôn đọc lại từ offset 0
+        ids = collection.get(where=where, limit=page_size, include=[]).get("ids") or []
+        if not ids:
+            break
+        collection.delete(ids=ids)
+        if on_delete is not None:
+            on_delete(ids)
+        deleted += len(ids)
+        if len(ids) < page_size:
+            break
+    return deleted
+
+
+def truncate_collection(vector_store, name: str):
+    """
+    Xoá toàn bộ dữ liệu bằng cách drop + tạo lại collection với cùng metadata/configuration
+    (nhanh hơn nhiều so với get toàn bộ ids rồi delete). vector_store: VectorStore (Chroma / NumPy).
+    PCA projection cũ bị xoá theo: collection mới fit lại ở lần ingest đầu tiên.
+
+    Returns:
+        (số document trước khi truncate, collection mới)
+    """
+    collection = vector_store.get_collection(name=name)
+    count = collection.count()
+    metadata = collection.metadata
+    configuration = getattr(collection, "configuration", None)
+    vector_store.delete_collection(name=name)
+    delete_projection(name)
+    try:
+        new_collection = vector_store.create_collection(
+            name=name, metadata=metadata, configuration=configuration
+        )
+    except Exception as e:
+        # Configuration đọc ra không phải lúc nào cũng dùng lại được để create → giữ metadata
+        print(f"[Ingest] Recreate '{name}' with configuration failed ({e}), using metadata only")
+        new_collection = vector_store.create_collection(name=name, metadata=metadata)
+    return count, new_collection
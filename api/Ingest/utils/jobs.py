@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .pipeline import IngestCancelled
+
+load_dotenv()
+
+# Số ingest job chạy song song (mỗi job đã tự pipeline parse/embed/store bên trong)
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", 1))
+# Số job đã kết thúc được giữ lại để tra cứu qua GET /jobs/{id}
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 100))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class IngestJob:
+    """
+    Trạng thái của một ingest job: tiến độ (chunk), throughput, ETA và kết quả.
+    Progress được cập nhật từ worker thread qua update_progress().
+    """
+
+    def __init__(self, kind: str, source: str, collection_name: str):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.source = source
+        self.collection_name = collection_name
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks_parsed = 0
+        self.chunks_done = 0
+        self.chunks_added = 0
+        self.chunks_skipped = 0
+        self.batches_done = 0
+        self.parse_done = False
+        # Tổng số chunk nếu biết trước (ví dụ ingest_text đã chunk xong trước khi chạy)
+        self.chunks_expected: Optional[int] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict] = None
+        # File embeddings export (raw float32) nếu client yêu cầu return_embeddings
+        self.embeddings_path: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def update_progress(self, **progress):
+        with self._lock:
+            for key, value in progress.items():
+                setattr(self, key, value)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, object]:
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = (now - self.started_at) if self.started_at else 0.0
+            throughput = self.chunks_done / elapsed if elapsed > 0 else 0.0
+            # Với file, tổng số chunk chỉ biết chắc khi extractor đã chạy hết file
+            chunks_total = self.chunks_parsed if self.parse_done else self.chunks_expected
+            eta = None
+            if self.status == JOB_RUNNING and chunks_total is not None and throughput > 0:
+                eta = round((chunks_total - self.chunks_done) / throughput, 2)
+            data = {
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "source": self.source,
+                "collection": self.collection_name,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "chunks_parsed": self.chunks_parsed,
+                "chunks_done": self.chunks_done,
+                "chunks_added": self.chunks_added,
+                "chunks_skipped": self.chunks_skipped,
+                "chunks_total": chunks_total,
+                "batches_done": self.batches_done,
+                "elapsed_seconds": round(elapsed, 2),
+                "throughput_chunks_per_sec": round(throughput, 2),
+                "eta_seconds": eta,
+                "error": self.error,
+            }
+            if include_result and self.status == JOB_COMPLETED:
+                data["result"] = self.result
+            return data
+
+
+def _remove_artifacts(job: IngestJob):
+    """Xoá file export của job (khi job lỗi/huỷ hoặc bị đẩy khỏi history)"""
+    if job.embeddings_path and os.path.exists(job.embeddings_path):
+        try:
+            os.remove(job.embeddings_path)
+        except OSError as e:
+            print(f"[Jobs] Could not remove {job.embeddings_path}: {e}")
+
+
+class IngestJobManager:
+    """
+    Job queue cho ingest: submit trả về job ngay, việc parse/embed/store chạy trên
+    ThreadPoolExecutor với INGEST_MAX_WORKERS worker, không block event loop của uvicorn.
+    """
+
+    def __init__(self, max_workers: int = None, history: int = None):
+        self.max_workers = max_workers or INGEST_MAX_WORKERS
+        self.history = history or INGEST_JOB_HISTORY
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="ingest-job"
+        )
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        source: str,
+        collection_name: str,
+        work: Callable[[IngestJob], Dict],
+        cleanup: Callable[[], None] = None,
+    ) -> IngestJob:
+        """
+        Đưa job vào queue.
+
+        Args:
+            work: Hàm chạy trên worker thread, nhận IngestJob (để đọc cancel_event và
+                  cập nhật progress) và trả về dict kết quả
+            cleanup: Hàm dọn dẹp (ví dụ xoá file tạm), luôn được gọi khi job kết thúc
+        """
+        job = IngestJob(kind, source, collection_name)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        job.future = self._executor.submit(self._run, job, work, cleanup)
+        print(f"[Jobs] Queued {kind} job {job.job_id} ({source} → {collection_name})")
+        return job
+
+    def _run(self, job: IngestJob, work: Callable[[IngestJob], Dict], cleanup: Callable[[], None]):
+        try:
+            if job.cancel_event.is_set():
+                if job.status != JOB_CANCELLED:
+                    job.update_progress(status=JOB_CANCELLED, finished_at=time.time())
+                return None
+            job.update_progress(status=JOB_RUNNING, started_at=time.time())
+            result = work(job)
+            job.update_progress(status=JOB_COMPLETED, result=result, finished_at=time.time())
+            print(f"[Jobs] Job {job.job_id} completed: {job.chunks_done} chunks")
+            return result
+        except IngestCancelled:
+            job.update_progress(status=JOB_CANCELLED, finished_at=time.time())
+            _remove_artifacts(job)
+            print(f"[Jobs] Job {job.job_id} cancelled after {job.chunks_done} chunks")
+        except Exception as e:
+            job.update_progress(status=JOB_FAILED, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+            _remove_artifacts(job)
+            print(f"[Jobs] Job {job.job_id} failed: {type(e).__name__}: {e}")
+        finally:
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"[Jobs] Cleanup error for job {job.job_id}: {e}")
+        return None
+
+    def _evict_finished(self):
+        """Giữ tối đa `history` job đã kết thúc (bỏ job cũ nhất trước)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            _remove_artifacts(self._jobs.pop(job_id))
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[IngestJob]:
+        with self._lock:
+            return list(self._jobs.values())[-limit:][::-1]
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Huỷ job: job đang chờ sẽ không chạy, job đang chạy dừng sau batch hiện tại"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status not in FINISHED_STATUSES:
+            job.cancel_event.set()
+            # Job chưa chạy: đánh dấu huỷ ngay, worker sẽ bỏ qua và chỉ chạy cleanup
+            if job.status == JOB_QUEUED:
+                job.update_progress(status=JOB_CANCELLED, finished_at=time.time())
+        return job
+
+    def shutdown(self, wait: bool = False):
+        """
+        Huỷ mọi job chưa xong. Không dùng cancel_futures: job đang chờ vẫn đi qua _run, thấy
+        cancel_event thì bỏ qua work nhưng vẫn chạy cleanup (xoá file upload tạm) và resolve future
+        (request wait=True nhận trạng thái cancelled thay vì CancelledError).
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.status not in FINISHED_STATUSES]
+        for job in jobs:
+            self.cancel(job.job_id)
+        self._executor.shutdown(wait=wait)
+
+
+@lru_cache(maxsize=1)
+def get_ingest_job_manager() -> IngestJobManager:
+    """
+    Singleton factory cho IngestJobManager.
+    """
+    return IngestJobManager()
@@ -0,0 +1,463 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.embedding_compression import EMBEDDING_PCA_FIT_SAMPLES
+from .collection_ops import delete_ids, iter_ids
+
+load_dotenv()
+
+# Số chunk mỗi batch đi qua pipeline (embed + collection.add)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 256))
+# Số batch tối đa nằm chờ giữa 2 stage → giới hạn memory
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", 2))
+
+# Một chunk có thể là text thuần hoặc (text, metadata riêng của chunk)
+ChunkLike = Union[str, Tuple[str, Dict]]
+
+_DONE = object()
+
+
+def normalize_for_hash(text: str) -> str:
+    """Chuẩn hoá text trước khi hash: gộp whitespace để khác biệt format không đổi id"""
+    return " ".join(text.split())
+
+
+def make_chunk_id(text: str, source: str = "") -> str:
+    """
+    Id xác định theo nội dung: sha256(source + normalized text).
+    Cùng chunk của cùng source luôn có cùng id → ingest lại không bị duplicate.
+    """
+    digest = hashlib.sha256(f"{source}\x00{normalize_for_hash(text)}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class IngestCancelled(Exception):
+    """Raise khi pipeline bị huỷ giữa chừng qua cancel_event"""
+
+
+class IngestPipeline:
+    """
+    Pipeline parse → embed → store chạy chồng lên nhau:
+    - Thread parse: đọc chunk từ generator của extractor, gom thành batch
+    - Thread embed: encode từng batch bằng EmbeddingService (kèm sparse weights nếu có sparse_index)
+    - Thread gọi run(): ghi từng batch vào Chroma collection
+
+    Các stage nối với nhau bằng queue có giới hạn (INGEST_QUEUE_DEPTH), nên memory
+    chỉ phụ thuộc batch size, không phụ thuộc kích thước file.
+
+    Id của chunk được tính từ nội dung + source (make_chunk_id); chunk đã có trong
+    collection bị bỏ qua trước khi embed nên ingest lại cùng file là idempotent.
+    """
+
+    def __init__(
+        self,
+        embedding_service,
+        collection,
+        batch_size: int = None,
+        token_budget: int = None,
+        queue_depth: int = None,
+        cancel_event: threading.Event = None,
+        progress_callback: Callable[..., None] = None,
+        embedding_cache=None,
+        compressor=None,
+        on_compressor_fit: Callable[..., None] = None,
+        lexical_index=None,
+        sparse_index=None,
+        on_write: Callable[[], None] = None,
+    ):
+        self.embedding_service = embedding_service
+        self.collection = collection
+        self.batch_size = batch_size or INGEST_BATCH_SIZE
+        # Tổng token mỗi forward pass của encode_bulk (None = EMBEDDING_BATCH_TOKEN_BUDGET)
+        self.token_budget = token_budget
+        self.queue_depth = queue_depth or INGEST_QUEUE_DEPTH
+        # Event để huỷ từ bên ngoài (job queue); các batch đã ghi vẫn được giữ lại
+        self.cancel_event = cancel_event
+        # Callback nhận keyword: chunks_parsed, parse_done, chunks_done, batches_done
+        self.progress_callback = progress_callback
+        # EmbeddingCache trên disk (tuỳ chọn): chunk đã từng embed thì đọc lại thay vì encode
+        self.embedding_cache = embedding_cache
+        # EmbeddingCompressor của collection (giảm chiều / float16) áp dụng ngay trước khi ghi;
+        # PCA chưa fit thì gom các batch đầu để fit, on_compressor_fit(fitted) lưu projection trước khi dùng
+        # (trả về compressor khác = dùng projection đã được lưu trước đó)
+        self.compressor = compressor
+        self.on_compressor_fit = on_compressor_fit
+        # LexicalIndex (BM25) của collection: index cùng batch vừa ghi vào Chroma, commit cuối lần chạy
+        self.lexical_index = lexical_index
+        # SparseIndex (bge-m3 lexical weights): embed bằng encode_hybrid để có cả dense lẫn sparse
+        self.sparse_index = sparse_index
+        # Gọi sau mỗi batch được ghi / xoá khỏi collection (vd. tăng version của retrieval cache)
+        self.on_write = on_write
+
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._timings = {"parse": 0.0, "embed": 0.0, "compress": 0.0, "store": 0.0}
+        self._cache_hits = 0
+        self._encode_stats = {"tokens": 0, "padded_tokens": 0, "encode_batches": 0, "encode_seconds": 0.0}
+        # Id đã gặp trong lần chạy này (dedup trong file) và số chunk bị bỏ qua
+        self._seen_ids: set = set()
+        self._skipped = 0
+        # Nếu đã biết trước toàn bộ ids hiện có (sync mode) thì không cần hỏi Chroma từng batch
+        self._known_ids: Optional[set] = None
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Put có timeout để không bị kẹt khi stage phía sau đã dừng vì lỗi"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _report(self, **progress):
+        if self.progress_callback is not None:
+            self.progress_callback(**progress)
+
+    def _written(self):
+        if self.on_write is not None:
+            self.on_write()
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise IngestCancelled("Ingest cancelled")
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _existing_ids(self, ids: List[str]) -> set:
+        """Các id đã có trong collection (chỉ lấy ids, không load documents/embeddings)"""
+        if not ids:
+            return set()
+        if self._known_ids is not None:
+            return self._known_ids.intersection(ids)
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+    def _parse_stage(self, chunks: Iterable[ChunkLike], base_metadata: Dict, out_q: queue.Queue):
+        parsed = 0
+        try:
+            iterator = iter(chunks)
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                documents, metadatas, ids = [], [], []
+                exhausted = True
+                for item in iterator:
+                    if isinstance(item, tuple):
+                        text, extra = item
+                    else:
+                        text, extra = item, None
+                    if not text or not text.strip():
+                        continue
+                    parsed += 1
+                    metadata = {**base_metadata, **extra} if extra else dict(base_metadata)
+                    chunk_id = make_chunk_id(text, str(metadata.get("source", "")))
+                    # Chunk trùng nội dung trong cùng lần ingest
+                    if chunk_id in self._seen_ids:
+                        self._skipped += 1
+                        continue
+                    self._seen_ids.add(chunk_id)
+                    documents.append(text)
+                    metadatas.append(metadata)
+                    ids.append(chunk_id)
+                    if len(documents) >= self.batch_size:
+                        exhausted = False
+                        break
+
+                # Bỏ các chunk đã có trong collection → không embed lại
+                existing = self._existing_ids(ids)
+                if existing:
+                    keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+                    self._skipped += len(ids) - len(keep)
+                    documents = [documents[i] for i in keep]
+                    metadatas = [metadatas[i] for i in keep]
+                    ids = [ids[i] for i in keep]
+                self._timings["parse"] += time.perf_counter() - t0
+
+                self._report(chunks_parsed=parsed, parse_done=exhausted)
+                if documents and not self._put(out_q, (documents, metadatas, ids)):
+                    return
+                if exhausted:
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(out_q, _DONE)
+
+    def _encode_bulk(self, documents: List[str]) -> Tuple[np.ndarray, Optional[List[Dict[int, float]]]]:
+        """encode_bulk (batch theo độ dài token) và cộng dồn thống kê padding/tokens"""
+        if self.sparse_index is not None:
+            embeddings, sparse, stats = self.embedding_service.encode_bulk(
+                documents, token_budget=self.token_budget, return_stats=True, return_sparse=True
+            )
+        else:
+            embeddings, stats = self.embedding_service.encode_bulk(
+                documents, token_budget=self.token_budget, return_stats=True
+            )
+            sparse = None
+        self._encode_stats["tokens"] += stats["tokens"]
+        self._encode_stats["padded_tokens"] += stats["padded_tokens"]
+        self._encode_stats["encode_batches"] += stats["batches"]
+        self._encode_stats["encode_seconds"] += stats["seconds"]
+        return embeddings, sparse
+
+    def _encode(self, documents: List[str]) -> Tuple[np.ndarray, Optional[List[Dict[int, float]]]]:
+        """
+        Encode 1 batch → (embeddings, sparse weights hoặc None); nếu có cache thì tra bulk trước,
+        chỉ encode phần miss (thiếu dense, hoặc thiếu sparse khi có sparse_index) rồi ghi lại
+        """
+        if self.embedding_cache is None:
+            return self._encode_bulk(documents)
+        model_key = self.embedding_service.cache_key
+        cached = self.embedding_cache.get_many(model_key, documents)
+        cached_sparse = (
+            self.embedding_cache.get_sparse_many(model_key, documents)
+            if self.sparse_index is not None else [{}] * len(documents)
+        )
+        misses = [i for i, (vector, weights) in enumerate(zip(cached, cached_sparse)) if vector is None or weights is None]
+        self._cache_hits += len(documents) - len(misses)
+        sparse = list(cached_sparse) if self.sparse_index is not None else None
+        if not misses:
+            return np.stack(cached), sparse
+        missing_docs = [documents[i] for i in misses]
+        encoded, encoded_sparse = self._encode_bulk(missing_docs)
+        self.embedding_cache.put_many(model_key, missing_docs, encoded)
+        if encoded_sparse is not None:
+            self.embedding_cache.put_sparse_many(model_key, missing_docs, encoded_sparse)
+            for row, i in enumerate(misses):
+                sparse[i] = encoded_sparse[row]
+        if len(misses) == len(documents):
+            return encoded, sparse
+        embeddings = np.empty((len(documents), encoded.shape[1]), dtype=encoded.dtype)
+        for row, i in enumerate(misses):
+            embeddings[i] = encoded[row]
+        missed = set(misses)
+        for i, vector in enumerate(cached):
+            if i not in missed:
+                embeddings[i] = vector
+        return embeddings, sparse
+
+    def _embed_stage(self, in_q: queue.Queue, out_q: queue.Queue):
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = in_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                documents, metadatas, ids = item
+                t0 = time.perf_counter()
+                embeddings, sparse = self._encode(documents)
+                self._timings["embed"] += time.perf_counter() - t0
+                if not self._put(out_q, (documents, metadatas, ids, embeddings, sparse)):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(out_q, _DONE)
+
+    def _fit_compressor(self, batches: List[np.ndarray]):
+        t0 = time.perf_counter()
+        sample = np.concatenate(batches, axis=0)
+        if not self.compressor.fit_once(sample, on_fit=self.on_compressor_fit):
+            return  # Job khác đã fit projection trong lúc gom mẫu
+        self._timings["compress"] += time.perf_counter() - t0
+        print(f"[Ingest] Fitted {self.compressor.method} projection to {self.compressor.dim} dims on {len(sample)} chunks")
+
+    def _summarize_encode_stats(self) -> Dict[str, float]:
+        """Padding ratio và tokens/sec của toàn bộ lần chạy (chỉ tính chunk thực sự được encode)"""
+        stats = self._encode_stats
+        padded, seconds = stats["padded_tokens"], stats["encode_seconds"]
+        return {
+            "tokens": stats["tokens"],
+            "encode_batches": stats["encode_batches"],
+            "padding_ratio": round(1 - stats["tokens"] / padded, 4) if padded else 0.0,
+            "tokens_per_sec": round(stats["tokens"] / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+    def run(
+        self,
+        chunks: Iterable[ChunkLike],
+        metadata: Dict = None,
+        embeddings_path: str = None,
+    ) -> Dict[str, object]:
+        """
+        Chạy pipeline cho toàn bộ chunks và trả về kết quả tổng hợp.
+
+        Args:
+            chunks: Iterable (thường là generator) các chunk text hoặc (text, metadata)
+            metadata: Metadata chung gắn vào mọi chunk, ví dụ {"source": filename}
+            embeddings_path: Nếu có, ghi embeddings của các chunk mới (raw float32, row-major,
+                cùng thứ tự với ids, đã qua compressor nếu có) vào file này theo từng batch
+                thay vì giữ trong memory
+
+        Returns:
+            Dict gồm ids (chunk mới được thêm), chunk_count, added_count, skipped_count,
+            batch_count, cache_hits, encode_stats (padding ratio, tokens/sec), embedding_dim
+            và timings (giây)
+        """
+        start = time.perf_counter()
+        base_metadata = metadata or {}
+        parsed_q: queue.Queue = queue.Queue(maxsize=self.queue_depth)
+        embedded_q: queue.Queue = queue.Queue(maxsize=self.queue_depth)
+
+        parse_thread = threading.Thread(
+            target=self._parse_stage, args=(chunks, base_metadata, parsed_q), daemon=True
+        )
+        embed_thread = threading.Thread(
+            target=self._embed_stage, args=(parsed_q, embedded_q), daemon=True
+        )
+        parse_thread.start()
+        embed_thread.start()
+
+        ids: List[str] = []
+        batch_count = 0
+        embedding_dim = None
+        embeddings_file = open(embeddings_path, "wb") if embeddings_path else None
+        # Batch giữ lại chờ đủ mẫu để fit PCA
+        pending: list = []
+
+        def store(documents, metadatas, batch_ids, embeddings, sparse):
+            nonlocal batch_count, embedding_dim
+            if self.compressor is not None:
+                t0 = time.perf_counter()
+                embeddings = self.compressor.transform(embeddings)
+                self._timings["compress"] += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            self.collection.add(
+                documents=documents,
+                embeddings=embeddings,
+                ids=batch_ids,
+                metadatas=metadatas,
+            )
+            if self.lexical_index is not None:
+                self.lexical_index.add(batch_ids, documents)
+            if self.sparse_index is not None:
+                self.sparse_index.add(batch_ids, sparse)
+            self._timings["store"] += time.perf_counter() - t0
+            self._written()
+            batch_count += 1
+            ids.extend(batch_ids)
+            embedding_dim = embeddings.shape[1]
+            if embeddings_file is not None:
+                embeddings_file.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+            self._report(
+                chunks_done=len(ids) + self._skipped,
+                chunks_added=len(ids),
+                chunks_skipped=self._skipped,
+                batches_done=batch_count,
+            )
+            print(f"[Ingest] Stored batch {batch_count}: {len(documents)} chunks (total {len(ids)})")
+
+        def flush_pending():
+            if self.compressor.needs_fit:
+                self._fit_compressor([batch[3] for batch in pending])
+            for batch in pending:
+                store(*batch)
+            pending.clear()
+
+        try:
+            while True:
+                try:
+                    item = embedded_q.get(timeout=0.1)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    self._check_cancelled()
+                    continue
+                if item is _DONE:
+                    break
+                self._check_cancelled()
+                if self.compressor is not None and (pending or self.compressor.needs_fit):
+                    pending.append(item)
+                    fit_samples = max(EMBEDDING_PCA_FIT_SAMPLES, self.compressor.min_fit_samples)
+                    if sum(len(batch[2]) for batch in pending) >= fit_samples:
+                        flush_pending()
+                    continue
+                store(*item)
+            if pending and self._error is None:
+                # File nhỏ hơn EMBEDDING_PCA_FIT_SAMPLES: fit trên toàn bộ chunk của lần ingest
+                # (ít hơn min_fit_samples thì fit raise, chưa batch nào được ghi vào collection)
+                flush_pending()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            parse_thread.join()
+            embed_thread.join()
+            if embeddings_file is not None:
+                embeddings_file.close()
+            # Batch đã ghi vào Chroma (kể cả khi huỷ / lỗi giữa chừng) cũng phải có trong lexical index
+            if self.lexical_index is not None:
+                self.lexical_index.commit()
+            if self.sparse_index is not None:
+                self.sparse_index.commit()
+
+        if self._error is not None:
+            raise self._error
+
+        self._report(
+            chunks_done=len(ids) + self._skipped,
+            chunks_added=len(ids),
+            chunks_skipped=self._skipped,
+        )
+        result = {
+            "ids": ids,
+            "chunk_count": len(ids) + self._skipped,
+            "added_count": len(ids),
+            "skipped_count": self._skipped,
+            "batch_count": batch_count,
+            "cache_hits": self._cache_hits,
+            "encode_stats": self._summarize_encode_stats(),
+            "embedding_dim": embedding_dim,
+            "timings": {
+                **{k: round(v, 3) for k, v in self._timings.items()},
+                "total": round(time.perf_counter() - start, 3),
+            },
+        }
+        return result
+
+    def sync(
+        self,
+        chunks: Iterable[ChunkLike],
+        metadata: Dict,
+        embeddings_path: str = None,
+    ) -> Dict[str, object]:
+        """
+        Đồng bộ collection với phiên bản mới của một source (metadata["source"]):
+        chỉ embed + add chunk mới, sau đó xoá các chunk của source không còn xuất hiện.
+        Chunk cũ chỉ bị xoá sau khi add xong nên collection luôn online trong lúc sync.
+        """
+        source = metadata["source"]
+        t0 = time.perf_counter()
+        existing: set = set()
+        for page in iter_ids(self.collection, where={"source": source}):
+            existing.update(page)
+        self._known_ids = existing
+        list_time = time.perf_counter() - t0
+
+        result = self.run(chunks, metadata=metadata, embeddings_path=embeddings_path)
+
+        t0 = time.perf_counter()
+        stale = list(existing - self._seen_ids)
+        deleted = delete_ids(self.collection, stale)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(stale)
+        if self.sparse_index is not None:
+            self.sparse_index.delete(stale)
+        if deleted:
+            self._written()
+        result["deleted_count"] = deleted
+        result["timings"]["list_existing"] = round(list_time, 3)
+        result["timings"]["delete"] = round(time.perf_counter() - t0, 3)
+        print(f"[Ingest] Sync {source}: {result['added_count']} added, {deleted} deleted")
+        return result
@@ -1,14 +1,13 @@
 # api/chat.py
+import asyncio
 from fastapi import APIRouter, Form, HTTPException, Depends
 from services.rag_service import get_rag_service
 from services.conversation_service import get_conversation_service
 from utils.redis_conn import get_redis_connection
 
 router = APIRouter(prefix="/chat", tags=["chat"])
-
-redis_connection = get_redis_connection()
-conv_service = get_conversation_service()
-rag_service = get_rag_service()
+# Service được lấy qua singleton factory trong từng handler (không khởi tạo lúc import);
+# lifespan của app chính warm-up trước để request đầu tiên không phải chờ load model
 
 @router.post("/conversations")
 async def create_conversation(
@@ -16,6 +15,7 @@ async def create_conversation(
     title: str = Form(None),
 ):
     """Tạo conversation mới"""
+    conv_service = get_conversation_service()
     conversation_id = await conv_service.create_conversation(user_id, title)
     return {"conversation_id": conversation_id, "status": "created"}
 
@@ -27,9 +27,14 @@ async def chat(
     collection_name: str = Form("default_collection"),
     top_k: int = Form(3),  # Số lượng contexts retrieve từ ChromaDB (mặc định: 5)
     isFollowUp: bool = Form(False),
+    rerank_budget_ms: float = Form(None),  # Latency budget của bước rerank (None = RERANK_BUDGET_MS)
 ):
     """Chat với RAG + context"""
     import time
+    redis_connection = get_redis_connection()
+    conv_service = get_conversation_service()
+    # Khởi tạo lần đầu (lazy mode) / chờ warm-up đang load model (eager) trên thread, không chặn event loop
+    rag_service = await asyncio.to_thread(get_rag_service)
     timings = {}
     start_total = time.perf_counter()
     
@@ -76,6 +81,7 @@ async def chat(
         top_k=top_k,
         redis_cache=redis_connection,
         previous_queries=previous_queries,  # Truyền previous queries vào
+        rerank_budget_ms=rerank_budget_ms,
     )
     timings["rag_decide_and_generate"] = (time.perf_counter() - t0) * 1000
 
@@ -131,6 +137,7 @@ async def get_messages(
     limit: int = 50,
 ):
     """Lấy lịch sử messages của conversation"""
+    conv_service = get_conversation_service()
     cursor = conv_service.db.messages.find(
         {"conversation_id": conversation_id}
     ).sort("timestamp", -1).limit(limit)
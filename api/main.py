@@ -1,13 +1,45 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from .Ingest.main import create_ingest_app
+from .Ingest.utils.jobs import get_ingest_job_manager
 from .chat.chat import router as chat_router
+from .startup import STARTUP_MODE, StartupState, warm_up
 from dotenv import load_dotenv
 from utils.mongodb_conn import get_mongodb_connection
 from utils.redis_conn import get_redis_connection
+from services.embedding_batcher import get_embedding_batcher
+from services.embedding_service import get_embedding_service
+from services.rerank_service import get_rerank_service
 load_dotenv()
-mongodb_conn = get_mongodb_connection()
-redis_conn = get_redis_connection()
-app = FastAPI(title="RAG Backend API")
+
+startup_state = StartupState(STARTUP_MODE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Import app không kết nối DB hay load model; eager mode warm-up nền sau khi server nhận request
+    warm_up_task = None
+    if STARTUP_MODE == "eager":
+        warm_up_task = asyncio.create_task(warm_up(startup_state))
+    else:
+        print("[Startup] Lazy mode: services initialize on first use")
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    t0 = time.perf_counter()
+    get_ingest_job_manager().shutdown()
+    # Chỉ dừng embedding service nếu đã được load (lazy mode có thể chưa bao giờ dùng tới)
+    if get_embedding_service.cache_info().currsize:
+        get_embedding_service().shutdown()
+    if get_rerank_service.cache_info().currsize and get_rerank_service() is not None:
+        get_rerank_service().shutdown()
+    print(f"[Shutdown] Services stopped in {time.perf_counter() - t0:.2f} s")
+
+
+app = FastAPI(title="RAG Backend API", lifespan=lifespan)
 # Mount ingest thành sub-app
 ingest_app = create_ingest_app()
 app.mount("/ingest-service", ingest_app)
@@ -16,12 +48,29 @@ app.include_router(chat_router)
 
 @app.get("/health")
 async def health():
-    if not mongodb_conn.check_connection():
+    """Liveness: MongoDB và Redis còn kết nối được không"""
+    if not await get_mongodb_connection().check_connection():
         return {"status": "error", "message": "MongoDB connection failed"}
-    if not redis_conn.check_connection():
+    if not get_redis_connection().check_connection():
         return {"status": "error", "message": "Redis connection failed"}
     return {"status": "ok", "message": "RAG Backend is running"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: warm-up đã xong chưa, kèm thời gian khởi tạo từng component (503 nếu chưa ready)"""
+    return JSONResponse(status_code=200 if startup_state.ready else 503, content=startup_state.to_dict())
+
+@app.get("/metrics/embedding")
+async def embedding_metrics():
+    """Metrics của micro-batcher query embedding: phân bố batch size, queue delay, encode time"""
+    metrics = get_embedding_batcher().metrics()
+    # Client mode: thêm thống kê gom batch của embedding server dùng chung
+    if get_embedding_service.cache_info().currsize:
+        service = get_embedding_service()
+        if hasattr(service, "server_stats"):
+            metrics["server"] = await asyncio.to_thread(service.server_stats)
+    return metrics
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from services.embedding_cache import get_embedding_cache
+from services.embedding_service import get_embedding_service
+from services.lexical_index import ensure_lexical_index
+from services.rag_service import RAG_RETRIEVAL_MODE, get_rag_service
+from services.rerank_service import get_rerank_service
+from services.sparse_index import ensure_sparse_index
+from services.vector_store import get_vector_store
+from utils.mongodb_conn import get_mongodb_connection
+from utils.redis_conn import get_redis_connection
+
+load_dotenv()
+
+# eager: warm-up toàn bộ service lúc startup (chạy nền, /ready báo khi xong)
+# lazy: không warm-up, service khởi tạo ở lần dùng đầu tiên (test, CLI tool)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager").lower()
+# Các collection mở sẵn handle lúc warm-up (phân tách bằng dấu phẩy)
+WARMUP_COLLECTIONS = [
+    name.strip() for name in os.getenv("WARMUP_COLLECTIONS", "default_collection").split(",") if name.strip()
+]
+
+
+class StartupState:
+    """Trạng thái khởi tạo của app: từng component mất bao lâu, lỗi gì, đã ready chưa"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.ready = mode == "lazy"
+        self.finished = mode == "lazy"
+        self.started_at: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+        self.components: Dict[str, Dict[str, object]] = {}
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "mode": self.mode,
+            "finished": self.finished,
+            "total_seconds": self.total_seconds,
+            "components": self.components,
+        }
+
+
+def _warm_vector_store():
+    """Mở collection warm-up (NumPy backend: mmap segment, không copy dữ liệu)"""
+    store = get_vector_store()
+    opened = []
+    for name in WARMUP_COLLECTIONS:
+        try:
+            store.get_collection(name=name)
+            opened.append(name)
+        except Exception as e:
+            # Collection chưa được ingest thì bỏ qua, không phải lỗi startup
+            print(f"[Startup] Collection '{name}' not available: {e}")
+    return {"backend": store.backend, "collections": opened}
+
+
+def _warm_embedding():
+    service = get_embedding_service()
+    # 1 lần encode giả để load weights/kernels, request đầu tiên không bị chậm
+    service.encode(["warm up"])
+    return {"backend": service.backend, "device": service.device}
+
+
+def _check_redis():
+    if not get_redis_connection().check_connection():
+        raise ConnectionError("Redis ping failed")
+
+
+def _warm_lexical_index():
+    """Mở (mmap) BM25 index của các collection warm-up; collection chưa có index thì build luôn"""
+    if RAG_RETRIEVAL_MODE != "hybrid":
+        return {"enabled": False}
+    store = get_vector_store()
+    opened = {}
+    for name in WARMUP_COLLECTIONS:
+        try:
+            collection = store.get_collection(name=name)
+        except Exception:
+            continue
+        lexical_index = ensure_lexical_index(collection)
+        if lexical_index is not None:
+            lexical_index.search("warm up")
+            opened[name] = lexical_index.stats()["documents"]
+    return {"collections": opened}
+
+
+def _warm_sparse_index():
+    """Load head sparse của model và mở sparse index của các collection warm-up (chưa có thì encode lại để build)"""
+    if RAG_RETRIEVAL_MODE != "dense_sparse":
+        return {"enabled": False}
+    service = get_embedding_service()
+    service.encode_hybrid(["warm up"])
+    store = get_vector_store()
+    opened = {}
+    for name in WARMUP_COLLECTIONS:
+        try:
+            collection = store.get_collection(name=name)
+        except Exception:
+            continue
+        sparse_index = ensure_sparse_index(collection, service, get_embedding_cache())
+        if sparse_index is not None:
+            opened[name] = sparse_index.stats()["documents"]
+    return {"collections": opened}
+
+
+def _warm_reranker():
+    reranker = get_rerank_service()
+    if reranker is None:
+        return {"enabled": False}
+    reranker.warm_up()
+    return {"model": reranker.model_name, "device": reranker.device, "ms_per_pair": reranker.stats()["ms_per_pair"]}
+
+
+def _warm_embedding_cache():
+    cache = get_embedding_cache()
+    return {"enabled": cache is not None}
+
+
+# (tên component, hàm khởi tạo đồng bộ); MongoDB ping là async nên xử lý riêng trong warm_up
+SYNC_COMPONENTS: List[Tuple[str, Callable[[], Optional[Dict]]]] = [
+    ("redis", _check_redis),
+    ("vector_store", _warm_vector_store),
+    ("embedding_model", _warm_embedding),
+    ("lexical_index", _warm_lexical_index),
+    ("sparse_index", _warm_sparse_index),
+    ("reranker", _warm_reranker),
+    ("embedding_cache", _warm_embedding_cache),
+    ("rag_service", get_rag_service),
+]
+
+
+def run_component(state: StartupState, name: str, init: Callable[[], object]) -> bool:
+    """Chạy 1 bước khởi tạo, ghi lại thời gian và lỗi (lỗi không làm crash app)"""
+    t0 = time.perf_counter()
+    try:
+        info = init()
+        entry = {"status": "ok", "seconds": round(time.perf_counter() - t0, 3)}
+        if isinstance(info, dict):
+            entry.update(info)
+        ok = True
+    except Exception as e:
+        entry = {"status": "error", "seconds": round(time.perf_counter() - t0, 3), "error": f"{type(e).__name__}: {e}"}
+        ok = False
+    state.components[name] = entry
+    print(f"[Startup] {name}: {entry['status']} in {entry['seconds']:.2f} s" + (f" ({entry['error']})" if not ok else ""))
+    return ok
+
+
+async def warm_up(state: StartupState):
+    """
+    Khởi tạo và warm-up mọi component, đo thời gian từng bước.
+    Các bước nặng (load model, mở Chroma) chạy trên thread để event loop vẫn phục vụ /health.
+    """
+    state.started_at = time.time()
+    t0 = time.perf_counter()
+
+    mongo_t0 = time.perf_counter()
+    mongo_ok = await get_mongodb_connection().check_connection()
+    state.components["mongodb"] = {
+        "status": "ok" if mongo_ok else "error",
+        "seconds": round(time.perf_counter() - mongo_t0, 3),
+    }
+    print(f"[Startup] mongodb: {state.components['mongodb']['status']}")
+
+    results = [mongo_ok]
+    for name, init in SYNC_COMPONENTS:
+        results.append(await asyncio.to_thread(run_component, state, name, init))
+
+    state.total_seconds = round(time.perf_counter() - t0, 3)
+    state.ready = all(results)
+    state.finished = True
+    print(f"[Startup] Warm-up finished in {state.total_seconds:.2f} s, ready={state.ready}")
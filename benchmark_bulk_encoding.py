@@ -0,0 +1,64 @@
+import sys
+import time
+import numpy as np
+from api.Ingest.utils.tokenizer import chunk_text, extract_pages_from_pdf, extract_text_from_csv, extract_text_from_txt
+from services.embedding_service import get_embedding_service
+
+# File dữ liệu thật (.txt / .csv / .pdf) để lấy chunk (hoặc truyền qua argv[1])
+DATA_PATH = "./tmp_uploads/sample_book.pdf"
+FIXED_BATCH_SIZE = 64
+TOKEN_BUDGETS = [8192, 16384, 32768]
+
+
+def load_chunks(path: str) -> list:
+    if path.endswith(".pdf"):
+        return [chunk for _, page in extract_pages_from_pdf(path) for chunk in chunk_text(page)]
+    if path.endswith(".csv"):
+        return list(extract_text_from_csv(path))
+    return list(extract_text_from_txt(path))
+
+
+def fixed_padding(lengths: list, texts: list) -> float:
+    """Padding ratio của encode(batch_size=64): sentence-transformers sort theo số ký tự rồi chia đều"""
+    order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    padded = 0
+    for start in range(0, len(order), FIXED_BATCH_SIZE):
+        batch = order[start:start + FIXED_BATCH_SIZE]
+        padded += len(batch) * max(lengths[i] for i in batch)
+    return 1 - sum(lengths) / padded
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    service = get_embedding_service()
+    chunks = load_chunks(path)
+    lengths = [min(n, service.max_seq_length) for n in service.count_tokens(chunks)]
+    print(
+        f"{path}: {len(chunks)} chunks, tokens min {min(lengths)}, "
+        f"p50 {int(np.percentile(lengths, 50))}, max {max(lengths)}"
+    )
+    service.encode(chunks[:FIXED_BATCH_SIZE])  # warm-up
+
+    t0 = time.perf_counter()
+    reference = service.encode(chunks, batch_size=FIXED_BATCH_SIZE)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"fixed batch {FIXED_BATCH_SIZE:5d}: {elapsed:7.2f} s | {sum(lengths) / elapsed:9.1f} tokens/s | "
+        f"padding {fixed_padding(lengths, chunks):.1%}"
+    )
+
+    for budget in TOKEN_BUDGETS:
+        embeddings, stats = service.encode_bulk(chunks, token_budget=budget, return_stats=True)
+        sims = (embeddings * reference).sum(axis=1) / (
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1)
+        )
+        assert sims.min() > 0.999, f"encode_bulk output diverges (min cosine {sims.min():.5f})"
+        print(
+            f"bulk budget {budget:5d}: {stats['seconds']:7.2f} s | {stats['tokens_per_sec']:9.1f} tokens/s | "
+            f"padding {stats['padding_ratio']:.1%} | {stats['batches']} batches | "
+            f"speedup x{elapsed / stats['seconds']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import numpy as np
+from transformers import AutoTokenizer
+from api.Ingest.utils.tokenizer import chunk_text, chunk_texts_by_tokens, extract_pages_from_pdf
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# File PDF làm dữ liệu test (hoặc truyền qua argv[1])
+PDF_PATH = "./tmp_uploads/sample_book.pdf"
+MAX_SEQ_LENGTH = 512
+TOKEN_BUDGET = 512
+TOKEN_OVERLAP = 64
+
+
+def token_stats(name: str, chunks: list, tokenizer, elapsed: float):
+    """In số chunk, tốc độ chunking và phân bố độ dài theo token của model"""
+    lengths = np.array([len(ids) for ids in tokenizer(chunks, add_special_tokens=True, verbose=False)["input_ids"]])
+    truncated = int((lengths > MAX_SEQ_LENGTH).sum())
+    fill = np.minimum(lengths, MAX_SEQ_LENGTH).mean() / MAX_SEQ_LENGTH
+    print(
+        f"{name:6s}: {len(chunks)} chunks in {elapsed:.3f} s | tokens mean {lengths.mean():.0f}, "
+        f"p50 {np.percentile(lengths, 50):.0f}, max {lengths.max()} | "
+        f"truncated {truncated} ({truncated / len(chunks):.1%}) | fill {fill:.1%}"
+    )
+
+
+def main():
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else PDF_PATH
+    tokenizer = AutoTokenizer.from_pretrained(
+        os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3"), cache_dir=os.getenv("EMBEDDING_CACHE_FOLDER", None)
+    )
+    pages = [text for _, text in extract_pages_from_pdf(pdf_path)]
+    print(f"PDF: {pdf_path} ({len(pages)} pages, {sum(len(p) for p in pages)} chars)")
+
+    t0 = time.perf_counter()
+    char_chunks = [chunk for page in pages for chunk in chunk_text(page)]
+    token_stats("char", char_chunks, tokenizer, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    token_chunks = [
+        chunk
+        for page_chunks in chunk_texts_by_tokens(
+            pages, tokenizer, chunk_tokens=TOKEN_BUDGET, chunk_overlap=TOKEN_OVERLAP, max_seq_length=MAX_SEQ_LENGTH
+        )
+        for chunk in page_chunks
+    ]
+    elapsed = time.perf_counter() - t0
+    token_stats("token", token_chunks, tokenizer, elapsed)
+    print(f"Token chunker throughput: {sum(len(p) for p in pages) / elapsed / 1e6:.2f} M chars/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import time
 from api.Ingest.utils.tokenizer import extract_text_from_csv, chunk_text
 from sentence_transformers import SentenceTransformer
-import os
 import torch
 # Đường dẫn tới file CSV cần test
 CSV_PATH = r"E:\Phat\AI\LLM\Embeddings\api\Ingest\data\BooksDatasetClean.csv"
@@ -18,7 +17,7 @@ def main():
     print("Reading & converting CSV to text chunks...")
     t2 = time.perf_counter()
     # extract_text_from_csv của bạn đang trả về list[str] (mỗi row là 1 text)
-    rows_as_text = extract_text_from_csv(CSV_PATH)  # list[str]
+    rows_as_text = list(extract_text_from_csv(CSV_PATH))  # list[str]
     # Nếu muốn chunk thêm từng row thì lặp, ở đây mình coi mỗi row là 1 chunk luôn:
     chunks = chunk_text(rows_as_text, chunk_size=500, chunk_overlap=50)
     t3 = time.perf_counter()
@@ -0,0 +1,82 @@
+import statistics
+import sys
+import time
+import numpy as np
+from services.embedding_service import EmbeddingService
+
+# Backend so sánh với torch (fp32); ngưỡng parity được kiểm tra ở tests/test_embedding_backends.py
+BACKENDS = ("onnx", "onnx-int8")
+QUERIES = [
+    "Gợi ý sách phát triển bản thân cho người mới đi làm",
+    "Sách nào của Dale Carnegie nói về nghệ thuật giao tiếp?",
+    "Tiểu thuyết lịch sử Việt Nam hay nhất",
+    "Recommend a book about habits and productivity",
+    "Sách thiếu nhi dành cho trẻ 6 tuổi",
+    "Tư duy nhanh và chậm của Daniel Kahneman nói về điều gì?",
+    "Sách kinh tế học nhập môn dễ hiểu",
+    "Những cuốn sách khoa học viễn tưởng kinh điển",
+]
+LATENCY_RUNS = 50
+THROUGHPUT_TEXTS = 256
+
+
+def load_documents() -> list:
+    """Lấy text dài hơn query để đo throughput (file txt truyền qua argv[1], mỗi dòng 1 chunk)"""
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        return (lines * (THROUGHPUT_TEXTS // max(1, len(lines)) + 1))[:THROUGHPUT_TEXTS]
+    return [" ".join(QUERIES[i % len(QUERIES)] for i in range(j, j + 6)) for j in range(THROUGHPUT_TEXTS)]
+
+
+def measure(service: EmbeddingService, documents: list) -> dict:
+    """Latency của 1 query (p50/p95, ms) và throughput encode batch (texts/s)"""
+    service.encode(QUERIES)  # warm-up
+    latencies = []
+    for i in range(LATENCY_RUNS):
+        t0 = time.perf_counter()
+        service.encode_single(QUERIES[i % len(QUERIES)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    service.encode(documents, batch_size=32)
+    throughput = len(documents) / (time.perf_counter() - t0)
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20)[18],
+        "texts_per_sec": throughput,
+    }
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    documents = load_documents()
+    texts = QUERIES + documents[:32]
+
+    reference = EmbeddingService(backend="torch")
+    reference_embeddings = reference.encode(texts)
+    results = {"torch": measure(reference, documents)}
+    del reference
+
+    for backend in BACKENDS:
+        service = EmbeddingService(backend=backend)
+        sims = cosine(reference_embeddings, service.encode(texts))
+        print(f"[Parity] {backend}: cosine vs torch min {sims.min():.5f}, mean {sims.mean():.5f}")
+        results[backend] = measure(service, documents)
+        del service
+
+    print(f"\n{'backend':10s} {'p50 ms':>8s} {'p95 ms':>8s} {'texts/s':>9s} {'speedup':>8s}")
+    base = results["torch"]
+    for backend, r in results.items():
+        print(
+            f"{backend:10s} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['texts_per_sec']:9.1f} "
+            f"x{base['p50_ms'] / r['p50_ms']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
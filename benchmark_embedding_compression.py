@@ -0,0 +1,121 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import chromadb
+import numpy as np
+from api.Ingest.utils.tokenizer import chunk_text, extract_pages_from_pdf, extract_text_from_csv, extract_text_from_txt
+from services.embedding_compression import EMBEDDING_PCA_FIT_SAMPLES, EmbeddingCompressor
+from services.embedding_service import get_embedding_service
+
+# File dữ liệu thật (.txt / .csv / .pdf) để lấy chunk (hoặc truyền qua argv[1])
+DATA_PATH = "./tmp_uploads/books.csv"
+NUM_QUERIES = 200
+# Query = đoạn đầu của 1 chunk (giống câu hỏi ngắn về nội dung chunk đó)
+QUERY_CHARS = 80
+TOP_K = 10
+# (method, dim, dtype)
+CONFIGS = [
+    ("none", None, "float32"),
+    ("none", None, "float16"),
+    ("truncate", 512, "float16"),
+    ("truncate", 256, "float16"),
+    ("pca", 512, "float16"),
+    ("pca", 256, "float16"),
+    ("pca", 128, "float16"),
+]
+
+
+def load_chunks(path: str) -> list:
+    if path.endswith(".pdf"):
+        return [chunk for _, page in extract_pages_from_pdf(path) for chunk in chunk_text(page)]
+    if path.endswith(".csv"):
+        return list(extract_text_from_csv(path))
+    return list(extract_text_from_txt(path))
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def exact_top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Top-k chính xác theo cosine trên vector đầy đủ (ground truth)"""
+    scores = query_vectors @ doc_vectors.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return top
+
+
+def measure(config, documents, doc_vectors, query_vectors, truth) -> dict:
+    method, dim, dtype = config
+    compressor = EmbeddingCompressor(method=method, dim=dim, dtype=dtype)
+    # Fit giống lúc ingest: trên EMBEDDING_PCA_FIT_SAMPLES chunk đầu tiên
+    compressor.fit(doc_vectors[:EMBEDDING_PCA_FIT_SAMPLES])
+    stored = compressor.transform(doc_vectors)
+    queries = compressor.transform(query_vectors)
+
+    path = tempfile.mkdtemp(prefix="bench_compression_")
+    try:
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection(name="bench")
+        ids = [str(i) for i in range(len(documents))]
+        for start in range(0, len(documents), 1000):
+            collection.add(
+                ids=ids[start:start + 1000],
+                documents=documents[start:start + 1000],
+                embeddings=stored[start:start + 1000],
+            )
+        index_bytes = dir_size(path)
+
+        latencies, hits = [], 0
+        for row, query in enumerate(queries):
+            t0 = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=TOP_K, include=[])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += len(set(int(i) for i in result["ids"][0]) & set(truth[row].tolist()))
+        del collection, client
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    itemsize = 2 if dtype == "float16" else 4
+    return {
+        "name": f"{method}{'' if dim is None else f'-{dim}'} {dtype}",
+        "dim": stored.shape[1],
+        "vector_mb": len(documents) * stored.shape[1] * itemsize / 1e6,
+        "index_mb": index_bytes / 1e6,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": hits / (len(queries) * TOP_K),
+    }
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    service = get_embedding_service()
+    documents = load_chunks(path)
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(len(documents), size=min(NUM_QUERIES, len(documents)), replace=False)
+    queries = [documents[i][:QUERY_CHARS] for i in query_rows]
+    print(f"{path}: {len(documents)} chunks, {len(queries)} queries, recall@{TOP_K} vs exact full-vector search")
+
+    doc_vectors = service.encode_bulk(documents, normalize_embeddings=True)
+    query_vectors = service.encode(queries, normalize_embeddings=True)
+    truth = exact_top_k(doc_vectors, query_vectors, TOP_K)
+
+    baseline = None
+    for config in CONFIGS:
+        stats = measure(config, documents, doc_vectors, query_vectors, truth)
+        baseline = baseline or stats
+        print(
+            f"{stats['name']:22s} dim {stats['dim']:4d} | vectors {stats['vector_mb']:8.2f} MB | "
+            f"index {stats['index_mb']:8.2f} MB (x{stats['index_mb'] / baseline['index_mb']:.2f}) | "
+            f"query p50 {stats['p50_ms']:6.2f} ms p95 {stats['p95_ms']:6.2f} ms | recall@{TOP_K} {stats['recall']:.3f}"
+        )
+    # Redis query cache: JSON list float so với float16 base64
+    payload_json = len(str(query_vectors[0].tolist()))
+    payload_f16 = (query_vectors.shape[1] * 2 + 2) // 3 * 4
+    print(f"redis query cache: json {payload_json} B -> float16 base64 {payload_f16} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import numpy as np
+from api.Ingest.utils.tokenizer import extract_text_from_csv, extract_text_from_txt
+from services.embedding_service import get_embedding_service
+
+# File dữ liệu (.txt / .csv, hoặc truyền qua argv[1]) và số worker cần đo
+DATA_PATH = "./tmp_uploads/books.csv"
+WORKER_COUNTS = [1, 2, 4, 8, 16, 32]
+NUM_DOCS = 4096
+
+
+def load_documents(path: str) -> list:
+    docs = list(extract_text_from_csv(path)) if path.endswith(".csv") else list(extract_text_from_txt(path))
+    # Lặp lại cho đủ NUM_DOCS để mỗi worker có đủ việc
+    return (docs * (NUM_DOCS // max(1, len(docs)) + 1))[:NUM_DOCS]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    docs = load_documents(path)
+    service = get_embedding_service()
+    print(f"{path}: {len(docs)} docs, {os.cpu_count()} CPUs, device {service.device}")
+
+    service.set_pool_workers(0)
+    service.encode_bulk(docs[:64])  # warm-up
+    t0 = time.perf_counter()
+    reference = service.encode_bulk(docs)
+    baseline = len(docs) / (time.perf_counter() - t0)
+    print(f"single process: {baseline:8.1f} docs/s")
+
+    for workers in WORKER_COUNTS:
+        if workers > (os.cpu_count() or 1):
+            break
+        service.set_pool_workers(workers)
+        service.get_pool()  # start pool ngoài phần đo thời gian
+        t0 = time.perf_counter()
+        embeddings = service.encode_bulk(docs)
+        rate = len(docs) / (time.perf_counter() - t0)
+        assert np.allclose(embeddings, reference, atol=1e-4), f"Pool output differs ({workers} workers)"
+        print(f"{workers:2d} workers:     {rate:8.1f} docs/s (x{rate / baseline:.2f})")
+    service.stop_pool()
+
+
+if __name__ == "__main__":
+    main()
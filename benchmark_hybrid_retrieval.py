@@ -0,0 +1,120 @@
+import os
+import re
+import sys
+import tempfile
+import time
+import numpy as np
+from api.Ingest.utils.tokenizer import chunk_text, extract_pages_from_pdf, extract_text_from_csv, extract_text_from_txt
+from services.embedding_service import get_embedding_service
+from services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+# File dữ liệu thật (.txt / .csv / .pdf) để lấy chunk (hoặc truyền qua argv[1]);
+# argv[2] (tuỳ chọn): nhân bản chunk tới số document này để đo latency BM25 ở quy mô lớn (vd 1000000)
+DATA_PATH = "./tmp_uploads/books.csv"
+NUM_QUERIES = 300
+TOP_K = 5
+CANDIDATES = 20
+RRF_K = 60
+ISBN_PATTERN = re.compile(r"(?<![\w-])(?:\d[\s-]?){9,12}[\dXx](?![\w-])")
+
+
+def load_chunks(path: str) -> list:
+    if path.endswith(".pdf"):
+        return [chunk for _, page in extract_pages_from_pdf(path) for chunk in chunk_text(page)]
+    if path.endswith(".csv"):
+        return list(extract_text_from_csv(path))
+    return list(extract_text_from_txt(path))
+
+
+def make_queries(chunks: list, rng) -> dict:
+    """
+    Query biết trước chunk đúng:
+    - span: 3-6 từ liên tiếp trong chunk (giống tra tên sách / tên tác giả chính xác)
+    - isbn: ISBN xuất hiện trong chunk
+    """
+    span, isbn = [], []
+    for row in rng.permutation(len(chunks)):
+        words = chunks[row].split()
+        if len(span) < NUM_QUERIES and len(words) >= 6:
+            size = int(rng.integers(3, 7))
+            start = int(rng.integers(0, len(words) - size + 1))
+            span.append((" ".join(words[start:start + size]), row))
+        match = ISBN_PATTERN.search(chunks[row])
+        if len(isbn) < NUM_QUERIES and match:
+            isbn.append((match.group(), row))
+        if len(span) >= NUM_QUERIES and len(isbn) >= NUM_QUERIES:
+            break
+    return {"span": span, "isbn": isbn}
+
+
+def hit_rates(queries, index: LexicalIndex, service, doc_vectors) -> dict:
+    texts = [text for text, _ in queries]
+    query_vectors = service.encode(texts, normalize_embeddings=True)
+    dense_top = np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :CANDIDATES]
+    hits = {"dense": 0, "bm25": 0, "hybrid": 0}
+    for (text, target), dense_rows in zip(queries, dense_top):
+        dense_ids = [str(row) for row in dense_rows]
+        lexical_ids = [doc_id for doc_id, _ in index.search(text, CANDIDATES)]
+        fused = [doc_id for doc_id, _ in reciprocal_rank_fusion([dense_ids, lexical_ids], k=RRF_K)]
+        hits["dense"] += str(target) in dense_ids[:TOP_K]
+        hits["bm25"] += str(target) in lexical_ids[:TOP_K]
+        hits["hybrid"] += str(target) in fused[:TOP_K]
+    return {name: count / len(queries) for name, count in hits.items()}
+
+
+def latency(index: LexicalIndex, texts: list) -> dict:
+    index.search(texts[0], CANDIDATES)  # warm-up (page in mmap)
+    timings = []
+    for text in texts:
+        t0 = time.perf_counter()
+        index.search(text, CANDIDATES)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {"p50": float(np.percentile(timings, 50)), "p95": float(np.percentile(timings, 95))}
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    scale = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rng = np.random.default_rng(0)
+    chunks = load_chunks(path)
+    queries = make_queries(chunks, rng)
+    print(f"{path}: {len(chunks)} chunks, {len(queries['span'])} span queries, {len(queries['isbn'])} ISBN queries")
+
+    index = LexicalIndex(tempfile.mkdtemp(prefix="bench_bm25_"))
+    t0 = time.perf_counter()
+    index.rebuild([([str(i) for i in range(len(chunks))], chunks)])
+    print(f"BM25 build: {time.perf_counter() - t0:.2f} s, {index.stats()['postings']} postings")
+
+    service = get_embedding_service()
+    doc_vectors = service.encode_bulk(chunks, normalize_embeddings=True)
+    for name, items in queries.items():
+        if not items:
+            continue
+        rates = hit_rates(items, index, service, doc_vectors)
+        lat = latency(index, [text for text, _ in items])
+        print(
+            f"{name:5s} hit@{TOP_K}: dense {rates['dense']:.3f} | bm25 {rates['bm25']:.3f} | "
+            f"hybrid {rates['hybrid']:.3f} || bm25 latency p50 {lat['p50']:.2f} ms p95 {lat['p95']:.2f} ms"
+        )
+
+    if scale > len(chunks):
+        # Nhân bản chunk (id khác nhau) để đo latency ở quy mô scale document
+        big = LexicalIndex(tempfile.mkdtemp(prefix="bench_bm25_scale_"))
+        pages = (
+            ([str(i) for i in range(start, min(start + 10_000, scale))],
+             [chunks[i % len(chunks)] for i in range(start, min(start + 10_000, scale))])
+            for start in range(0, scale, 10_000)
+        )
+        t0 = time.perf_counter()
+        big.rebuild(pages)
+        print(f"BM25 build x{scale}: {time.perf_counter() - t0:.2f} s, {big.stats()['segments']} segments")
+        # Mở lại từ disk (mmap) như process chat
+        big = LexicalIndex(big.path)
+        for name, items in queries.items():
+            if items:
+                lat = latency(big, [text for text, _ in items])
+                print(f"{name:5s} @ {scale} docs: p50 {lat['p50']:.2f} ms p95 {lat['p95']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
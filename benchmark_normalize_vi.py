@@ -0,0 +1,50 @@
+import re
+import sys
+import time
+from api.Ingest.utils.tokenizer import normalize_text_vi, normalize_texts_vi
+
+# File text/CSV thật để đo (tuỳ chọn, truyền qua argv[1]); mặc định dùng corpus mẫu bên dưới
+SAMPLE_LINES = [
+    "Tên sách:Lịch sử Việt Nam,Năm2002;Tác giả:Trần Văn A.Giá:120.000đ  Số trang:350trang",
+    "Cuốn sách kể về lịch sử hình thành và phát triển của dân tộc, với nhiều tư liệu quý giá.",
+    "ISBN:978-604-1-23456-7\tNXB Trẻ,2019.Tái bản lần3",
+    "Đánh giá:4.5/5!!Rất hay;,,đáng đọc   ...",
+]
+_VI_LETTERS = "a-zA-ZàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ"
+
+
+def normalize_text_vi_legacy(text: str) -> str:
+    """Bản 5 lần re.sub trước đây để so tốc độ (golden test: tests/test_normalize_vi.py)"""
+    if not text:
+        return text
+    text = re.sub(r'([,.!?:;])([^\s\d])', r'\1 \2', text)
+    text = re.sub(rf'([{_VI_LETTERS}])(\d)', r'\1 \2', text)
+    text = re.sub(rf'(\d)([{_VI_LETTERS}])', r'\1 \2', text)
+    text = re.sub(r'([,.!?:;])(\d)', r'\1 \2', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def bench(name, func, texts, repeat=3):
+    total_chars = sum(len(text) for text in texts)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(texts)
+        best = min(best, time.perf_counter() - t0)
+    print(f"{name:<22} {total_chars / best / 1e6:8.2f} M chars/s")
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8", errors="ignore") as f:
+            texts = [line for line in f if line.strip()]
+    else:
+        texts = SAMPLE_LINES * 50000
+    bench("legacy (5 passes)", lambda items: [normalize_text_vi_legacy(t) for t in items], texts)
+    bench("fused", lambda items: [normalize_text_vi(t) for t in items], texts)
+    bench("fused batch x4 procs", lambda items: normalize_texts_vi(items, workers=4), texts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import sys
+import time
+from pypdf import PdfReader
+from api.Ingest.utils.tokenizer import extract_pages_from_pdf, normalize_text_vi
+
+# Đường dẫn tới file PDF cần test (hoặc truyền qua argv[1])
+PDF_PATH = "./tmp_uploads/sample_book.pdf"
+WORKER_COUNTS = [2, 4, 8]
+
+
+def extract_serial(file_path: str) -> list:
+    """Cách cũ: 1 thread duyệt reader.pages tuần tự"""
+    reader = PdfReader(file_path)
+    return [(i + 1, normalize_text_vi(page.extract_text() or "")) for i, page in enumerate(reader.pages)]
+
+
+def main():
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else PDF_PATH
+    print(f"PDF: {pdf_path} ({len(PdfReader(pdf_path).pages)} pages)")
+
+    t0 = time.perf_counter()
+    serial_pages = extract_serial(pdf_path)
+    serial_time = time.perf_counter() - t0
+    print(f"Serial:     {serial_time:.2f} s")
+
+    for workers in WORKER_COUNTS:
+        t0 = time.perf_counter()
+        pages = list(extract_pages_from_pdf(pdf_path, workers=workers))
+        elapsed = time.perf_counter() - t0
+        assert pages == serial_pages, "Parallel output differs from serial output"
+        print(f"{workers} workers: {elapsed:.2f} s (speedup x{serial_time / elapsed:.2f})")
+
+
+if __name__ == "__main__":
+    main()
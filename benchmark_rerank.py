@@ -0,0 +1,57 @@
+import asyncio
+import sys
+import time
+import numpy as np
+from benchmark_hybrid_retrieval import DATA_PATH, load_chunks, make_queries
+from services.embedding_service import get_embedding_service
+from services.rerank_service import RERANK_CANDIDATES, RerankService
+
+# hit@TOP_K của ranking dense so với sau khi rerank RERANK_CANDIDATES ứng viên, với từng latency budget
+TOP_K = 3
+BUDGETS_MS = [0, 300, 150, 75]
+
+
+async def run(queries, reranker: RerankService, doc_vectors, query_vectors, chunks, budget_ms: float) -> dict:
+    hits_dense, hits_rerank, scored, latencies = 0, 0, 0, []
+    for row, (text, target) in enumerate(queries):
+        top = np.argsort(-(doc_vectors @ query_vectors[row]))[:RERANK_CANDIDATES]
+        contexts = [{"content": chunks[i], "row": int(i)} for i in top]
+        t0 = time.perf_counter()
+        reranked, stats = await reranker.rerank(text, contexts, TOP_K, budget_ms=budget_ms)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        scored += stats["scored"]
+        hits_dense += target in top[:TOP_K]
+        hits_rerank += target in [ctx["row"] for ctx in reranked]
+    return {
+        "dense": hits_dense / len(queries),
+        "rerank": hits_rerank / len(queries),
+        "scored": scored / len(queries),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    chunks = load_chunks(path)
+    queries = make_queries(chunks, np.random.default_rng(0))["span"]
+    print(f"{path}: {len(chunks)} chunks, {len(queries)} span queries, {RERANK_CANDIDATES} candidates -> top {TOP_K}")
+
+    service = get_embedding_service()
+    doc_vectors = service.encode_bulk(chunks, normalize_embeddings=True)
+    query_vectors = service.encode([text for text, _ in queries], normalize_embeddings=True)
+    reranker = RerankService()
+    reranker.warm_up()
+
+    for budget in BUDGETS_MS:
+        result = asyncio.run(run(queries, reranker, doc_vectors, query_vectors, chunks, budget))
+        print(
+            f"budget {budget or 'none':>4} ms | hit@{TOP_K} dense {result['dense']:.3f} -> rerank {result['rerank']:.3f} | "
+            f"scored {result['scored']:.1f}/{RERANK_CANDIDATES} | latency p50 {result['p50']:.1f} ms p95 {result['p95']:.1f} ms"
+        )
+    print(f"reranker: {reranker.stats()}")
+    reranker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmark_hybrid_retrieval import DATA_PATH, load_chunks, make_queries
+from services.embedding_service import get_embedding_service
+from services.sparse_index import SparseIndex
+
+# So sánh dense với dense + sparse (bge-m3 lexical weights, gộp bằng tổng score có trọng số)
+# trên cùng bộ query span / ISBN của benchmark_hybrid_retrieval. argv[1]: file dữ liệu
+TOP_K = 5
+CANDIDATES = 20
+DENSE_WEIGHT = 1.0
+SPARSE_WEIGHTS = [0.1, 0.3, 0.5]
+
+
+def fuse(dense_scores: dict, sparse_scores: dict, sparse_weight: float) -> list:
+    ids = set(dense_scores) | set(sparse_scores)
+    return sorted(
+        ids,
+        key=lambda doc_id: -(DENSE_WEIGHT * dense_scores[doc_id] + sparse_weight * sparse_scores.get(doc_id, 0.0)),
+    )
+
+
+def evaluate(queries, index: SparseIndex, service, doc_vectors) -> dict:
+    texts = [text for text, _ in queries]
+    t0 = time.perf_counter()
+    query_vectors, query_sparse = service.encode_hybrid(texts)
+    hybrid_ms = (time.perf_counter() - t0) * 1000 / len(texts)
+    t0 = time.perf_counter()
+    service.encode(texts)
+    dense_ms = (time.perf_counter() - t0) * 1000 / len(texts)
+
+    similarities = query_vectors @ doc_vectors.T
+    hits = {"dense": 0, "sparse": 0, **{f"dense+sparse@{w}": 0 for w in SPARSE_WEIGHTS}}
+    search_ms = []
+    for row, (_, target) in enumerate(queries):
+        top = np.argsort(-similarities[row])[:CANDIDATES]
+        t0 = time.perf_counter()
+        sparse = index.search(query_sparse[row], CANDIDATES)
+        search_ms.append((time.perf_counter() - t0) * 1000)
+        # Giống retrieve_context: chunk chỉ có bên sparse vẫn được tính cosine chính xác
+        dense_scores = {str(i): float(similarities[row, i]) for i in top}
+        sparse_scores = dict(sparse)
+        for doc_id in sparse_scores:
+            dense_scores.setdefault(doc_id, float(similarities[row, int(doc_id)]))
+        hits["dense"] += str(target) in [str(i) for i in top[:TOP_K]]
+        hits["sparse"] += str(target) in [doc_id for doc_id, _ in sparse[:TOP_K]]
+        for weight in SPARSE_WEIGHTS:
+            hits[f"dense+sparse@{weight}"] += str(target) in fuse(dense_scores, sparse_scores, weight)[:TOP_K]
+    return {
+        "hits": {name: count / len(queries) for name, count in hits.items()},
+        "encode_ms": (dense_ms, hybrid_ms),
+        "search_p50": float(np.percentile(search_ms, 50)),
+        "search_p95": float(np.percentile(search_ms, 95)),
+    }
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    rng = np.random.default_rng(0)
+    chunks = load_chunks(path)
+    queries = make_queries(chunks, rng)
+    print(f"{path}: {len(chunks)} chunks, {len(queries['span'])} span queries, {len(queries['isbn'])} ISBN queries")
+
+    service = get_embedding_service()
+    t0 = time.perf_counter()
+    doc_vectors = service.encode_bulk(chunks)
+    dense_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    doc_vectors, doc_sparse = service.encode_bulk(chunks, return_sparse=True)
+    hybrid_s = time.perf_counter() - t0
+    print(f"ingest encode: dense {dense_s:.1f} s | dense+sparse {hybrid_s:.1f} s (x{hybrid_s / dense_s:.2f})")
+
+    index = SparseIndex(tempfile.mkdtemp(prefix="bench_sparse_"))
+    index.rebuild([([str(i) for i in range(len(chunks))], doc_sparse)])
+    stats = index.stats()
+    print(
+        f"sparse index: {stats['postings']} postings "
+        f"({stats['postings'] / max(1, len(chunks)):.1f} / chunk, ~{stats['postings'] * 12 / 1e6:.1f} MB)"
+    )
+
+    for name, items in queries.items():
+        if not items:
+            continue
+        result = evaluate(items, index, service, doc_vectors)
+        rates = " | ".join(f"{label} {rate:.3f}" for label, rate in result["hits"].items())
+        dense_ms, hybrid_ms = result["encode_ms"]
+        print(
+            f"{name:5s} hit@{TOP_K}: {rates} || query encode {dense_ms:.2f} -> {hybrid_ms:.2f} ms, "
+            f"sparse search p50 {result['search_p50']:.2f} ms p95 {result['search_p95']:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import shutil
+import sys
+import tempfile
+import time
+import chromadb
+import numpy as np
+from benchmark_hybrid_retrieval import DATA_PATH, load_chunks
+from services.embedding_compression import METADATA_DTYPE
+from services.embedding_service import get_embedding_service
+from services.vector_store import ChromaVectorStore, NumpyVectorStore
+
+# Latency query (1 và nhiều query / lần gọi) + recall@TOP_K của Chroma (HNSW) so với NumPy (chính xác)
+# trên embedding thật. argv[1]: file dữ liệu, argv[2]: số lần nhân bản vector để thử collection lớn hơn
+TOP_K = 10
+NUM_QUERIES = 200
+BATCH_SIZES = [1, 8]
+ADD_BATCH = 5000
+
+
+def fill(store, name: str, metadata: dict, vectors: np.ndarray, chunks: list) -> float:
+    collection = store.create_collection(name, metadata=metadata)
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), ADD_BATCH):
+        end = min(start + ADD_BATCH, len(vectors))
+        collection.add(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end],
+            documents=[chunks[i % len(chunks)] for i in range(start, end)],
+        )
+    return time.perf_counter() - t0
+
+
+def run(collection, queries: np.ndarray, batch_size: int):
+    results, latencies = [], []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        t0 = time.perf_counter()
+        result = collection.query(query_embeddings=batch, n_results=TOP_K, include=["distances"])
+        latencies.append((time.perf_counter() - t0) * 1000)
+        results.extend(result["ids"])
+    return results, latencies
+
+
+def recall(results: list, truth: list) -> float:
+    return float(np.mean([len(set(r) & set(t)) / max(1, len(t)) for r, t in zip(results, truth)]))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    rng = np.random.default_rng(0)
+    chunks = load_chunks(path)
+    service = get_embedding_service()
+    base = service.encode_bulk(chunks, normalize_embeddings=True)
+    # Bản sao có nhiễu nhỏ để collection lớn hơn mà vector không trùng nhau
+    vectors = np.concatenate(
+        [base] + [base + rng.normal(0, 0.01, base.shape).astype(np.float32) for _ in range(copies - 1)]
+    )
+    picked = rng.choice(len(chunks), size=min(NUM_QUERIES, len(chunks)), replace=False)
+    queries = service.encode([chunks[i][:80] for i in picked], normalize_embeddings=True)
+    print(f"{path}: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, top {TOP_K}")
+
+    root = tempfile.mkdtemp(prefix="bench_store_")
+    try:
+        stores = {
+            # numpy chạy đầu tiên: kết quả của nó là top-k chính xác để tính recall
+            "numpy": (NumpyVectorStore(f"{root}/numpy"), {"hnsw:space": "cosine"}),
+            "chroma": (ChromaVectorStore(chromadb.PersistentClient(path=f"{root}/chroma")), {"hnsw:space": "cosine"}),
+            "numpy-f16": (NumpyVectorStore(f"{root}/numpy16"), {"hnsw:space": "cosine", METADATA_DTYPE: "float16"}),
+        }
+        truth = None
+        for label, (store, metadata) in stores.items():
+            add_s = fill(store, "bench", metadata, vectors, chunks)
+            if isinstance(store, NumpyVectorStore):
+                # Mở lại từ disk như lúc startup (mmap, không copy)
+                t0 = time.perf_counter()
+                store = NumpyVectorStore(store.path)
+                store.get_collection("bench").count()
+                open_ms = f"{(time.perf_counter() - t0) * 1000:.1f} ms"
+            else:
+                open_ms = "-"
+            collection = store.get_collection("bench")
+            for batch_size in BATCH_SIZES:
+                results, latencies = run(collection, queries, batch_size)
+                truth = truth or results
+                print(
+                    f"{label:9s} | add {add_s:.1f} s | open {open_ms} | {batch_size} query/call: "
+                    f"p50 {np.percentile(latencies, 50):.1f} ms p95 {np.percentile(latencies, 95):.1f} ms "
+                    f"({sum(latencies) / len(queries):.2f} ms/query) | recall@{TOP_K} vs exact {recall(results, truth):.3f}"
+                )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
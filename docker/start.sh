@@ -45,11 +45,12 @@ sleep 10
 
 # Check health
 echo "Checking service health..."
-max_attempts=30
+max_attempts=90
 attempt=0
 
 while [ $attempt -lt $max_attempts ]; do
-    if curl -f http://localhost:8000/health > /dev/null 2>&1; then
+    # /ready trả 200 khi warm-up (model, Chroma, MongoDB, Redis) đã xong
+    if curl -f http://localhost:8000/ready > /dev/null 2>&1; then
         echo "All services are healthy!"
         break
     fi
@@ -73,6 +74,7 @@ echo "RAG Flow Mini is running!"
 echo "   API: http://localhost:8000"
 echo "   Docs: http://localhost:8000/docs"
 echo "   Health: http://localhost:8000/health"
+echo "   Ready: http://localhost:8000/ready"
 echo ""
 echo "Useful commands:"
 echo "   View logs: docker-compose logs -f"
@@ -0,0 +1,154 @@
+# services/embedding_batcher.py
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.embedding_service import get_embedding_service
+
+load_dotenv()
+
+# Bật/tắt micro-batching cho query embedding
+EMBEDDING_MICRO_BATCHING = os.getenv("EMBEDDING_MICRO_BATCHING", "true").lower() in ("1", "true", "yes")
+# Số query tối đa mỗi batch và thời gian tối đa chờ gom thêm query (ms)
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+
+# Số mẫu gần nhất giữ lại để tính percentile queue delay / encode time
+_METRICS_WINDOW = 1000
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batcher async đứng trước EmbeddingService:
+    các request encode đồng thời được gom lại (tối đa max_batch_size query hoặc
+    max_wait_ms kể từ query đầu tiên), encode bằng 1 lần gọi model rồi trả kết quả
+    cho từng caller qua future. Model chạy trên embedding executor (aencode) nên không block event loop.
+    """
+
+    def __init__(self, embedding_service=None, max_batch_size: int = None, max_wait_ms: float = None):
+        # None = lấy EmbeddingService singleton ở lần encode đầu tiên (không load model lúc khởi tạo)
+        self._embedding_service = embedding_service
+        self.max_batch_size = max_batch_size or EMBEDDING_BATCH_MAX_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else EMBEDDING_BATCH_MAX_WAIT_MS) / 1000
+
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        self._loop = None
+
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes: Counter = Counter()
+        self._queue_delays_ms: deque = deque(maxlen=_METRICS_WINDOW)
+        self._encode_ms: deque = deque(maxlen=_METRICS_WINDOW)
+
+    @property
+    def embedding_service(self):
+        if self._embedding_service is None:
+            self._embedding_service = get_embedding_service()
+        return self._embedding_service
+
+    def _ensure_worker(self):
+        """Tạo queue + worker task trên event loop hiện tại (lazy, lần đầu encode được gọi)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode 1 text (numpy 1D), được gom batch với các request đồng thời khác"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        """Chờ query đầu tiên rồi gom thêm tới khi đủ max_batch_size hoặc hết max_wait"""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Caller đã huỷ (client disconnect) thì không cần encode
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            # Query trùng nhau trong cùng batch chỉ encode 1 lần
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            started = time.perf_counter()
+            try:
+                embeddings = await self.embedding_service.aencode(
+                    texts,
+                    batch_size=len(texts),
+                    convert_to_numpy=True,
+                )
+            except Exception as e:
+                print(f"[EmbeddingBatcher] Batch of {len(texts)} failed: {type(e).__name__}: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            by_text = dict(zip(texts, embeddings))
+            for text, future, enqueued in batch:
+                self._queue_delays_ms.append((started - enqueued) * 1000)
+                if not future.done():
+                    future.set_result(by_text[text])
+            self._requests += len(batch)
+            self._batches += 1
+            self._batch_sizes[len(texts)] += 1
+            self._encode_ms.append((finished - started) * 1000)
+
+    def metrics(self) -> Dict[str, object]:
+        """Phân bố batch size, queue delay và thời gian encode (ms, trên cửa sổ gần nhất)"""
+
+        def _summary(values) -> Dict[str, float]:
+            if not values:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+            arr = np.fromiter(values, dtype=np.float64)
+            return {
+                "avg": round(float(arr.mean()), 3),
+                "p50": round(float(np.percentile(arr, 50)), 3),
+                "p95": round(float(np.percentile(arr, 95)), 3),
+                "max": round(float(arr.max()), 3),
+            }
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self._requests,
+            "batches": self._batches,
+            "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "queue_delay_ms": _summary(self._queue_delays_ms),
+            "encode_ms": _summary(self._encode_ms),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Singleton factory cho EmbeddingBatcher (dùng chung EmbeddingService singleton).
+    """
+    return EmbeddingBatcher()
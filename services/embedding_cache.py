@@ -0,0 +1,194 @@
+# services/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bật/tắt cache embeddings trên disk
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache/embeddings.sqlite")
+# Số embedding tối đa giữ trong cache, vượt quá thì xoá entry ít dùng gần đây nhất
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 1_000_000))
+
+# SQLite giới hạn số tham số mỗi câu lệnh → lookup theo từng nhóm key
+_SQL_BATCH = 500
+
+
+def make_cache_key(model_key: str, text: str) -> str:
+    """Key = sha256(model + text đã gộp whitespace), đổi model thì không dùng lại embedding cũ"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model_key}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache embeddings của chunk trên disk (SQLite, vector lưu dạng float32 bytes).
+    Key theo (model, nội dung chunk) nên ingest lại / rebuild collection chỉ phải đọc disk
+    thay vì encode lại. Giới hạn số entry bằng eviction theo last_used (LRU xấp xỉ).
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or EMBEDDING_CACHE_PATH
+        self.max_entries = max_entries or EMBEDDING_CACHE_MAX_ENTRIES
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Dùng chung 1 connection giữa các ingest thread, tuần tự hoá bằng lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        # Sparse lexical weights (encode_hybrid): token ids int32 + weights float32, cùng key với embeddings
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sparse_weights (key TEXT PRIMARY KEY, token_ids BLOB NOT NULL, weights BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        print(f"[EmbeddingCache] Opened {self.path} ({self._entries} entries, max {self.max_entries})")
+
+    def get_many(self, model_key: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Tra cứu bulk. Trả về list cùng độ dài với texts, None cho text chưa có trong cache.
+        """
+        keys = [make_cache_key(model_key, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        now = time.time()
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _SQL_BATCH):
+                batch = unique_keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for vector in results if vector is not None)
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(keys) - hits
+        return results
+
+    def put_many(self, model_key: str, texts: List[str], embeddings: np.ndarray):
+        """Ghi embeddings (2D, cùng thứ tự với texts) vào cache rồi evict nếu vượt max_entries"""
+        if not texts:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        now = time.time()
+        rows = [
+            (make_cache_key(model_key, text), embeddings.shape[1], embeddings[i].tobytes(), now)
+            for i, text in enumerate(texts)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            inserted = self._conn.total_changes - before
+            self._entries += inserted
+            self._stats["writes"] += inserted
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                evicted = self._conn.execute(
+                    "SELECT key FROM embeddings ORDER BY last_used LIMIT ?", (overflow,)
+                ).fetchall()
+                self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+                self._conn.executemany("DELETE FROM sparse_weights WHERE key = ?", evicted)
+                self._entries -= overflow
+                self._stats["evictions"] += overflow
+            self._conn.commit()
+
+    def get_sparse_many(self, model_key: str, texts: List[str]) -> List[Optional[Dict[int, float]]]:
+        """Tra cứu bulk sparse weights, None cho text chưa có"""
+        keys = [make_cache_key(model_key, text) for text in texts]
+        found: Dict[str, Dict[int, float]] = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _SQL_BATCH):
+                batch = unique_keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, token_ids, weights FROM sparse_weights WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, token_ids, weights in rows:
+                    found[key] = dict(zip(
+                        np.frombuffer(token_ids, dtype=np.int32).tolist(),
+                        np.frombuffer(weights, dtype=np.float32).tolist(),
+                    ))
+        return [found.get(key) for key in keys]
+
+    def put_sparse_many(self, model_key: str, texts: List[str], sparse: List[Dict[int, float]]):
+        """Ghi sparse weights (cùng thứ tự với texts); entry bị xoá theo eviction của bảng embeddings"""
+        if not texts:
+            return
+        rows = [
+            (
+                make_cache_key(model_key, text),
+                np.fromiter(weights.keys(), dtype=np.int32, count=len(weights)).tobytes(),
+                np.fromiter(weights.values(), dtype=np.float32, count=len(weights)).tobytes(),
+            )
+            for text, weights in zip(texts, sparse)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO sparse_weights (key, token_ids, weights) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            # Tính cả file WAL chưa checkpoint
+            size_bytes = sum(
+                os.path.getsize(path) for path in (self.path, f"{self.path}-wal") if os.path.exists(path)
+            )
+            return {
+                "path": self.path,
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "size_bytes": size_bytes,
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("DELETE FROM sparse_weights")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._entries = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Singleton factory cho EmbeddingCache, trả về None nếu EMBEDDING_CACHE_ENABLED=false.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache()
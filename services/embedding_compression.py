@@ -0,0 +1,295 @@
+# services/embedding_compression.py
+"""
+Nén embedding theo từng collection: giảm số chiều (truncate / PCA) + làm tròn float16.
+
+bge-m3 trả về vector 1024-d float32; với collection lớn, index và RAM tăng tuyến tính theo
+số chiều. Setting nén được lưu trong metadata của collection (PCA projection lưu file .npz
+cạnh Chroma) để ingest và retrieve_context luôn dùng cùng 1 phép biến đổi.
+
+- none: giữ nguyên vector đầy đủ (mặc định, collection cũ không có metadata nén)
+- truncate: giữ dim chiều đầu (bge-m3 không train kiểu Matryoshka nên recall giảm nhiều hơn PCA)
+- pca: chiếu lên dim thành phần chính, fit trên các batch đầu tiên của lần ingest đầu
+
+Lưu ý: HNSW của Chroma luôn lưu float32, nên dtype=float16 chỉ làm tròn giá trị (vector trong
+index giống hệt bản float16); phần tiết kiệm bytes thực sự nằm ở chỗ lưu vector thô (Redis cache)
+và ở backend numpy của services/vector_store.py (lưu segment float16).
+"""
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_COMPRESSION_METHODS = ("none", "truncate", "pca")
+EMBEDDING_COMPRESSION_DTYPES = ("float32", "float16")
+# Setting mặc định cho collection mới (khi request ingest không chỉ định)
+EMBEDDING_COMPRESSION = os.getenv("EMBEDDING_COMPRESSION", "none").lower()
+EMBEDDING_COMPRESSION_DIM = int(os.getenv("EMBEDDING_COMPRESSION_DIM", 256))
+EMBEDDING_COMPRESSION_DTYPE = os.getenv("EMBEDDING_COMPRESSION_DTYPE", "float32").lower()
+# Số vector gom được trước khi fit PCA (ít hơn thì fit trên toàn bộ những gì có ở cuối lần ingest)
+EMBEDDING_PCA_FIT_SAMPLES = int(os.getenv("EMBEDDING_PCA_FIT_SAMPLES", 4096))
+# Số vector tối thiểu để được fit PCA (luôn ít nhất dim + 1 để projection đủ hạng), không đủ thì ingest bị từ chối
+EMBEDDING_PCA_MIN_SAMPLES = int(os.getenv("EMBEDDING_PCA_MIN_SAMPLES", 0))
+# Thư mục lưu PCA projection của từng collection
+EMBEDDING_PROJECTION_DIR = os.getenv(
+    "EMBEDDING_PROJECTION_DIR", os.path.join(os.getenv("CHROMADB_PATH", "./chroma_db"), "projections")
+)
+
+# Key trong metadata của Chroma collection
+METADATA_METHOD = "embedding_compression"
+METADATA_DIM = "embedding_compression_dim"
+METADATA_DTYPE = "embedding_compression_dtype"
+
+
+class EmbeddingCompressor:
+    """Phép biến đổi vector của 1 collection; transform dùng chung cho document và query"""
+
+    def __init__(
+        self,
+        method: str = "none",
+        dim: int = None,
+        dtype: str = "float32",
+        mean: np.ndarray = None,
+        components: np.ndarray = None,
+    ):
+        if method not in EMBEDDING_COMPRESSION_METHODS:
+            raise ValueError(f"Unsupported compression '{method}', expected one of {EMBEDDING_COMPRESSION_METHODS}")
+        if dtype not in EMBEDDING_COMPRESSION_DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}', expected one of {EMBEDDING_COMPRESSION_DTYPES}")
+        if method != "none" and (not dim or dim <= 0):
+            raise ValueError(f"Compression '{method}' requires a positive dim")
+        self.method = method
+        self.dim = dim if method != "none" else None
+        self.dtype = dtype
+        # PCA: vector mean (d,) và ma trận chiếu (d, dim), None khi chưa fit
+        self.mean = mean
+        self.components = components
+        self._fit_lock = threading.Lock()
+
+    @property
+    def is_identity(self) -> bool:
+        return self.method == "none" and self.dtype == "float32"
+
+    @property
+    def needs_fit(self) -> bool:
+        return self.method == "pca" and self.components is None
+
+    @property
+    def min_fit_samples(self) -> int:
+        """Số vector tối thiểu để fit: sau khi trừ mean, n mẫu chỉ cho tối đa n - 1 thành phần có nghĩa"""
+        if self.method != "pca":
+            return 0
+        return max(self.dim + 1, EMBEDDING_PCA_MIN_SAMPLES)
+
+    def fit(self, embeddings: np.ndarray) -> "EmbeddingCompressor":
+        """Fit PCA (SVD trên dữ liệu đã trừ mean); truncate/none không cần fit"""
+        if self.method != "pca":
+            return self
+        x = np.asarray(embeddings, dtype=np.float32)
+        if x.shape[1] < self.dim:
+            raise ValueError(f"Cannot reduce {x.shape[1]}-d embeddings to {self.dim} dims")
+        if len(x) < self.min_fit_samples:
+            # Ít mẫu → projection thiếu hạng (1 mẫu: mọi vector thành 0) và được lưu vĩnh viễn cho collection
+            raise ValueError(
+                f"PCA to {self.dim} dims needs at least {self.min_fit_samples} chunks for the first ingest, "
+                f"got {len(x)}; ingest more documents at once or use compression 'truncate'"
+            )
+        mean = x.mean(axis=0)
+        _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+        self.mean = mean
+        self.components = np.ascontiguousarray(vt[:self.dim].T, dtype=np.float32)
+        return self
+
+    def fit_once(self, embeddings: np.ndarray, on_fit: Callable[["EmbeddingCompressor"], object] = None) -> bool:
+        """
+        Fit nếu chưa ai fit (các job cùng collection trong process dùng chung 1 object, xem
+        configure_collection), trả về True nếu lần gọi này đặt projection.
+        on_fit(fitted) chạy trước khi projection có hiệu lực (vd. lưu file); trả về compressor khác
+        thì dùng projection của nó (process khác đã lưu trước).
+        """
+        with self._fit_lock:
+            if not self.needs_fit:
+                return False
+            fitted = EmbeddingCompressor(self.method, self.dim, self.dtype).fit(embeddings)
+            if on_fit is not None:
+                fitted = on_fit(fitted) or fitted
+            # mean trước components: needs_fit chỉ nhìn components
+            self.mean = fitted.mean
+            self.components = fitted.components
+            return True
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Biến đổi (n, d) hoặc (d,) → float32 đã giảm chiều và chuẩn hoá lại L2
+        (giữ nguyên ý nghĩa cosine/L2 của Chroma), làm tròn float16 nếu dtype=float16.
+        """
+        x = np.asarray(embeddings, dtype=np.float32)
+        if self.is_identity:
+            return x
+        single = x.ndim == 1
+        if single:
+            x = x[None, :]
+        if self.method == "truncate":
+            x = x[:, :self.dim]
+        elif self.method == "pca":
+            if self.components is None:
+                raise RuntimeError("PCA projection has not been fitted")
+            x = (x - self.mean) @ self.components
+        if self.method != "none":
+            norms = np.linalg.norm(x, axis=1, keepdims=True)
+            x = x / np.maximum(norms, 1e-12)
+        if self.dtype == "float16":
+            x = x.astype(np.float16).astype(np.float32)
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        return x[0] if single else x
+
+    def to_metadata(self) -> Dict[str, object]:
+        return {METADATA_METHOD: self.method, METADATA_DIM: self.dim or 0, METADATA_DTYPE: self.dtype}
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"method": self.method, "dim": self.dim, "dtype": self.dtype, "fitted": not self.needs_fit}
+
+
+def projection_path(collection_name: str) -> str:
+    return os.path.join(EMBEDDING_PROJECTION_DIR, f"{collection_name}.npz")
+
+
+def _read_projection(collection_name: str) -> Tuple[np.ndarray, np.ndarray]:
+    with np.load(projection_path(collection_name)) as data:
+        return data["mean"], data["components"]
+
+
+def save_projection(collection_name: str, compressor: EmbeddingCompressor) -> EmbeddingCompressor:
+    """
+    Lưu projection của collection, không bao giờ ghi đè file đã có: job khác đã lưu trước thì
+    trả về compressor đọc từ file đó (vector đã ghi của job kia nằm trong không gian của nó).
+    """
+    os.makedirs(EMBEDDING_PROJECTION_DIR, exist_ok=True)
+    path = projection_path(collection_name)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+    np.savez(tmp_path, mean=compressor.mean, components=compressor.components)
+    try:
+        # link thay vì replace: tạo file nguyên tử và lỗi nếu đã tồn tại
+        os.link(tmp_path, path)
+        return compressor
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+    existing = EmbeddingCompressor(compressor.method, compressor.dim, compressor.dtype)
+    existing.mean, existing.components = _read_projection(collection_name)
+    print(f"[Compression] Collection '{collection_name}': projection already saved by another job, using it")
+    return existing
+
+
+def delete_projection(collection_name: str):
+    """Bỏ projection khi collection bị truncate: lần ingest kế tiếp fit lại trên dữ liệu mới"""
+    try:
+        os.remove(projection_path(collection_name))
+    except FileNotFoundError:
+        pass
+    _invalidate(collection_name)
+
+
+def _compressor_from_metadata(collection_name: str, metadata: Optional[Dict]) -> EmbeddingCompressor:
+    metadata = metadata or {}
+    method = metadata.get(METADATA_METHOD, "none")
+    compressor = EmbeddingCompressor(
+        method=method,
+        dim=int(metadata.get(METADATA_DIM) or 0) or None,
+        dtype=metadata.get(METADATA_DTYPE, "float32"),
+    )
+    if method == "pca" and os.path.exists(projection_path(collection_name)):
+        compressor.mean, compressor.components = _read_projection(collection_name)
+    return compressor
+
+
+# Cache compressor theo (tên, id) collection: query không phải đọc lại .npz mỗi lần, và mọi ingest
+# job trong process dùng chung 1 object (fit_once chỉ fit 1 lần)
+_compressors: Dict[Tuple[str, str], EmbeddingCompressor] = {}
+_compressors_lock = threading.Lock()
+# configure_collection của các job submit đồng thời chạy lần lượt
+_configure_lock = threading.Lock()
+
+
+def _invalidate(collection_name: str):
+    with _compressors_lock:
+        for key in [key for key in _compressors if key[0] == collection_name]:
+            del _compressors[key]
+
+
+def get_collection_compressor(collection) -> EmbeddingCompressor:
+    """Compressor của collection (đọc từ metadata + projection file, có cache in-process)"""
+    key = (collection.name, str(collection.id))
+    with _compressors_lock:
+        compressor = _compressors.get(key)
+    if compressor is None:
+        compressor = _compressor_from_metadata(collection.name, collection.metadata)
+        with _compressors_lock:
+            compressor = _compressors.setdefault(key, compressor)
+    elif compressor.needs_fit and os.path.exists(projection_path(collection.name)):
+        # Process khác đã lưu projection: nạp vào chính object đang dùng chung (job đang gom mẫu sẽ không fit nữa)
+        with compressor._fit_lock:
+            if compressor.needs_fit:
+                compressor.mean, compressor.components = _read_projection(collection.name)
+    return compressor
+
+
+def configure_collection(
+    collection,
+    method: str = None,
+    dim: int = None,
+    dtype: str = None,
+) -> EmbeddingCompressor:
+    """
+    Xác định setting nén cho lần ingest vào collection:
+    - Collection đã có setting: dùng setting đó (request khác setting → ValueError)
+    - Collection rỗng chưa có setting: ghi setting mới (request hoặc mặc định từ env) vào metadata
+    - Collection đã có dữ liệu nhưng không có setting: vector đầy đủ, chỉ chấp nhận none
+    """
+    with _configure_lock:
+        return _configure_collection(collection, method, dim, dtype)
+
+
+def _configure_collection(collection, method: str, dim: int, dtype: str) -> EmbeddingCompressor:
+    metadata = collection.metadata or {}
+    key = (collection.name, str(collection.id))
+    with _compressors_lock:
+        configured = _compressors.get(key)
+    # Handle của job này có thể đọc metadata trước khi job khác ghi setting → tin compressor đã cache
+    if METADATA_METHOD in metadata or (configured is not None and not configured.is_identity):
+        current = get_collection_compressor(collection)
+        requested = (method, dim if method != "none" else None, dtype)
+        expected = (current.method, current.dim, current.dtype)
+        if any(r is not None and r != e for r, e in zip(requested, expected)):
+            raise ValueError(
+                f"Collection '{collection.name}' uses compression {current.to_dict()}, "
+                f"cannot ingest with method={method}, dim={dim}, dtype={dtype}"
+            )
+        return current
+
+    empty = collection.count() == 0
+    if method is None:
+        method = EMBEDDING_COMPRESSION if empty else "none"
+    if dtype is None:
+        dtype = EMBEDDING_COMPRESSION_DTYPE if empty else "float32"
+    compressor = EmbeddingCompressor(method=method, dim=dim or EMBEDDING_COMPRESSION_DIM, dtype=dtype)
+    if compressor.is_identity:
+        return compressor
+    if not empty:
+        raise ValueError(
+            f"Collection '{collection.name}' already stores full embeddings, "
+            "compression can only be set on an empty collection"
+        )
+    # Chroma không cho đổi hnsw:* qua modify → chỉ ghi lại các key khác
+    new_metadata = {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}
+    new_metadata.update(compressor.to_metadata())
+    collection.modify(metadata=new_metadata)
+    _invalidate(collection.name)
+    with _compressors_lock:
+        _compressors[key] = compressor
+    print(f"[Compression] Collection '{collection.name}': {compressor.to_dict()}")
+    return compressor
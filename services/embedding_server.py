@@ -0,0 +1,361 @@
+# services/embedding_server.py
+"""
+Embedding server dùng chung cho nhiều uvicorn worker trên cùng máy.
+
+Một process duy nhất giữ model (RAM chỉ tốn 1 lần) và nhận request qua Unix socket
+(multiprocessing.connection). Request encode từ mọi worker được gom thành batch chung.
+
+Query (chat) luôn được phục vụ trước việc bulk (ingest encode_bulk / encode_hybrid nhiều text):
+request bulk được chia thành các slice EMBEDDING_SERVER_BULK_SLICE text, giữa 2 slice worker
+chạy hết các query đang chờ → 1 lần ingest lớn không chặn query của các worker khác.
+
+Chạy server:
+    python -m services.embedding_server
+Sau đó set EMBEDDING_SERVER_SOCKET cho các worker để get_embedding_service() trả về
+EmbeddingClient thay vì tự load model.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from multiprocessing.connection import Listener
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.embedding_service import (
+    EMBEDDING_SERVER_SOCKET,
+    EmbeddingService,
+    create_embedding_server_authkey,
+)
+
+load_dotenv()
+
+# Số text tối đa mỗi lần gom batch và thời gian tối đa chờ gom thêm request (ms)
+EMBEDDING_SERVER_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH_SIZE", 64))
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", 5))
+# Số text mỗi slice khi chạy request bulk (query chen vào giữa các slice)
+EMBEDDING_SERVER_BULK_SLICE = int(os.getenv("EMBEDDING_SERVER_BULK_SLICE", 256))
+
+# Method của EmbeddingService mà client được phép gọi
+ALLOWED_METHODS = ("encode", "encode_bulk", "encode_hybrid", "count_tokens", "get_model_info", "stats")
+
+# Method chia được theo slice (kết quả ghép lại theo thứ tự text)
+SLICEABLE_METHODS = ("encode_bulk", "encode_hybrid")
+
+_METRICS_WINDOW = 1000
+# Thứ tự ưu tiên trong queue: số nhỏ chạy trước
+_PRIORITY_QUERY = 0
+_PRIORITY_BULK = 1
+
+
+class _Request:
+    __slots__ = ("req_id", "method", "args", "kwargs", "reply", "enqueued", "priority", "seq", "job")
+
+    def __init__(self, req_id: int, method: str, args: tuple, kwargs: dict, reply: Callable, priority: int = _PRIORITY_QUERY):
+        self.req_id = req_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.reply = reply
+        self.enqueued = time.perf_counter()
+        self.priority = priority
+        self.seq = 0
+        # _BulkJob nếu request là 1 slice của request bulk
+        self.job: Optional["_BulkJob"] = None
+
+    def __lt__(self, other: "_Request") -> bool:
+        # PriorityQueue: query trước bulk, cùng mức thì FIFO
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def batch_key(self):
+        """Chỉ gom chung các request encode (query) có cùng tham số (normalize_embeddings, ...)"""
+        if self.method != "encode" or self.priority != _PRIORITY_QUERY or not isinstance(self.args[0], list):
+            return None
+        return tuple(sorted((k, v) for k, v in self.kwargs.items() if k != "batch_size"))
+
+
+def _merge_bulk_stats(parts: List[Dict]) -> Dict:
+    merged = {key: sum(part[key] for part in parts) for key in ("texts", "batches", "tokens", "padded_tokens")}
+    seconds = sum(part["seconds"] for part in parts)
+    merged["padding_ratio"] = round(1 - merged["tokens"] / merged["padded_tokens"], 4) if merged["padded_tokens"] else 0.0
+    merged["seconds"] = round(seconds, 4)
+    merged["tokens_per_sec"] = round(merged["tokens"] / seconds, 1) if seconds > 0 else 0.0
+    return merged
+
+
+def _merge_results(parts: list):
+    """Ghép kết quả các slice: array nối theo hàng, list nối tiếp, stats của encode_bulk cộng dồn"""
+    first = parts[0]
+    if isinstance(first, tuple):
+        return tuple(_merge_results(list(column)) for column in zip(*parts))
+    if isinstance(first, list):
+        return [item for part in parts for item in part]
+    if isinstance(first, dict):
+        return _merge_bulk_stats(parts)
+    return np.concatenate([np.asarray(part) for part in parts], axis=0)
+
+
+class _BulkJob:
+    """Gom kết quả các slice của 1 request bulk, trả lời client 1 lần khi đủ (hoặc ngay khi 1 slice lỗi)"""
+
+    def __init__(self, request_reply: Callable, req_id: int, slices: int):
+        self.reply = request_reply
+        self.req_id = req_id
+        self.parts: List[Optional[object]] = [None] * slices
+        self.remaining = slices
+        self.failed = False
+
+    def slice_reply(self, index: int) -> Callable:
+        def reply(_req_id: int, ok: bool, payload):
+            if self.failed:
+                return
+            if not ok:
+                self.failed = True
+                self.reply(self.req_id, False, payload)
+                return
+            self.parts[index] = payload
+            self.remaining -= 1
+            if self.remaining == 0:
+                try:
+                    merged = _merge_results(self.parts)
+                except Exception as e:
+                    self.reply(self.req_id, False, e)
+                    return
+                self.reply(self.req_id, True, merged)
+
+        return reply
+
+
+class EmbeddingServer:
+    """
+    Mỗi connection có 1 thread đọc request và đẩy vào queue chung; 1 worker thread duy nhất
+    chạy model: gom các request encode (tối đa max_batch_size text hoặc max_wait_ms) thành
+    1 lần encode rồi chia kết quả trả về từng client.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        socket_path: str = None,
+        max_batch_size: int = None,
+        max_wait_ms: float = None,
+        bulk_slice: int = None,
+    ):
+        self.embedding_service = embedding_service
+        self.socket_path = socket_path or EMBEDDING_SERVER_SOCKET or "/tmp/ragflow-embedding.sock"
+        self.max_batch_size = max_batch_size or EMBEDDING_SERVER_MAX_BATCH_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else EMBEDDING_SERVER_MAX_WAIT_MS) / 1000
+        self.bulk_slice = bulk_slice or EMBEDDING_SERVER_BULK_SLICE
+
+        # Query trước bulk; request lấy ra khi gom batch mà không gom chung được thì đặt lại đúng vị trí cũ
+        self._queue: "queue.PriorityQueue[_Request]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._connections = 0
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes: Counter = Counter()
+        self._requests_per_batch: Counter = Counter()
+        self._queue_delays_ms: deque = deque(maxlen=_METRICS_WINDOW)
+        self._lock = threading.Lock()
+
+    # ===== Network =====
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        listener = Listener(
+            self.socket_path, family="AF_UNIX", authkey=create_embedding_server_authkey(self.socket_path)
+        )
+        # Chỉ user của server được kết nối (connection mang pickle)
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._worker_loop, name="embedding-server-worker", daemon=True).start()
+        print(f"[EmbeddingServer] Listening on {self.socket_path} (max batch {self.max_batch_size}, "
+              f"max wait {self.max_wait * 1000:.1f} ms)")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Sai authkey / client ngắt giữa chừng: bỏ qua, tiếp tục phục vụ
+                    print(f"[EmbeddingServer] Rejected connection: {type(e).__name__}: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def _serve_connection(self, conn):
+        send_lock = threading.Lock()
+
+        def reply(req_id: int, ok: bool, payload):
+            with send_lock:
+                try:
+                    conn.send((req_id, ok, payload))
+                    return
+                except OSError:
+                    return  # Client đã ngắt kết nối
+                except Exception as e:
+                    # Kết quả / exception không pickle được: pickle lỗi trước khi ghi nên connection vẫn dùng được
+                    print(f"[EmbeddingServer] Cannot send reply for request {req_id}: {type(e).__name__}: {e}")
+                    detail = f"{type(payload).__name__}" if ok else f"{type(payload).__name__}: {payload}"[:1000]
+                    error = RuntimeError(f"Embedding server cannot send reply ({detail}): {type(e).__name__}: {e}")
+                try:
+                    conn.send((req_id, False, error))
+                except Exception as e:
+                    print(f"[EmbeddingServer] Cannot send error for request {req_id}: {type(e).__name__}: {e}")
+
+        with self._lock:
+            self._connections += 1
+        try:
+            while True:
+                try:
+                    req_id, method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if method not in ALLOWED_METHODS:
+                    reply(req_id, False, ValueError(f"Unsupported method '{method}'"))
+                    continue
+                self._submit(_Request(req_id, method, args, kwargs, reply))
+        finally:
+            with self._lock:
+                self._connections -= 1
+            conn.close()
+
+    # ===== Batching =====
+
+    def _is_bulk(self, request: _Request) -> bool:
+        if request.method == "encode_bulk":
+            return True
+        texts = request.args[0] if request.args else None
+        return request.method in ("encode", "encode_hybrid") and isinstance(texts, list) and len(texts) > self.max_batch_size
+
+    def _enqueue(self, request: _Request):
+        request.seq = next(self._seq)
+        self._queue.put(request)
+
+    def _submit(self, request: _Request):
+        """Query vào thẳng queue; bulk xếp sau mọi query, chia slice nếu method cho phép"""
+        if not self._is_bulk(request):
+            self._enqueue(request)
+            return
+        request.priority = _PRIORITY_BULK
+        texts = request.args[0]
+        if request.method not in SLICEABLE_METHODS or len(texts) <= self.bulk_slice:
+            self._enqueue(request)
+            return
+        starts = range(0, len(texts), self.bulk_slice)
+        job = _BulkJob(request.reply, request.req_id, len(starts))
+        for index, start in enumerate(starts):
+            args = (texts[start:start + self.bulk_slice], *request.args[1:])
+            part = _Request(request.req_id, request.method, args, request.kwargs, job.slice_reply(index), _PRIORITY_BULK)
+            part.enqueued = request.enqueued
+            part.job = job
+            self._enqueue(part)
+
+    def _next_request(self, timeout: float = None) -> _Request:
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        """Gom thêm request encode cùng batch_key tới khi đủ max_batch_size text hoặc hết max_wait"""
+        batch = [first]
+        key = first.batch_key()
+        size = len(first.args[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._next_request(timeout=timeout)
+            except queue.Empty:
+                break
+            if request.batch_key() != key or size + len(request.args[0]) > self.max_batch_size:
+                # Không gom chung được: trả lại queue với seq cũ, xử lý ngay sau batch này
+                self._queue.put(request)
+                break
+            batch.append(request)
+            size += len(request.args[0])
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            try:
+                first = self._next_request()
+                if first.batch_key() is not None:
+                    self._run_encode_batch(self._collect(first))
+                else:
+                    self._run_single(first)
+            except Exception as e:
+                # 1 worker duy nhất: lỗi ngoài dự kiến không được làm chết thread (mọi client sẽ treo)
+                print(f"[EmbeddingServer] Worker error: {type(e).__name__}: {e}")
+
+    def _run_encode_batch(self, batch: List[_Request]):
+        texts = [text for request in batch for text in request.args[0]]
+        started = time.perf_counter()
+        try:
+            embeddings = self.embedding_service.encode(
+                texts, **{**batch[0].kwargs, "batch_size": max(1, min(len(texts), self.max_batch_size))}
+            )
+        except Exception as e:
+            for request in batch:
+                request.reply(request.req_id, False, e)
+            return
+        offset = 0
+        for request in batch:
+            count = len(request.args[0])
+            request.reply(request.req_id, True, np.asarray(embeddings[offset:offset + count]))
+            offset += count
+        with self._lock:
+            self._requests += len(batch)
+            self._batches += 1
+            self._batch_sizes[len(texts)] += 1
+            self._requests_per_batch[len(batch)] += 1
+            self._queue_delays_ms.extend((started - request.enqueued) * 1000 for request in batch)
+
+    def _run_single(self, request: _Request):
+        """Request không gom batch (bulk / slice bulk / method khác); slice của job đã lỗi thì bỏ qua"""
+        if request.job is not None and request.job.failed:
+            return
+        try:
+            if request.method == "stats":
+                result = self.stats()
+            else:
+                result = getattr(self.embedding_service, request.method)(*request.args, **request.kwargs)
+        except Exception as e:
+            request.reply(request.req_id, False, e)
+            return
+        request.reply(request.req_id, True, result)
+        with self._lock:
+            self._requests += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            delays = np.fromiter(self._queue_delays_ms, dtype=np.float64)
+            return {
+                "socket_path": self.socket_path,
+                "connections": self._connections,
+                "requests": self._requests,
+                "encode_batches": self._batches,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "requests_per_batch_histogram": dict(sorted(self._requests_per_batch.items())),
+                "queue_delay_ms": {
+                    "avg": round(float(delays.mean()), 3) if delays.size else 0.0,
+                    "p95": round(float(np.percentile(delays, 95)), 3) if delays.size else 0.0,
+                },
+                "pending": self._queue.qsize(),
+            }
+
+
+def main():
+    # Server luôn tự load model (không đi qua get_embedding_service, vốn trả về client khi có socket)
+    server = EmbeddingServer(EmbeddingService())
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
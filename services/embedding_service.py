@@ -1,14 +1,87 @@
 # services/embedding_service.py
 from sentence_transformers import SentenceTransformer
 import torch
+import asyncio
+import itertools
+import math
 import os
-from functools import lru_cache
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client
+from functools import lru_cache, partial
 from dotenv import load_dotenv
-from typing import List, Union
+from typing import Dict, List, Tuple, Union
 import numpy as np
 
 load_dotenv()
 
+# Số thread của executor riêng cho inference (aencode/aencode_single)
+EMBEDDING_EXECUTOR_THREADS = int(os.getenv("EMBEDDING_EXECUTOR_THREADS", 1))
+# Số thread torch dùng cho 1 forward pass (intra-op) và giữa các op (inter-op); 0 = mặc định của torch
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", 0))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", 0))
+# torch: PyTorch (mặc định); onnx: ONNX Runtime fp32; onnx-int8: ONNX Runtime quantize int8 (CPU)
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Thư mục lưu model đã export ONNX và cấu hình quantize (arm64 | avx2 | avx512 | avx512_vnni)
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./models/onnx")
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+# encode_bulk: tổng số token (kể cả padding) tối đa mỗi forward pass và số text tối đa mỗi batch
+EMBEDDING_BATCH_TOKEN_BUDGET = int(os.getenv("EMBEDDING_BATCH_TOKEN_BUDGET", 16384))
+EMBEDDING_BULK_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_BULK_MAX_BATCH_SIZE", 256))
+# Số process encode song song cho ingest (0 = tắt), mỗi process giữ 1 bản model
+EMBEDDING_POOL_WORKERS = int(os.getenv("EMBEDDING_POOL_WORKERS", 0))
+# Chỉ chia cho pool khi 1 lần encode_bulk có ít nhất chừng này text (batch nhỏ thì overhead IPC lớn hơn lợi ích)
+EMBEDDING_POOL_MIN_TEXTS = int(os.getenv("EMBEDDING_POOL_MIN_TEXTS", 128))
+# Nếu set: dùng embedding server chung (python -m services.embedding_server) qua Unix socket
+# thay vì mỗi process tự load model
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+# Authkey của embedding server: không có giá trị mặc định. Để trống thì server sinh key ngẫu nhiên mỗi lần
+# start và ghi vào file 0600 (mặc định <socket>.key), worker chạy cùng user đọc key từ file đó
+EMBEDDING_SERVER_AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY", "")
+EMBEDDING_SERVER_AUTHKEY_FILE = os.getenv("EMBEDDING_SERVER_AUTHKEY_FILE", "")
+# Thời gian tối đa chờ server sẵn sàng khi client kết nối (server có thể đang load model)
+EMBEDDING_SERVER_CONNECT_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_CONNECT_TIMEOUT", 120))
+
+
+
+def _authkey_path(socket_path: str) -> str:
+    return EMBEDDING_SERVER_AUTHKEY_FILE or f"{socket_path}.key"
+
+
+def create_embedding_server_authkey(socket_path: str) -> bytes:
+    """Authkey cho server: từ env, hoặc key ngẫu nhiên mới ghi vào file chỉ owner đọc được"""
+    if EMBEDDING_SERVER_AUTHKEY:
+        return EMBEDDING_SERVER_AUTHKEY.encode("utf-8")
+    key = secrets.token_hex(32).encode("ascii")
+    path = _authkey_path(socket_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    # replace không ghi đè được file của user khác trong thư mục sticky (/tmp) → lỗi thay vì dùng key lạ
+    os.replace(tmp_path, path)
+    return key
+
+
+def read_embedding_server_authkey(socket_path: str) -> bytes:
+    """Authkey cho client: từ env, hoặc file key của server (phải thuộc user hiện tại và không ai khác đọc được)"""
+    if EMBEDDING_SERVER_AUTHKEY:
+        return EMBEDDING_SERVER_AUTHKEY.encode("utf-8")
+    path = _authkey_path(socket_path)
+    fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    with os.fdopen(fd, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            raise PermissionError(f"Embedding server key file {path} must be owned by this user with mode 0600")
+        return f.read().strip()
+
+
+# Head sparse (lexical weights) của bge-m3: Linear(hidden, 1) trên token embeddings, file nằm cạnh model
+EMBEDDING_SPARSE_HEAD_FILE = os.getenv("EMBEDDING_SPARSE_HEAD_FILE", "sparse_linear.pt")
+
 
 class EmbeddingService:
     """
@@ -17,29 +90,25 @@ class EmbeddingService:
     Model luôn ở 1 đường dẫn duy nhất, device luôn là cuda.
     """
 
-    def __init__(self):
+    def __init__(self, backend: str = None):
         """
         Load model và device từ .env.
         Model path và device được set cố định từ cấu hình.
+
+        Args:
+            backend: Ghi đè EMBEDDING_BACKEND (torch | onnx | onnx-int8), dùng cho benchmark
         """
         self.model_name = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
         self.cache_folder = os.getenv("EMBEDDING_CACHE_FOLDER", None)
         self.device = os.getenv("EMBEDDING_DEVICE", "cuda")
+        self.backend = backend or EMBEDDING_BACKEND
+        if self.backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unsupported EMBEDDING_BACKEND '{self.backend}', expected one of {EMBEDDING_BACKENDS}")
         
         print(f"Loading embedding model: {self.model_name}")
         print(f"Cache folder: {self.cache_folder or 'default (~/.cache/huggingface/)'}")
         print(f"Device: {self.device}")
-        
-        if self.cache_folder:
-            self.model = SentenceTransformer(self.model_name, cache_folder=self.cache_folder)
-        else:
-            self.model = SentenceTransformer(self.model_name)
-        
-        if self.model is None:
-            raise ValueError("Model failed to load - model is None")
-        
-        if not hasattr(self.model, '_modules') or len(self.model._modules) == 0:
-            raise ValueError("Model loaded but has no modules")
+        print(f"Backend: {self.backend}")
         
         if self.device == "cuda" and torch.cuda.is_available():
             print(f"Model will use GPU: {torch.cuda.get_device_name(0)}")
@@ -48,9 +117,77 @@ class EmbeddingService:
                 print("Warning: CUDA requested but not available, falling back to CPU")
                 self.device = "cpu"
             print("Model will use CPU")
+
+        if self.backend == "torch":
+            if self.cache_folder:
+                self.model = SentenceTransformer(self.model_name, cache_folder=self.cache_folder)
+            else:
+                self.model = SentenceTransformer(self.model_name)
+        else:
+            self.model = self._load_onnx_model(quantize=self.backend == "onnx-int8")
         
+        if self.model is None:
+            raise ValueError("Model failed to load - model is None")
+        
+        if not hasattr(self.model, '_modules') or len(self.model._modules) == 0:
+            raise ValueError("Model loaded but has no modules")
+        
+        if TORCH_NUM_THREADS > 0:
+            torch.set_num_threads(TORCH_NUM_THREADS)
+        if TORCH_INTEROP_THREADS > 0:
+            try:
+                torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+            except RuntimeError as e:
+                # Chỉ set được trước khi torch chạy tác vụ song song đầu tiên
+                print(f"Warning: could not set torch inter-op threads: {e}")
+        print(f"Torch threads: intra-op {torch.get_num_threads()}, executor threads {EMBEDDING_EXECUTOR_THREADS}")
+
+        # Inference chạy trên executor riêng để không block event loop của FastAPI
+        self._executor = ThreadPoolExecutor(
+            max_workers=EMBEDDING_EXECUTOR_THREADS, thread_name_prefix="embedding"
+        )
+        # Multi-process pool cho ingest, chỉ start khi cần lần đầu (xem get_pool)
+        self.pool_workers = EMBEDDING_POOL_WORKERS
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Head sparse chỉ load khi encode_hybrid được gọi lần đầu
+        self._sparse_head = None
+        self._sparse_lock = threading.Lock()
+
         print(f"Embedding model loaded successfully!")
     
+    def _load_onnx_model(self, quantize: bool = False) -> SentenceTransformer:
+        """
+        Load model chạy trên ONNX Runtime. Lần đầu export model sang ONNX (và quantize int8
+        nếu cần) rồi lưu vào EMBEDDING_ONNX_DIR, các lần sau load thẳng file đã export.
+        Cần cài thêm: pip install "sentence-transformers[onnx]"
+        """
+        # Import lazy: chỉ cần khi dùng backend ONNX
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        onnx_dir = os.path.join(EMBEDDING_ONNX_DIR, self.model_name.replace("/", "__"))
+        onnx_file = os.path.join(onnx_dir, "onnx", "model.onnx")
+        if not os.path.exists(onnx_file):
+            print(f"Exporting {self.model_name} to ONNX: {onnx_dir} (one-time, may take a few minutes)")
+            model = SentenceTransformer(
+                self.model_name, backend="onnx", device=self.device, cache_folder=self.cache_folder
+            )
+            model.save_pretrained(onnx_dir)
+        if not quantize:
+            return SentenceTransformer(onnx_dir, backend="onnx", device=self.device)
+
+        quantized_file = f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+        if not os.path.exists(os.path.join(onnx_dir, quantized_file)):
+            print(f"Quantizing ONNX model to int8 ({EMBEDDING_ONNX_QUANTIZATION}): {quantized_file}")
+            export_dynamic_quantized_onnx_model(
+                SentenceTransformer(onnx_dir, backend="onnx", device=self.device),
+                quantization_config=EMBEDDING_ONNX_QUANTIZATION,
+                model_name_or_path=onnx_dir,
+            )
+        return SentenceTransformer(
+            onnx_dir, backend="onnx", device=self.device, model_kwargs={"file_name": quantized_file}
+        )
+
     def encode(
         self,
         texts: Union[str, List[str]],
@@ -85,19 +222,484 @@ class EmbeddingService:
         """Encode một text duy nhất, trả về numpy array 1D"""
         embeddings = self.encode([text], **kwargs)
         return embeddings[0] if isinstance(embeddings, np.ndarray) else embeddings[0]
+
+    def _load_sparse_head(self):
+        """
+        Load weight/bias của head sparse (bge-m3 sparse_linear.pt): từ thư mục model nếu
+        EMBEDDING_MODEL là đường dẫn local, ngược lại tải từ HuggingFace Hub (cùng cache_folder).
+        """
+        with self._sparse_lock:
+            if self._sparse_head is not None:
+                return self._sparse_head
+            if os.path.isdir(self.model_name):
+                path = os.path.join(self.model_name, EMBEDDING_SPARSE_HEAD_FILE)
+            else:
+                from huggingface_hub import hf_hub_download
+
+                path = hf_hub_download(self.model_name, EMBEDDING_SPARSE_HEAD_FILE, cache_dir=self.cache_folder)
+            state = torch.load(path, map_location="cpu", weights_only=True)
+            weight = state["weight"].reshape(-1).float().to(self.device)
+            bias = state["bias"].reshape(-1).float().to(self.device)
+            special_ids = set(self.tokenizer.all_special_ids)
+            self._sparse_head = (weight, bias, special_ids)
+            print(f"[EmbeddingService] Loaded sparse head: {path}")
+            return self._sparse_head
+
+    def encode_hybrid(
+        self,
+        texts: Union[str, List[str]],
+        batch_size: int = 64,
+        normalize_embeddings: bool = False,
+    ) -> Tuple[np.ndarray, List[Dict[int, float]]]:
+        """
+        Encode 1 lần ra cả dense embedding và sparse lexical weights (kiểu bge-m3):
+        weight(token) = relu(token_embedding · w + b), bỏ special token, token lặp lại lấy max.
+
+        Returns:
+            (embeddings (n, dim) float32, list dict {token_id: weight} cùng thứ tự với texts)
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        weight, bias, special_ids = self._load_sparse_head()
+        # output_value=None: trả về toàn bộ features của từng text (sentence_embedding, token_embeddings, input_ids, ...)
+        outputs = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            output_value=None,
+            convert_to_numpy=False,
+            device=self.device,
+        )
+        dense = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        sparse: List[Dict[int, float]] = []
+        with torch.inference_mode():
+            for row, features in enumerate(outputs):
+                embedding = features["sentence_embedding"].float()
+                if normalize_embeddings:
+                    embedding = torch.nn.functional.normalize(embedding, dim=-1)
+                dense[row] = embedding.cpu().numpy()
+                mask = features["attention_mask"].bool()
+                token_weights = torch.relu(features["token_embeddings"][mask].float().to(weight.device) @ weight + bias)
+                weights: Dict[int, float] = {}
+                for token_id, value in zip(features["input_ids"][mask].tolist(), token_weights.tolist()):
+                    if value > 0 and token_id not in special_ids and value > weights.get(token_id, 0.0):
+                        weights[token_id] = value
+                sparse.append(weights)
+        return dense, sparse
     
+    def plan_bulk_batches(
+        self, lengths: List[int], token_budget: int = None, max_batch_size: int = None
+    ) -> List[List[int]]:
+        """
+        Chia index các text thành batch theo độ dài token: sắp xếp giảm dần rồi gom liên tiếp
+        sao cho số_text × độ_dài_dài_nhất ≤ token_budget (text cùng độ dài nằm chung batch
+        → ít padding; text ngắn được gom nhiều hơn mỗi batch).
+        """
+        token_budget = token_budget or EMBEDDING_BATCH_TOKEN_BUDGET
+        max_batch_size = max_batch_size or EMBEDDING_BULK_MAX_BATCH_SIZE
+        # Dài nhất trước: nếu budget quá lớn gây OOM thì lỗi xuất hiện ngay batch đầu
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        batch_max = 0
+        for i in order:
+            if batch and ((len(batch) + 1) * batch_max > token_budget or len(batch) >= max_batch_size):
+                batches.append(batch)
+                batch = []
+            if not batch:
+                batch_max = lengths[i]
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def encode_bulk(
+        self,
+        texts: List[str],
+        token_budget: int = None,
+        max_batch_size: int = None,
+        normalize_embeddings: bool = False,
+        return_stats: bool = False,
+        return_sparse: bool = False,
+    ) -> Union[np.ndarray, Tuple]:
+        """
+        Encode nhiều text (ingest) với batch theo độ dài token thay vì batch_size cố định.
+        Kết quả giữ đúng thứ tự đầu vào.
+
+        Args:
+            texts: Danh sách text
+            token_budget: Tổng token (kể cả padding) tối đa mỗi batch, mặc định EMBEDDING_BATCH_TOKEN_BUDGET
+            max_batch_size: Số text tối đa mỗi batch, mặc định EMBEDDING_BULK_MAX_BATCH_SIZE
+            return_stats: Trả thêm dict thống kê (tokens, padding_ratio, tokens_per_sec, batches)
+            return_sparse: Encode bằng encode_hybrid, trả thêm sparse lexical weights (không dùng pool)
+
+        Returns:
+            Numpy array (len(texts), dim), kèm sparse (list dict) nếu return_sparse=True
+            và stats nếu return_stats=True, theo thứ tự đó
+        """
+        start = time.perf_counter()
+        max_len = self.max_seq_length
+        # Model truncate ở max_seq_length nên độ dài thực tế không vượt quá
+        lengths = [min(n, max_len) for n in self.count_tokens(texts)] if texts else []
+        batches = self.plan_bulk_batches(lengths, token_budget, max_batch_size)
+        pool = self.get_pool() if len(texts) >= EMBEDDING_POOL_MIN_TEXTS and not return_sparse else None
+        sparse: List[Dict[int, float]] = [{} for _ in texts] if return_sparse else None
+
+        if pool is not None:
+            embeddings, padded_tokens, batches_count = self._encode_bulk_pool(
+                pool, texts, lengths, batches, normalize_embeddings
+            )
+        else:
+            embeddings = None
+            padded_tokens = 0
+            batches_count = len(batches)
+            for batch in batches:
+                batch_texts = [texts[i] for i in batch]
+                if return_sparse:
+                    batch_embeddings, batch_sparse = self.encode_hybrid(
+                        batch_texts, batch_size=len(batch), normalize_embeddings=normalize_embeddings
+                    )
+                    for i, weights in zip(batch, batch_sparse):
+                        sparse[i] = weights
+                else:
+                    batch_embeddings = self.encode(
+                        batch_texts,
+                        batch_size=len(batch),
+                        convert_to_numpy=True,
+                        normalize_embeddings=normalize_embeddings,
+                    )
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+                embeddings[batch] = batch_embeddings
+                padded_tokens += len(batch) * max(lengths[i] for i in batch)
+        if embeddings is None:
+            embeddings = np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        outputs = (embeddings, sparse) if return_sparse else (embeddings,)
+        if not return_stats:
+            return outputs if return_sparse else embeddings
+        elapsed = time.perf_counter() - start
+        tokens = sum(lengths)
+        stats = {
+            "texts": len(texts),
+            "batches": batches_count,
+            "tokens": tokens,
+            "padded_tokens": padded_tokens,
+            "padding_ratio": round(1 - tokens / padded_tokens, 4) if padded_tokens else 0.0,
+            "seconds": round(elapsed, 4),
+            "tokens_per_sec": round(tokens / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        return (*outputs, stats)
+
+    def _encode_bulk_pool(
+        self,
+        pool,
+        texts: List[str],
+        lengths: List[int],
+        batches: List[List[int]],
+        normalize_embeddings: bool,
+    ) -> Tuple[np.ndarray, int, int]:
+        """
+        Chia encode_bulk cho multi-process pool: text đi theo thứ tự đã sắp theo độ dài,
+        mỗi worker nhận các đoạn liên tiếp nên text trong cùng batch vẫn có độ dài gần nhau.
+        Pool chỉ nhận 1 batch_size chung → dùng batch size trung bình của plan theo token budget
+        (không lớn hơn 1 đoạn để mọi worker đều có việc).
+        """
+        order = [i for batch in batches for i in batch]
+        # Mỗi worker nhận ~4 đoạn để worker xong sớm lấy tiếp đoạn khác (cân bằng tải)
+        chunk_size = math.ceil(len(texts) / (self.pool_workers * 4))
+        batch_size = max(1, min(round(len(texts) / len(batches)), chunk_size))
+        sorted_embeddings = self.model.encode(
+            [texts[i] for i in order],
+            pool=pool,
+            batch_size=batch_size,
+            chunk_size=chunk_size,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize_embeddings,
+        )
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        sorted_lengths = [lengths[i] for i in order]
+        # Ước lượng padding: worker chia đoạn liên tiếp (đã sort) thành batch batch_size text
+        starts = range(0, len(order), batch_size)
+        padded_tokens = sum(
+            len(sorted_lengths[start:start + batch_size]) * max(sorted_lengths[start:start + batch_size])
+            for start in starts
+        )
+        return embeddings, padded_tokens, len(starts)
+
+    def get_pool(self):
+        """Pool process encode (start lazy lần đầu, dùng lại cho mọi ingest job); None nếu tắt"""
+        if self.pool_workers <= 0:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self._start_pool(self.pool_workers)
+            return self._pool
+
+    def _start_pool(self, workers: int):
+        """Start `workers` process, mỗi process load 1 bản model trên self.device"""
+        t0 = time.perf_counter()
+        # Chia đều CPU cho các worker, tránh mỗi process dùng hết số core (oversubscription).
+        # Worker được spawn nên đọc env lúc import torch → set tạm env trước khi start
+        threads = str(max(1, (os.cpu_count() or 1) // workers))
+        saved_env = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({name: threads for name in saved_env})
+        try:
+            pool = self.model.start_multi_process_pool(target_devices=[self.device] * workers)
+        finally:
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        print(
+            f"[EmbeddingService] Started encode pool: {workers} workers × {threads} threads "
+            f"({time.perf_counter() - t0:.1f} s)"
+        )
+        return pool
+
+    def stop_pool(self):
+        """Dừng multi-process pool nếu đang chạy"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+                print("[EmbeddingService] Stopped encode pool")
+
+    def set_pool_workers(self, workers: int):
+        """Đổi số worker của pool (pool cũ bị dừng, pool mới start lazy ở lần encode_bulk kế tiếp)"""
+        self.stop_pool()
+        self.pool_workers = workers
+
+    async def aencode(self, texts: Union[str, List[str]], **kwargs) -> Union[np.ndarray, List[np.ndarray]]:
+        """Bản async của encode: chạy trên embedding executor, event loop vẫn phục vụ request khác"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.encode, texts, **kwargs))
+
+    async def aencode_single(self, text: str, **kwargs) -> np.ndarray:
+        """Bản async của encode_single"""
+        embeddings = await self.aencode([text], **kwargs)
+        return embeddings[0]
+
+    async def aencode_hybrid(self, texts: Union[str, List[str]], **kwargs) -> Tuple[np.ndarray, List[Dict[int, float]]]:
+        """Bản async của encode_hybrid (chạy trên embedding executor)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.encode_hybrid, texts, **kwargs))
+
+    def shutdown(self):
+        """Dừng embedding executor và multi-process pool (gọi khi app shutdown)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.stop_pool()
+
+    @property
+    def cache_key(self) -> str:
+        """Định danh model dùng làm namespace cho EmbeddingCache (backend khác cho vector khác)"""
+        if self.backend == "torch":
+            return self.model_name
+        return f"{self.model_name}:{self.backend}"
+
+    @property
+    def tokenizer(self):
+        """Tokenizer của model (HuggingFace fast tokenizer), dùng cho chunking theo token"""
+        return self.model.tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        """Số token tối đa model nhận, phần vượt quá bị truncate khi encode"""
+        return self.model.max_seq_length
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Đếm số token (kể cả special tokens) của từng text bằng 1 lần gọi batch tokenizer"""
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
     def get_model_info(self) -> dict:
         """Lấy thông tin về model"""
         return {
             "model_name": self.model_name,
+            "backend": self.backend,
             "device": self.device,
             "cache_folder": self.cache_folder,
+            "cache_key": self.cache_key,
             "max_seq_length": self.model.max_seq_length if hasattr(self.model, 'max_seq_length') else None,
             "embedding_dimension": self.model.get_sentence_embedding_dimension() if hasattr(self.model, 'get_sentence_embedding_dimension') else None
         }
 
 
+class EmbeddingClient:
+    """
+    Client mode của EmbeddingService: cùng API (encode, encode_single, aencode, encode_bulk,
+    encode_hybrid, count_tokens, ...) nhưng gửi request tới embedding server qua Unix socket, không load model.
+    Nhiều thread/coroutine dùng chung 1 connection; response được ghép theo request id.
+    """
+
+    def __init__(self, socket_path: str = None, connect_timeout: float = None):
+        self.socket_path = socket_path or EMBEDDING_SERVER_SOCKET
+        self.connect_timeout = connect_timeout if connect_timeout is not None else EMBEDDING_SERVER_CONNECT_TIMEOUT
+        self._conn = None
+        self._send_lock = threading.Lock()
+        # Chỉ 1 thread kết nối lại; giữ riêng với _send_lock để không chặn send khi đang chờ server
+        self._connect_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._tokenizer = None
+
+        info = self.get_model_info()
+        self.model_name = info["model_name"]
+        self.backend = info.get("backend", "torch")
+        self.device = info["device"]
+        self.cache_folder = os.getenv("EMBEDDING_CACHE_FOLDER", None)
+        self._cache_key = info.get("cache_key", self.model_name)
+        self._max_seq_length = info["max_seq_length"]
+        print(f"[EmbeddingClient] Connected to {self.socket_path}: {self.model_name} ({self.backend}, {self.device})")
+
+    def _connect(self, connect_timeout: float = None):
+        """Kết nối tới server, thử lại tới connect_timeout (worker có thể start trước server); gọi khi giữ _connect_lock"""
+        deadline = time.monotonic() + (self.connect_timeout if connect_timeout is None else connect_timeout)
+        while True:
+            try:
+                # Đọc lại key mỗi lần kết nối: server restart sinh key mới
+                conn = Client(self.socket_path, family="AF_UNIX", authkey=read_embedding_server_authkey(self.socket_path))
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"Embedding server not available at {self.socket_path}: {e}")
+                time.sleep(0.5)
+        with self._send_lock:
+            self._conn = conn
+        threading.Thread(target=self._receive_loop, args=(conn,), name="embedding-client", daemon=True).start()
+
+    def _receive_loop(self, conn):
+        while True:
+            try:
+                req_id, ok, payload = conn.recv()
+            except (EOFError, OSError) as e:
+                # Server tắt / restart: báo lỗi cho request đang chờ, lần gọi sau sẽ kết nối lại
+                with self._send_lock:
+                    if self._conn is conn:
+                        self._conn = None
+                    pending, self._pending = self._pending, {}
+                for future in pending.values():
+                    future.set_exception(ConnectionError(f"Embedding server connection lost: {e}"))
+                return
+            future = self._pending.pop(req_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(payload)
+
+    def _connection(self, fail_fast: bool = False):
+        """
+        Connection hiện tại, kết nối lại nếu đã mất. fail_fast (request query): không chờ thread khác
+        đang kết nối lại và chỉ thử 1 lần, server chưa lên thì raise ngay thay vì chờ tới connect_timeout.
+        """
+        conn = self._conn
+        if conn is not None:
+            return conn
+        if not self._connect_lock.acquire(blocking=not fail_fast):
+            raise ConnectionError(f"Embedding server at {self.socket_path} is reconnecting")
+        try:
+            if self._conn is None:
+                self._connect(0 if fail_fast else None)
+            return self._conn
+        finally:
+            self._connect_lock.release()
+
+    def _send(self, method: str, args: tuple, kwargs: dict, fail_fast: bool = False) -> Future:
+        future: Future = Future()
+        conn = self._connection(fail_fast)
+        with self._send_lock:
+            if self._conn is not conn:
+                raise ConnectionError("Embedding server connection lost")
+            req_id = next(self._ids)
+            self._pending[req_id] = future
+            try:
+                conn.send((req_id, method, args, kwargs))
+            except OSError as e:
+                self._pending.pop(req_id, None)
+                self._conn = None
+                raise ConnectionError(f"Embedding server connection lost: {e}")
+        return future
+
+    def _submit(self, method: str, *args, **kwargs) -> Future:
+        return self._send(method, args, kwargs)
+
+    async def _asubmit(self, method: str, *args, **kwargs):
+        # Kết nối lại / send payload lớn chạy trên thread, event loop chỉ chờ response
+        future = await asyncio.to_thread(self._send, method, args, kwargs, True)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, method: str, *args, **kwargs):
+        return self._submit(method, *args, **kwargs).result()
+
+    def encode(self, texts: Union[str, List[str]], show_progress_bar: bool = False, **kwargs):
+        return self._call("encode", texts, **kwargs)
+
+    def encode_single(self, text: str, **kwargs) -> np.ndarray:
+        return self.encode([text], **kwargs)[0]
+
+    def encode_bulk(self, texts: List[str], **kwargs):
+        return self._call("encode_bulk", texts, **kwargs)
+
+    def encode_hybrid(self, texts: Union[str, List[str]], **kwargs) -> Tuple[np.ndarray, List[Dict[int, float]]]:
+        return self._call("encode_hybrid", texts, **kwargs)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return self._call("count_tokens", texts)
+
+    async def aencode(self, texts: Union[str, List[str]], show_progress_bar: bool = False, **kwargs):
+        return await self._asubmit("encode", texts, **kwargs)
+
+    async def aencode_single(self, text: str, **kwargs) -> np.ndarray:
+        embeddings = await self.aencode([text], **kwargs)
+        return embeddings[0]
+
+    async def aencode_hybrid(self, texts: Union[str, List[str]], **kwargs) -> Tuple[np.ndarray, List[Dict[int, float]]]:
+        return await self._asubmit("encode_hybrid", texts, **kwargs)
+
+    def get_model_info(self) -> dict:
+        return self._call("get_model_info")
+
+    def server_stats(self) -> dict:
+        """Thống kê batching của embedding server (gom request từ mọi worker)"""
+        return self._call("stats")
+
+    @property
+    def cache_key(self) -> str:
+        return self._cache_key
+
+    @property
+    def max_seq_length(self) -> int:
+        return self._max_seq_length
+
+    @property
+    def tokenizer(self):
+        """Chỉ load tokenizer (nhẹ) ở client, dùng cho chunking theo token"""
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, cache_dir=self.cache_folder)
+        return self._tokenizer
+
+    def shutdown(self):
+        with self._send_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
 _embedding_service_instance = None
+# lru_cache không khoá khi miss: warm-up thread và executor của request đầu tiên có thể cùng vào
+# factory → load model 2 lần. Khoá này đảm bảo chỉ 1 thread khởi tạo, thread còn lại chờ rồi dùng chung.
+_embedding_service_lock = threading.Lock()
 
 
 @lru_cache(maxsize=1)
@@ -105,8 +707,14 @@ def get_embedding_service() -> EmbeddingService:
     """
     Singleton factory cho EmbeddingService với @lru_cache.
     Model và device được load từ .env, không cần truyền tham số.
+    Nếu EMBEDDING_SERVER_SOCKET được set thì trả về EmbeddingClient (model nằm ở embedding server).
     """
     global _embedding_service_instance
     if _embedding_service_instance is None:
-        _embedding_service_instance = EmbeddingService()
+        with _embedding_service_lock:
+            if _embedding_service_instance is None:
+                if EMBEDDING_SERVER_SOCKET:
+                    _embedding_service_instance = EmbeddingClient()
+                else:
+                    _embedding_service_instance = EmbeddingService()
     return _embedding_service_instance
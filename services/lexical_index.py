@@ -0,0 +1,572 @@
+# services/lexical_index.py
+"""
+Inverted index BM25 cho từng Chroma collection, dùng song song với dense retrieval
+(RAGService.retrieve_context gộp 2 bên bằng reciprocal-rank fusion).
+
+- Token: âm tiết tiếng Việt (giữ dấu, lowercase, NFC) + bigram âm tiết liền kề (xấp xỉ từ ghép,
+  tên sách / tên tác giả khớp cả cụm) + token "isbn:<digits>" cho ISBN-10/13 viết có hoặc không gạch.
+- Lưu trữ: mỗi collection là 1 thư mục gồm nhiều segment bất biến (CSR: term hash → postings),
+  file .npy mở bằng mmap nên load gần như tức thì và không tốn RAM cho postings không dùng tới.
+  Term được hash 64-bit (blake2b) → vocabulary là mảng uint64 đã sort, tra bằng searchsorted.
+- Cập nhật: ingest thêm segment mới (commit cuối mỗi job), xoá thì đánh dấu tombstone; quá
+  LEXICAL_MAX_SEGMENTS segment thì gộp các segment nhỏ nhất (bỏ luôn document đã xoá).
+- Nhiều process (uvicorn worker) dùng chung thư mục: ghi có file lock, đọc tự reload khi manifest đổi.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bật/tắt lexical index (tắt thì ingest không cập nhật và retrieve chỉ dùng dense)
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_DIR = os.getenv(
+    "LEXICAL_INDEX_DIR", os.path.join(os.getenv("CHROMADB_PATH", "./chroma_db"), "lexical")
+)
+# Thêm bigram âm tiết vào index (tăng kích thước index ~2 lần, khớp cụm từ tốt hơn nhiều)
+LEXICAL_BIGRAMS = os.getenv("LEXICAL_BIGRAMS", "true").lower() in ("1", "true", "yes")
+# Số segment tối đa trước khi gộp và số document mỗi segment khi build lại từ collection
+LEXICAL_MAX_SEGMENTS = int(os.getenv("LEXICAL_MAX_SEGMENTS", 16))
+LEXICAL_SEGMENT_DOCS = int(os.getenv("LEXICAL_SEGMENT_DOCS", 100_000))
+# Term xuất hiện trong hơn tỉ lệ này số document thì bỏ qua lúc query (IDF gần 0, postings rất dài)
+LEXICAL_MAX_DF_RATIO = float(os.getenv("LEXICAL_MAX_DF_RATIO", 0.5))
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+_SEGMENT_ARRAYS = ("terms", "offsets", "docs", "tfs", "impacts", "doc_len", "ids")
+_WORD_PATTERN = re.compile(r"\w+")
+# Chuỗi 10 hoặc 13 ký tự số (ký tự cuối có thể là X), cho phép gạch ngang / space ở giữa
+_ISBN_PATTERN = re.compile(r"(?<![\w-])(?:\d[\s-]?){9,12}[\dx](?![\w-])")
+_ISBN_SEPARATORS = re.compile(r"[\s-]")
+
+
+def tokenize_vi(text: str, bigrams: bool = None) -> List[str]:
+    """Tách term cho BM25: âm tiết + bigram âm tiết + ISBN chuẩn hoá (dùng chung cho document và query)"""
+    if bigrams is None:
+        bigrams = LEXICAL_BIGRAMS
+    text = unicodedata.normalize("NFC", text).lower()
+    terms = []
+    for match in _ISBN_PATTERN.finditer(text):
+        digits = _ISBN_SEPARATORS.sub("", match.group())
+        if len(digits) in (10, 13):
+            terms.append(f"isbn:{digits}")
+    words = _WORD_PATTERN.findall(text)
+    terms.extend(words)
+    if bigrams:
+        terms.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+@lru_cache(maxsize=1 << 20)
+def _term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _encode_ids(ids: Sequence[str]) -> np.ndarray:
+    if not len(ids):
+        return np.array([], dtype="S1")
+    return np.array([str(i).encode("utf-8") for i in ids], dtype=bytes)
+
+
+class _Segment:
+    """
+    1 segment bất biến dạng CSR:
+    terms (uint64, sort tăng dần) / offsets (int64, len(terms)+1) → docs (int32, ordinal trong segment)
+    + tfs (uint16) + impacts (float32, phần tf của BM25 tính sẵn); doc_len (int32) và ids (bytes) theo
+    ordinal; deleted là tombstone (bool, ghi lại được).
+
+    impacts = tf·(k1+1) / (tf + k1·(1 − b + b·dl/avgdl)) với avgdl của segment → query chỉ còn nhân IDF
+    (đổi BM25_K1 / BM25_B thì phải rebuild index). Segment build_weighted (vector thưa có sẵn trọng số)
+    dùng thẳng weight làm impacts, tfs = 0.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], deleted: np.ndarray = None, name: str = None):
+        self.name = name
+        for key in _SEGMENT_ARRAYS:
+            setattr(self, key, arrays[key])
+        self.deleted = deleted if deleted is not None else np.zeros(len(self.ids), dtype=bool)
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        self.live_count = int(len(self.deleted) - self.deleted.sum())
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str]) -> "_Segment":
+        hashes, ordinals, tfs = [], [], []
+        doc_len = np.zeros(len(texts), dtype=np.int32)
+        for ordinal, text in enumerate(texts):
+            counts = Counter(tokenize_vi(text or ""))
+            doc_len[ordinal] = sum(counts.values())
+            for term, tf in counts.items():
+                hashes.append(_term_hash(term))
+                ordinals.append(ordinal)
+                tfs.append(tf)
+        return cls._from_postings(
+            np.array(hashes, dtype=np.uint64),
+            np.array(ordinals, dtype=np.int32),
+            np.minimum(np.array(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_len,
+            _encode_ids(ids),
+        )
+
+    @classmethod
+    def build_weighted(cls, ids: Sequence[str], vectors: Sequence[Dict[int, float]]) -> "_Segment":
+        """Segment từ vector thưa có sẵn trọng số (term id → weight), impacts = weight, không có tf"""
+        hashes, ordinals, impacts = [], [], []
+        doc_len = np.zeros(len(vectors), dtype=np.int32)
+        for ordinal, vector in enumerate(vectors):
+            doc_len[ordinal] = len(vector)
+            hashes.extend(vector.keys())
+            impacts.extend(vector.values())
+            ordinals.extend([ordinal] * len(vector))
+        return cls._from_postings(
+            np.array(hashes, dtype=np.uint64),
+            np.array(ordinals, dtype=np.int32),
+            np.zeros(len(hashes), dtype=np.uint16),
+            doc_len,
+            _encode_ids(ids),
+            impacts=np.array(impacts, dtype=np.float32),
+        )
+
+    @classmethod
+    def _from_postings(cls, hashes, ordinals, tfs, doc_len, ids, impacts=None) -> "_Segment":
+        order = np.lexsort((ordinals, hashes))
+        hashes, ordinals, tfs = hashes[order], ordinals[order], tfs[order]
+        terms, starts = np.unique(hashes, return_index=True)
+        offsets = np.append(starts, len(hashes)).astype(np.int64)
+        if impacts is not None:
+            impacts = impacts[order]
+        else:
+            avgdl = max(1.0, float(doc_len.mean())) if len(doc_len) else 1.0
+            tf = tfs.astype(np.float32)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[ordinals].astype(np.float32) / avgdl)
+            impacts = (tf * (BM25_K1 + 1.0) / (tf + norm)).astype(np.float32)
+        return cls({
+            "terms": terms, "offsets": offsets, "docs": ordinals, "tfs": tfs,
+            "impacts": impacts, "doc_len": doc_len, "ids": ids,
+        })
+
+    @classmethod
+    def merge(cls, segments: List["_Segment"], recompute_impacts: bool = True) -> "_Segment":
+        """
+        Gộp nhiều segment thành 1, bỏ document đã bị tombstone.
+        recompute_impacts: tính lại BM25 từ tf với avgdl mới (False: giữ nguyên impacts, cho segment build_weighted)
+        """
+        parts = {"hashes": [], "ordinals": [], "tfs": [], "impacts": [], "doc_len": [], "ids": []}
+        base = 0
+        for segment in segments:
+            live = ~segment.deleted
+            remap = (np.cumsum(live, dtype=np.int64) - 1 + base).astype(np.int32)
+            docs = np.asarray(segment.docs)
+            keep = live[docs]
+            term_of_posting = np.repeat(np.asarray(segment.terms), np.diff(np.asarray(segment.offsets)))
+            parts["hashes"].append(term_of_posting[keep])
+            parts["ordinals"].append(remap[docs[keep]])
+            parts["tfs"].append(np.asarray(segment.tfs)[keep])
+            parts["impacts"].append(np.asarray(segment.impacts)[keep])
+            parts["doc_len"].append(np.asarray(segment.doc_len)[live])
+            parts["ids"].append(np.asarray(segment.ids)[live])
+            base += segment.live_count
+        return cls._from_postings(
+            np.concatenate(parts["hashes"]).astype(np.uint64),
+            np.concatenate(parts["ordinals"]).astype(np.int32),
+            np.concatenate(parts["tfs"]).astype(np.uint16),
+            np.concatenate(parts["doc_len"]).astype(np.int32),
+            np.concatenate(parts["ids"]),
+            impacts=None if recompute_impacts else np.concatenate(parts["impacts"]).astype(np.float32),
+        )
+
+    @classmethod
+    def load(cls, path: str, name: str) -> "_Segment":
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in _SEGMENT_ARRAYS}
+        deleted_path = os.path.join(path, "deleted.npy")
+        deleted = np.load(deleted_path) if os.path.exists(deleted_path) else None
+        return cls(arrays, deleted=deleted, name=name)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for key in _SEGMENT_ARRAYS:
+            np.save(os.path.join(path, f"{key}.npy"), np.asarray(getattr(self, key)))
+        self.save_deleted(path)
+
+    def save_deleted(self, path: str):
+        tmp_path = os.path.join(path, "deleted.tmp.npy")
+        np.save(tmp_path, self.deleted)
+        os.replace(tmp_path, os.path.join(path, "deleted.npy"))
+
+    def mark_deleted(self, ids: np.ndarray) -> int:
+        hits = np.isin(np.asarray(self.ids), ids) & ~self.deleted
+        count = int(hits.sum())
+        if count:
+            self.deleted = self.deleted | hits
+            self._refresh_stats()
+        return count
+
+    def lookup(self, term_hashes: np.ndarray) -> List[Tuple[int, int]]:
+        """(start, end) trong postings cho từng term hash, (0, 0) nếu segment không có term"""
+        terms = self.terms
+        positions = np.searchsorted(terms, term_hashes)
+        ranges = []
+        for term_hash, pos in zip(term_hashes, positions):
+            if pos < len(terms) and terms[pos] == term_hash:
+                ranges.append((int(self.offsets[pos]), int(self.offsets[pos + 1])))
+            else:
+                ranges.append((0, 0))
+        return ranges
+
+
+class LexicalIndex:
+    """
+    BM25 index của 1 collection. add() tạo segment trong memory (tìm được ngay), commit() ghi xuống
+    disk thành segment mới; delete()/clear() ghi tombstone. Mọi thao tác ghi giữ file lock của collection.
+    """
+
+    # Tên hiển thị trong log; BM25 tính lại impacts khi merge (avgdl thay đổi)
+    _log_name = "LexicalIndex"
+    _recompute_impacts = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self._pending: List[_Segment] = []
+        self._manifest_stamp = None
+        self._generation = 0
+
+    # ===== Manifest / locking =====
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self._manifest_path)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._reload_if_changed()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self._manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_manifest(self) -> Dict:
+        with open(self._manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _reload_if_changed(self):
+        """Process khác đã commit/xoá → mở lại (segment cũ giữ nguyên mmap, chỉ đọc lại tombstone)"""
+        stamp = self._stamp()
+        if stamp == self._manifest_stamp:
+            return
+        if stamp is None:
+            self._segments, self._generation = [], 0
+        else:
+            manifest = self._read_manifest()
+            loaded = {segment.name: segment for segment in self._segments}
+            segments = []
+            for name in manifest["segments"]:
+                segment_path = os.path.join(self.path, name)
+                segment = loaded.get(name)
+                if segment is None:
+                    segment = _Segment.load(segment_path, name)
+                else:
+                    segment.deleted = np.load(os.path.join(segment_path, "deleted.npy"))
+                    segment._refresh_stats()
+                segments.append(segment)
+            self._segments, self._generation = segments, manifest["generation"]
+        self._manifest_stamp = stamp
+
+    def _write_manifest(self):
+        self._generation += 1
+        manifest = {
+            "generation": self._generation,
+            "segments": [segment.name for segment in self._segments],
+            "updated_at": time.time(),
+        }
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+        self._manifest_stamp = self._stamp()
+
+    def _new_segment_name(self) -> str:
+        return f"seg-{time.time_ns():x}-{os.getpid()}"
+
+    def _persist(self, segment: _Segment):
+        segment.name = self._new_segment_name()
+        segment.save(os.path.join(self.path, segment.name))
+        self._segments.append(segment)
+
+    def _maybe_merge(self):
+        """Quá LEXICAL_MAX_SEGMENTS thì gộp các segment nhỏ nhất còn lại thành 1"""
+        if len(self._segments) <= LEXICAL_MAX_SEGMENTS:
+            return
+        by_size = sorted(self._segments, key=lambda segment: segment.live_count)
+        victims = by_size[: len(self._segments) - LEXICAL_MAX_SEGMENTS // 2 + 1]
+        merged = _Segment.merge(victims, recompute_impacts=self._recompute_impacts)
+        self._segments = [segment for segment in self._segments if segment not in victims]
+        self._persist(merged)
+        self._write_manifest()
+        for segment in victims:
+            # File đang mmap ở process khác vẫn đọc được sau khi unlink (Linux)
+            shutil.rmtree(os.path.join(self.path, segment.name), ignore_errors=True)
+        print(f"[{self._log_name}] Merged {len(victims)} segments ({merged.live_count} docs) in {self.path}")
+
+    # ===== Write =====
+
+    def _build_segment(self, ids: Sequence[str], items: Sequence) -> _Segment:
+        return _Segment.build(ids, items)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        """Index 1 batch document (tìm được ngay trong process này, commit() để ghi xuống disk)"""
+        if not ids:
+            return
+        segment = self._build_segment(ids, texts)
+        with self._lock:
+            self._pending.append(segment)
+
+    def commit(self):
+        """Gộp các batch đã add thành 1 segment mới trên disk"""
+        with self._write_lock():
+            if not self._pending:
+                if not self.exists:
+                    self._write_manifest()
+                return
+            if len(self._pending) > 1:
+                segment = _Segment.merge(self._pending, recompute_impacts=self._recompute_impacts)
+            else:
+                segment = self._pending[0]
+            self._persist(segment)
+            self._pending = []
+            self._write_manifest()
+            self._maybe_merge()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        if not ids:
+            return 0
+        targets = np.array([str(i).encode("utf-8") for i in ids], dtype=bytes)
+        deleted = 0
+        with self._write_lock():
+            for segment in self._pending:
+                deleted += segment.mark_deleted(targets)
+            changed = False
+            for segment in self._segments:
+                count = segment.mark_deleted(targets)
+                if count:
+                    segment.save_deleted(os.path.join(self.path, segment.name))
+                    deleted += count
+                    changed = True
+            if changed:
+                self._write_manifest()
+        return deleted
+
+    def clear(self):
+        with self._write_lock():
+            old = self._segments
+            self._segments, self._pending = [], []
+            self._write_manifest()
+            for segment in old:
+                shutil.rmtree(os.path.join(self.path, segment.name), ignore_errors=True)
+
+    def rebuild(self, pages: Iterable[Tuple[List[str], List[str]]]) -> int:
+        """Build lại toàn bộ index từ các trang (ids, documents), mỗi LEXICAL_SEGMENT_DOCS doc 1 segment"""
+        t0 = time.perf_counter()
+        built: List[_Segment] = []
+        buffer_ids, buffer_texts = [], []
+        total = 0
+
+        def flush():
+            if buffer_ids:
+                built.append(self._build_segment(buffer_ids, buffer_texts))
+                buffer_ids.clear()
+                buffer_texts.clear()
+
+        for ids, texts in pages:
+            buffer_ids.extend(ids)
+            buffer_texts.extend(texts)
+            total += len(ids)
+            if len(buffer_ids) >= LEXICAL_SEGMENT_DOCS:
+                flush()
+        flush()
+
+        with self._write_lock():
+            # Batch đang pending của ingest job chạy song song vẫn giữ lại (search bỏ trùng id)
+            old = self._segments
+            self._segments = []
+            for segment in built:
+                self._persist(segment)
+            self._write_manifest()
+            for segment in old:
+                shutil.rmtree(os.path.join(self.path, segment.name), ignore_errors=True)
+        print(f"[{self._log_name}] Built {self.path}: {total} docs, {len(built)} segments in {time.perf_counter() - t0:.2f} s")
+        return total
+
+    # ===== Read =====
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """BM25 top-k: list (id, score) giảm dần theo score"""
+        term_hashes = np.array(sorted({_term_hash(term) for term in tokenize_vi(query)}), dtype=np.uint64)
+        return self._search(term_hashes, None, top_k)
+
+    def _search(self, term_hashes: np.ndarray, query_weights: Optional[np.ndarray], top_k: int) -> List[Tuple[str, float]]:
+        """
+        Score = Σ weight(term) · impact(term, doc) trên mọi segment.
+        query_weights=None: weight là IDF của BM25 (tính từ df toàn index).
+        """
+        if not term_hashes.size:
+            return []
+        with self._lock:
+            self._reload_if_changed()
+            segments = self._segments + self._pending
+        total_docs = sum(segment.live_count for segment in segments)
+        if not total_docs:
+            return []
+
+        ranges = [segment.lookup(term_hashes) for segment in segments]
+        # df đếm cả document đã tombstone (tới khi merge) nên IDF tính trên tổng số document đã index
+        indexed_docs = sum(len(segment.ids) for segment in segments)
+        df = np.array([sum(r[i][1] - r[i][0] for r in ranges) for i in range(len(term_hashes))], dtype=np.float64)
+        if query_weights is None:
+            weights = np.log(1.0 + (indexed_docs - df + 0.5) / (df + 0.5))
+            # Bỏ term quá phổ biến, trừ khi query chỉ toàn term phổ biến
+            use = (df > 0) & (df <= LEXICAL_MAX_DF_RATIO * total_docs)
+            if not use.any():
+                use = df > 0
+        else:
+            weights = query_weights
+            use = (df > 0) & (weights > 0)
+
+        candidates: List[Tuple[float, bytes]] = []
+        for segment, segment_ranges in zip(segments, ranges):
+            docs_parts, weight_parts = [], []
+            for i, (start, end) in enumerate(segment_ranges):
+                if not use[i] or start == end:
+                    continue
+                docs_parts.append(segment.docs[start:end])
+                weight_parts.append(segment.impacts[start:end] * np.float32(weights[i]))
+            if not docs_parts:
+                continue
+            scores = np.bincount(np.concatenate(docs_parts), weights=np.concatenate(weight_parts))
+            hits = np.flatnonzero(scores > 0)  # so sánh ra bool rồi nonzero nhanh hơn nonzero trên float
+            hits = hits[~segment.deleted[hits]]
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            candidates.extend((float(scores[h]), segment.ids[h]) for h in hits)
+
+        candidates.sort(key=lambda item: -item[0])
+        results, seen = [], set()
+        for score, doc_id in candidates:
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            results.append((doc_id.decode("utf-8"), score))
+            if len(results) == top_k:
+                break
+        return results
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            self._reload_if_changed()
+            segments = self._segments + self._pending
+            return {
+                "path": self.path,
+                "generation": self._generation,
+                "segments": len(self._segments),
+                "pending_segments": len(self._pending),
+                "documents": sum(segment.live_count for segment in segments),
+                "deleted": sum(len(segment.ids) - segment.live_count for segment in segments),
+                "postings": sum(len(segment.docs) for segment in segments),
+            }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """RRF: score(d) = Σ 1 / (k + rank), rank tính từ 1 trong từng ranking"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def iter_collection_documents(collection, page_size: int = 1000) -> Iterable[Tuple[List[str], List[str]]]:
+    """Duyệt (ids, documents) của Chroma collection theo trang (không load embeddings)"""
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["documents"])
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        yield ids, page.get("documents") or [""] * len(ids)
+        if len(ids) < page_size:
+            break
+        offset += len(ids)
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+_building: set = set()
+
+
+def get_lexical_index(collection_name: str) -> Optional[LexicalIndex]:
+    """LexicalIndex của collection (1 object / process), None nếu LEXICAL_INDEX_ENABLED=false"""
+    if not LEXICAL_INDEX_ENABLED:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = LexicalIndex(os.path.join(LEXICAL_INDEX_DIR, collection_name))
+            _indexes[collection_name] = index
+        return index
+
+
+def ensure_lexical_index(collection) -> Optional[LexicalIndex]:
+    """Index chưa từng được build (collection có từ trước) thì build lại từ documents trong collection"""
+    index = get_lexical_index(collection.name)
+    if index is not None and not index.exists:
+        index.rebuild(iter_collection_documents(collection))
+    return index
+
+
+def build_lexical_index_in_background(collection) -> bool:
+    """Build index trên thread nền (dùng ở query path: không bắt request đầu tiên chờ build)"""
+    with _indexes_lock:
+        if collection.name in _building:
+            return False
+        _building.add(collection.name)
+
+    def run():
+        try:
+            ensure_lexical_index(collection)
+        except Exception as e:
+            print(f"[LexicalIndex] Build '{collection.name}' failed: {type(e).__name__}: {e}")
+        finally:
+            with _indexes_lock:
+                _building.discard(collection.name)
+
+    threading.Thread(target=run, name=f"lexical-build-{collection.name}", daemon=True).start()
+    return True
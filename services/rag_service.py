@@ -1,87 +1,308 @@
 # services/rag_service.py
-import chromadb
-from typing import List, Dict, Optional
+from typing import List, Dict
+import asyncio
 import os
+import numpy as np
 from dotenv import load_dotenv
 from functools import lru_cache
 from services.embedding_service import get_embedding_service
+from services.embedding_batcher import EMBEDDING_MICRO_BATCHING, get_embedding_batcher
+from services.embedding_compression import get_collection_compressor
+from services.lexical_index import build_lexical_index_in_background, get_lexical_index, reciprocal_rank_fusion
 from services.llm_service import get_llm_service
+from services.rerank_service import RERANK_CANDIDATES, get_rerank_service
+from services.retrieval_cache import get_retrieval_cache
+from services.sparse_index import build_sparse_index_in_background, get_sparse_index
+from services.vector_store import get_vector_store
 
 load_dotenv()
 
+# dense: chỉ Chroma; hybrid: Chroma + BM25 (lexical index) gộp bằng reciprocal-rank fusion;
+# dense_sparse: Chroma + sparse lexical weights của bge-m3 (sparse index) gộp theo tổng có trọng số của score
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+# Số ứng viên lấy từ mỗi bên trước khi fuse và hằng số k của RRF
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", 20))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", 60))
+# dense_sparse: score = RAG_DENSE_WEIGHT · cosine + RAG_SPARSE_WEIGHT · sparse score (mặc định theo bge-m3: 1 / 0.3)
+RAG_DENSE_WEIGHT = float(os.getenv("RAG_DENSE_WEIGHT", 1.0))
+RAG_SPARSE_WEIGHT = float(os.getenv("RAG_SPARSE_WEIGHT", 0.3))
+
 
 class RAGService:
-    def __init__(self, embedding_service=None, chroma_client=None, llm_service=None):
+    def __init__(
+        self,
+        embedding_service=None,
+        vector_store=None,
+        llm_service=None,
+        embedding_batcher=None,
+        rerank_service=None,
+        retrieval_cache=None,
+    ):
         if embedding_service is None:
             self.embedding_service = get_embedding_service()
         else:
             self.embedding_service = embedding_service
 
-        if chroma_client is None:
-            chroma_path = os.getenv("CHROMADB_PATH", "./chroma_db")
-            self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+        # Gom các query embedding đồng thời thành 1 batch (None = encode từng query)
+        if embedding_batcher is None and EMBEDDING_MICRO_BATCHING:
+            self.embedding_batcher = get_embedding_batcher()
         else:
-            self.chroma_client = chroma_client
+            self.embedding_batcher = embedding_batcher
+
+        # Chroma hoặc NumPy mmap index (VECTOR_STORE_BACKEND), collection có cùng API
+        if vector_store is None:
+            self.vector_store = get_vector_store()
+        else:
+            self.vector_store = vector_store
 
         if llm_service is None:
             self.llm_service = get_llm_service()
         else:
             self.llm_service = llm_service
 
+        # Cross-encoder rerank sau retrieval (None = RERANK_ENABLED=false, giữ ranking của retrieval)
+        if rerank_service is None:
+            self.rerank_service = get_rerank_service()
+        else:
+            self.rerank_service = rerank_service
+
+        # Cache kết quả retrieval theo version collection (None = RETRIEVAL_CACHE_ENABLED=false)
+        if retrieval_cache is None:
+            self.retrieval_cache = get_retrieval_cache()
+        else:
+            self.retrieval_cache = retrieval_cache
+
     async def retrieve_context(
         self,
         query: str,
         collection_name: str,
         top_k: int = 5,
         redis_cache=None,
+        mode: str = None,
+        rerank: bool = None,
+        rerank_budget_ms: float = None,
     ) -> List[Dict]:
+        """
+        Retrieve top_k context cho query. Khi có rerank_service (rerank=None/True) thì lấy dư
+        RERANK_CANDIDATES ứng viên rồi cross-encoder xếp lại trong rerank_budget_ms
+        (None = RERANK_BUDGET_MS), chỉ trả về top_k tốt nhất.
+        Ứng viên trước rerank được cache theo version của collection (retrieval_cache).
+        """
         import time
 
-        cached_embedding = None
-        if redis_cache:
+        mode = (mode or RAG_RETRIEVAL_MODE).lower()
+        cache = self.retrieval_cache
+        if cache is not None:
+            # Đọc version trước khi lấy handle / query: bị bump giữa chừng thì kết quả chỉ nằm dưới key cũ
+            version = cache.version(collection_name)
+            collection = await asyncio.to_thread(cache.get_collection, self.vector_store, collection_name, version)
+        else:
+            collection = await asyncio.to_thread(self.vector_store.get_collection, collection_name)
+        sparse_index = self._sparse_index_for(collection) if mode == "dense_sparse" else None
+
+        model_key = self.embedding_service.cache_key
+        query_embedding = None
+        query_sparse = None
+        if redis_cache and sparse_index is None:
             try:
-                cached_embedding_data = redis_cache.get(f"embed:query:{hash(query)}")
-                if cached_embedding_data:
-                    import json
-                    cached_embedding = json.loads(cached_embedding_data)
+                query_embedding = redis_cache.get_query_embedding(query, model_key=model_key)
+                if query_embedding is not None:
                     print(f"[RAG] Using cached query embedding")
             except Exception as e:
                 print(f"[RAG] Cache check error: {e}")
 
         t0 = time.perf_counter()
-        if cached_embedding:
-            import numpy as np
-            query_embedding = np.array(cached_embedding)
-        else:
-            query_embedding = self.embedding_service.encode_single(
-                query, convert_to_numpy=True
-            )
+        if sparse_index is not None:
+            # 1 forward pass cho cả dense lẫn sparse weights của query
+            dense, sparse = await self.embedding_service.aencode_hybrid([query])
+            query_embedding, query_sparse = dense[0], sparse[0]
+        elif query_embedding is None:
+            if self.embedding_batcher is not None:
+                query_embedding = await self.embedding_batcher.encode(query)
+            else:
+                query_embedding = await self.embedding_service.aencode_single(
+                    query, convert_to_numpy=True
+                )
             if redis_cache:
                 try:
-                    redis_cache.cache_query_embedding(query, query_embedding.tolist())
+                    redis_cache.cache_query_embedding(query, query_embedding, model_key=model_key)
                 except Exception as e:
                     print(f"[RAG] Cache save error: {e}")
         embed_time = (time.perf_counter() - t0) * 1000
         print(f"[RAG] Query embedding took: {embed_time:.2f}ms")
 
         t0 = time.perf_counter()
-        collection = self.chroma_client.get_collection(collection_name)
-        results = collection.query(
-            query_embeddings=[query_embedding.tolist()], n_results=top_k
+        # Query phải đi qua cùng phép nén (giảm chiều / float16) với document của collection
+        compressor = get_collection_compressor(collection)
+        if compressor.needs_fit:
+            return []  # Collection PCA chưa được ingest lần nào
+        query_embedding = compressor.transform(query_embedding)
+        reranker = self.rerank_service if rerank is not False else None
+        fetch_k = max(top_k, RERANK_CANDIDATES) if reranker is not None else top_k
+        lexical_index = self._lexical_index_for(collection) if mode == "hybrid" else None
+        if sparse_index is not None:
+            label = "Dense+sparse"
+        else:
+            label = "Hybrid" if lexical_index is not None else "ChromaDB"
+
+        contexts = None
+        cache_key = None
+        if cache is not None:
+            # BM25 / sparse phụ thuộc cả query text, dense chỉ phụ thuộc embedding
+            text = query if label != "ChromaDB" else None
+            cache_key = cache.key(collection, version, label, fetch_k, cache.fingerprint(query_embedding, text))
+            contexts = cache.get(cache_key, redis_cache)
+        if contexts is not None:
+            print(f"[RAG] Using cached {label} retrieval ({len(contexts)} contexts)")
+        else:
+            if sparse_index is not None:
+                contexts = await self._dense_sparse_retrieve(
+                    query_embedding, query_sparse, collection, sparse_index, fetch_k
+                )
+            elif lexical_index is not None:
+                contexts = await self._hybrid_retrieve(query, query_embedding, collection, lexical_index, fetch_k)
+            else:
+                results = await asyncio.to_thread(
+                    collection.query, query_embeddings=[query_embedding.tolist()], n_results=fetch_k
+                )
+                contexts = []
+                for i, doc in enumerate(results["documents"][0]):
+                    contexts.append(
+                        {
+                            "content": doc,
+                            "metadata": results["metadatas"][0][i],
+                            "distance": results["distances"][0][i],
+                        }
+                    )
+            if cache_key is not None:
+                cache.put(cache_key, contexts, redis_cache)
+            retrieval_time = (time.perf_counter() - t0) * 1000
+            print(f"[RAG] {label} retrieval took: {retrieval_time:.2f}ms")
+
+        if reranker is not None and len(contexts) > 1:
+            t0 = time.perf_counter()
+            contexts, stats = await reranker.rerank(query, contexts, top_k, budget_ms=rerank_budget_ms)
+            print(
+                f"[RAG] Rerank took: {(time.perf_counter() - t0) * 1000:.2f}ms "
+                f"({stats['scored']}/{stats['candidates']} scored, budget {stats['budget_ms']:.0f}ms)"
+            )
+        return contexts[:top_k]
+
+    def _lexical_index_for(self, collection):
+        """Lexical index đã build của collection; chưa có thì build nền và tạm dùng dense"""
+        lexical_index = get_lexical_index(collection.name)
+        if lexical_index is None:
+            return None
+        if not lexical_index.exists:
+            if build_lexical_index_in_background(collection):
+                print(f"[RAG] Lexical index for '{collection.name}' not built yet, building in background")
+            return None
+        return lexical_index
+
+    def _sparse_index_for(self, collection):
+        """Sparse index đã build của collection; chưa có thì build nền và tạm dùng dense"""
+        sparse_index = get_sparse_index(collection.name)
+        if sparse_index is None:
+            return None
+        if not sparse_index.exists:
+            if build_sparse_index_in_background(collection, self.embedding_service):
+                print(f"[RAG] Sparse index for '{collection.name}' not built yet, building in background")
+            return None
+        return sparse_index
+
+    async def _dense_sparse_retrieve(
+        self, query_embedding, query_sparse, collection, sparse_index, top_k: int
+    ) -> List[Dict]:
+        """
+        Chạy Chroma và sparse index song song, gộp bằng tổng có trọng số của score (không phải thứ hạng).
+        Cosine của dense suy ra từ distance (l2 của Chroma là bình phương khoảng cách, vector đã chuẩn hoá);
+        chunk chỉ có bên sparse thì lấy embedding từ Chroma để tính cosine chính xác.
+        """
+        candidates = max(top_k, RAG_HYBRID_CANDIDATES)
+        dense, sparse = await asyncio.gather(
+            asyncio.to_thread(
+                collection.query, query_embeddings=[query_embedding.tolist()], n_results=candidates
+            ),
+            asyncio.to_thread(sparse_index.search, query_sparse, candidates),
         )
-        retrieval_time = (time.perf_counter() - t0) * 1000
-        print(f"[RAG] ChromaDB retrieval took: {retrieval_time:.2f}ms")
-
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        rows, dense_scores = {}, {}
+        for i, doc_id in enumerate(dense["ids"][0]):
+            distance = dense["distances"][0][i]
+            rows[doc_id] = (dense["documents"][0][i], dense["metadatas"][0][i], distance)
+            dense_scores[doc_id] = 1.0 - distance / 2.0 if space == "l2" else 1.0 - distance
+        sparse_scores = dict(sparse)
+
+        missing = [doc_id for doc_id in sparse_scores if doc_id not in rows]
+        if missing:
+            extra = await asyncio.to_thread(
+                collection.get, ids=missing, include=["documents", "metadatas", "embeddings"]
+            )
+            if len(extra["ids"]):
+                similarities = np.asarray(extra["embeddings"], dtype=np.float32) @ query_embedding
+            for i, doc_id in enumerate(extra["ids"]):
+                rows[doc_id] = (extra["documents"][i], extra["metadatas"][i], None)
+                dense_scores[doc_id] = float(similarities[i])
+
+        fused = sorted(
+            (
+                (RAG_DENSE_WEIGHT * dense_scores[doc_id] + RAG_SPARSE_WEIGHT * sparse_scores.get(doc_id, 0.0), doc_id)
+                for doc_id in rows  # id đã bị xoá khỏi Chroma nhưng index chưa kịp cập nhật thì không có trong rows
+            ),
+            reverse=True,
+        )[:top_k]
         contexts = []
-        for i, doc in enumerate(results["documents"][0]):
+        for score, doc_id in fused:
+            doc, metadata, distance = rows[doc_id]
             contexts.append(
                 {
                     "content": doc,
-                    "metadata": results["metadatas"][0][i],
-                    "distance": results["distances"][0][i],
+                    "metadata": metadata,
+                    "distance": distance,
+                    "score": score,
+                    "sparse_score": sparse_scores.get(doc_id),
                 }
             )
+        return contexts
 
+    async def _hybrid_retrieve(self, query: str, query_embedding, collection, lexical_index, top_k: int) -> List[Dict]:
+        """Chạy Chroma và BM25 song song, gộp thứ hạng bằng RRF, lấy document còn thiếu từ Chroma"""
+        candidates = max(top_k, RAG_HYBRID_CANDIDATES)
+        dense, lexical = await asyncio.gather(
+            asyncio.to_thread(
+                collection.query, query_embeddings=[query_embedding.tolist()], n_results=candidates
+            ),
+            asyncio.to_thread(lexical_index.search, query, candidates),
+        )
+        rows = {
+            doc_id: (dense["documents"][0][i], dense["metadatas"][0][i], dense["distances"][0][i])
+            for i, doc_id in enumerate(dense["ids"][0])
+        }
+        lexical_ids = [doc_id for doc_id, _ in lexical]
+        fused = reciprocal_rank_fusion([dense["ids"][0], lexical_ids], k=RAG_RRF_K)[:top_k]
+
+        # Chunk chỉ có bên BM25 thì chưa có document/metadata
+        missing = [doc_id for doc_id, _ in fused if doc_id not in rows]
+        if missing:
+            extra = await asyncio.to_thread(collection.get, ids=missing, include=["documents", "metadatas"])
+            for i, doc_id in enumerate(extra["ids"]):
+                rows[doc_id] = (extra["documents"][i], extra["metadatas"][i], None)
+
+        lexical_rank = {doc_id: rank for rank, doc_id in enumerate(lexical_ids, start=1)}
+        contexts = []
+        for doc_id, score in fused:
+            if doc_id not in rows:
+                continue  # Đã bị xoá khỏi Chroma nhưng index chưa kịp cập nhật
+            doc, metadata, distance = rows[doc_id]
+            contexts.append(
+                {
+                    "content": doc,
+                    "metadata": metadata,
+                    "distance": distance,
+                    "score": score,
+                    "lexical_rank": lexical_rank.get(doc_id),
+                }
+            )
         return contexts
 
     async def decide_and_generate(
@@ -91,6 +312,7 @@ class RAGService:
         top_k: int = 5,
         redis_cache=None,
         previous_queries: List[str] = None,
+        rerank_budget_ms: float = None,
     ) -> Dict[str, object]:
         """
         Bước điều phối thông minh:
@@ -114,6 +336,7 @@ class RAGService:
                 collection_name=collection_name,
                 top_k=top_k,
                 redis_cache=redis_cache,
+                rerank_budget_ms=rerank_budget_ms,
             )
             context_text = "\n\n".join(
                 [f"[{i+1}] {ctx['content']}" for i, ctx in enumerate(contexts)]
@@ -178,6 +401,7 @@ class RAGService:
                 collection_name=collection_name,
                 top_k=top_k,
                 redis_cache=redis_cache,
+                rerank_budget_ms=rerank_budget_ms,
             )
         else:
             print(
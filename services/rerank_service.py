@@ -0,0 +1,190 @@
+# services/rerank_service.py
+"""
+Rerank context bằng cross-encoder local giữa bước retrieve và generate_response.
+
+retrieve_context lấy dư ứng viên (RERANK_CANDIDATES), cross-encoder chấm điểm từng cặp
+(query, chunk) theo batch trên executor riêng (không block event loop), rồi chỉ giữ top_k
+chunk tốt nhất → prompt gửi LLM ngắn hơn và đúng trọng tâm hơn.
+
+Mỗi request có latency budget: ứng viên được chấm theo thứ tự ranking gốc, batch kế tiếp chỉ
+chạy nếu ước lượng còn kịp trong budget. Hết budget thì phần đã chấm được xếp lại theo score,
+phần chưa chấm giữ nguyên thứ tự gốc phía sau (chưa chấm được gì thì trả ranking gốc).
+Deadline được kiểm tra ngay trên executor giữa các batch (tính cả thời gian chờ trong hàng),
+request hết giờ thì báo huỷ để batch sau không chạy nữa; trong lúc batch của request đó còn
+chạy nốt, các request mới bỏ qua rerank thay vì xếp hàng phía sau.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+# Cross-encoder đa ngôn ngữ nhỏ (MiniLM 12 lớp) cho tiếng Việt; BAAI/bge-reranker-v2-m3 chính xác hơn nhưng chậm hơn nhiều
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", os.getenv("EMBEDDING_DEVICE", "cuda"))
+# Số ứng viên lấy từ retrieval trước khi rerank, số cặp mỗi lần gọi model, số token tối đa mỗi cặp
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 30))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 512))
+# Latency budget mặc định của bước rerank mỗi request (ms), 0 = không giới hạn
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 150))
+
+
+class RerankService:
+    """Cross-encoder chạy trên 1 thread riêng; rerank() là async và tôn trọng latency budget"""
+
+    def __init__(self, model_name: str = None, device: str = None, batch_size: int = None, max_length: int = None):
+        # Import lazy: torch / sentence-transformers chỉ cần khi bật rerank
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name or RERANK_MODEL
+        self.device = device or RERANK_DEVICE
+        if self.device == "cuda" and not torch.cuda.is_available():
+            print("[Rerank] Warning: CUDA requested but not available, falling back to CPU")
+            self.device = "cpu"
+        self.batch_size = batch_size or RERANK_BATCH_SIZE
+        self.max_length = max_length or RERANK_MAX_LENGTH
+        t0 = time.perf_counter()
+        self.model = CrossEncoder(
+            self.model_name,
+            device=self.device,
+            max_length=self.max_length,
+            cache_folder=os.getenv("EMBEDDING_CACHE_FOLDER", None),
+        )
+        # 1 thread: các request rerank xếp hàng thay vì tranh CPU với nhau
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        # Ước lượng ms mỗi cặp (EWMA) để quyết định batch kế tiếp có kịp budget không
+        self._ms_per_pair: Optional[float] = None
+        # Set khi lần chấm của request bị timeout gần nhất đã dừng hẳn trên executor
+        self._straggler: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "partial": 0, "skipped": 0, "pairs_scored": 0}
+        print(f"[Rerank] Loaded {self.model_name} on {self.device} in {time.perf_counter() - t0:.1f} s")
+
+    def score(self, query: str, documents: List[str]) -> np.ndarray:
+        """Điểm liên quan (càng cao càng tốt) của từng document với query, đồng bộ"""
+        t0 = time.perf_counter()
+        scores = self.model.predict(
+            [(query, doc) for doc in documents],
+            batch_size=max(1, len(documents)),
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+        elapsed = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            per_pair = elapsed / max(1, len(documents))
+            self._ms_per_pair = per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * per_pair
+            self._stats["pairs_scored"] += len(documents)
+        return np.asarray(scores, dtype=np.float32).reshape(-1)
+
+    def _score_until(
+        self,
+        query: str,
+        documents: List[str],
+        deadline: Optional[float],
+        cancel: threading.Event,
+        done: threading.Event,
+        scores: List[float],
+    ):
+        """
+        Chấm lần lượt từng batch vào `scores` trên executor; dừng khi request huỷ (cancel) hoặc batch
+        kế tiếp ước lượng không kịp deadline. Deadline tính từ lúc request bắt đầu nên thời gian chờ
+        trong hàng của executor cũng bị trừ vào budget.
+        """
+        try:
+            for start in range(0, len(documents), self.batch_size):
+                batch = documents[start:start + self.batch_size]
+                if cancel.is_set():
+                    break
+                if deadline is not None:
+                    estimate = self._ms_per_pair * len(batch) / 1000 if self._ms_per_pair is not None else 0.0
+                    if time.perf_counter() + estimate > deadline:
+                        break
+                scores.extend(self.score(query, batch).tolist())
+        finally:
+            done.set()
+
+    async def rerank(
+        self,
+        query: str,
+        contexts: List[Dict],
+        top_k: int,
+        budget_ms: float = None,
+    ) -> Tuple[List[Dict], Dict[str, object]]:
+        """
+        Xếp lại contexts (ranking gốc từ retrieval) theo cross-encoder, trả về (top_k contexts, stats).
+        Context đã chấm có thêm "rerank_score".
+        """
+        budget_ms = RERANK_BUDGET_MS if budget_ms is None else budget_ms
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms > 0 else None
+        scores: List[float] = []
+        straggler = self._straggler
+        # Batch của request trước đã quá giờ còn đang chạy: xếp hàng sau nó chắc chắn trễ budget → bỏ qua rerank
+        if deadline is None or straggler is None or straggler.is_set():
+            documents = [ctx["content"] or "" for ctx in contexts]
+            cancel, done = threading.Event(), threading.Event()
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self._score_until, query, documents, deadline, cancel, done, scores)
+            )
+            timeout = max(0.0, deadline - time.perf_counter()) if deadline is not None else None
+            try:
+                # shield: job chưa chạy vẫn phải vào executor để set done (nếu không straggler không bao giờ xong)
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                cancel.set()
+                self._straggler = done
+            # Worker có thể còn append sau khi huỷ: chỉ dùng phần đã chấm tới lúc này
+            scores = scores[:]
+
+        scored = len(scores)
+        ranked = sorted(range(scored), key=lambda i: -scores[i])
+        order = ranked + list(range(scored, len(contexts)))
+        results = []
+        for i in order[:top_k]:
+            ctx = dict(contexts[i])
+            if i < scored:
+                ctx["rerank_score"] = scores[i]
+            results.append(ctx)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            if scored == 0 and contexts:
+                self._stats["skipped"] += 1
+            elif scored < len(contexts):
+                self._stats["partial"] += 1
+        return results, {"candidates": len(contexts), "scored": scored, "budget_ms": budget_ms}
+
+    def warm_up(self):
+        """1 lần predict giả để load kernels và có ước lượng ms/cặp ban đầu"""
+        self.score("warm up", ["warm up"] * min(self.batch_size, 4))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "device": self.device,
+                "ms_per_pair": round(self._ms_per_pair, 3) if self._ms_per_pair is not None else None,
+                **self._stats,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache(maxsize=1)
+def get_rerank_service() -> Optional[RerankService]:
+    """
+    Singleton factory cho RerankService, trả về None nếu RERANK_ENABLED=false.
+    """
+    if not RERANK_ENABLED:
+        return None
+    return RerankService()
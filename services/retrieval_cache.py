@@ -0,0 +1,251 @@
+# services/retrieval_cache.py
+"""
+Cache kết quả retrieval theo version của collection.
+
+Key = (collection, id, version, mode, top_k, fingerprint query embedding [+ query text khi mode có
+BM25 / sparse]). Version là 1 bộ đếm trong file <RETRIEVAL_CACHE_DIR>/<collection>.version, được
+các endpoint ingest / clean / delete / rebuild index tăng lên sau mỗi lần ghi → key cũ không bao
+giờ được đọc lại (tự trôi khỏi LRU / hết TTL), không cần xoá chủ động. Mọi worker trên cùng máy đọc
+chung file version (1 os.stat mỗi request).
+
+Tầng 1: LRU trong process (handle collection + kết quả). Tầng 2 (tuỳ chọn): Redis dùng chung giữa
+các worker, chỉ bật khi retrieve_context nhận redis_cache.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Số kết quả (mỗi kết quả = list context của 1 query) và số handle collection giữ trong process
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 2048))
+RETRIEVAL_CACHE_COLLECTIONS = int(os.getenv("RETRIEVAL_CACHE_COLLECTIONS", 64))
+# Tầng Redis dùng chung giữa các worker và TTL của mỗi kết quả trên Redis (seconds)
+RETRIEVAL_CACHE_REDIS = os.getenv("RETRIEVAL_CACHE_REDIS", "true").lower() in ("1", "true", "yes")
+RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", 600))
+RETRIEVAL_CACHE_DIR = os.getenv(
+    "RETRIEVAL_CACHE_DIR", os.path.join(os.getenv("CHROMADB_PATH", "./chroma_db"), "versions")
+)
+
+
+class _LRU:
+    """OrderedDict giới hạn số entry, thread-safe"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _to_builtin(value):
+    # Distance / score từ NumPy backend có thể là numpy scalar
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class RetrievalCache:
+    def __init__(
+        self,
+        version_dir: str = None,
+        max_results: int = None,
+        max_collections: int = None,
+        use_redis: bool = None,
+        redis_ttl: int = None,
+    ):
+        self.version_dir = version_dir or RETRIEVAL_CACHE_DIR
+        os.makedirs(self.version_dir, exist_ok=True)
+        self.use_redis = RETRIEVAL_CACHE_REDIS if use_redis is None else use_redis
+        self.redis_ttl = redis_ttl or RETRIEVAL_CACHE_TTL
+        self._results = _LRU(max_results or RETRIEVAL_CACHE_SIZE)
+        self._handles = _LRU(max_collections or RETRIEVAL_CACHE_COLLECTIONS)
+        # collection → (stamp file version, version)
+        self._versions: Dict[str, Tuple[tuple, int]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "redis_hits": 0, "misses": 0, "bumps": 0}
+
+    # ===== Version =====
+
+    def _version_path(self, collection_name: str) -> str:
+        return os.path.join(self.version_dir, f"{collection_name}.version")
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def version(self, collection_name: str) -> int:
+        """Version hiện tại của collection (0 nếu chưa từng bị ghi qua endpoint); chỉ đọc file khi stamp đổi"""
+        path = self._version_path(collection_name)
+        stamp = self._stamp(path)
+        if stamp is None:
+            return 0
+        cached = self._versions.get(collection_name)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(path, encoding="utf-8") as f:
+                version = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+        with self._lock:
+            self._versions[collection_name] = (stamp, version)
+        return version
+
+    def bump(self, collection_name: str) -> int:
+        """Tăng version sau khi collection bị ghi: mọi kết quả cache trước đó không còn được dùng"""
+        path = self._version_path(collection_name)
+        with open(f"{path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    version = int(f.read().strip() or 0) + 1
+            except (FileNotFoundError, ValueError):
+                version = 1
+            # Ghi file mới rồi replace: inode đổi → stamp chắc chắn đổi ở mọi worker
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(version))
+            os.replace(tmp_path, path)
+        self._handles.pop(collection_name)
+        with self._lock:
+            self._versions.pop(collection_name, None)
+            self._stats["bumps"] += 1
+        return version
+
+    # ===== Collection handles =====
+
+    def get_collection(self, vector_store, collection_name: str, version: int = None):
+        """Handle collection từ LRU; version đổi (vd. clean drop + tạo lại collection) thì lấy handle mới"""
+        if version is None:
+            version = self.version(collection_name)
+        cached = self._handles.get(collection_name)
+        if cached is not None and cached[0] == version and cached[1] is vector_store:
+            return cached[2]
+        collection = vector_store.get_collection(collection_name)
+        self._handles.put(collection_name, (version, vector_store, collection))
+        return collection
+
+    # ===== Results =====
+
+    @staticmethod
+    def fingerprint(query_embedding, query: str = None) -> str:
+        """sha1 của query embedding (làm tròn float16, bền với sai số encode) + query text nếu có"""
+        digest = hashlib.sha1(np.asarray(query_embedding, dtype=np.float16).tobytes())
+        if query is not None:
+            digest.update(b"\x00" + query.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(collection, version: int, mode: str, top_k: int, fingerprint: str) -> str:
+        return f"{collection.name}\x00{collection.id}\x00{version}\x00{mode}\x00{top_k}\x00{fingerprint}"
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"retrieval:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str, redis_cache=None) -> Optional[List[Dict]]:
+        contexts = self._results.get(key)
+        source = "hits"
+        if contexts is None and redis_cache is not None and self.use_redis:
+            try:
+                payload = redis_cache.get(self._redis_key(key))
+            except Exception as e:
+                print(f"[RetrievalCache] Redis get error: {e}")
+                payload = None
+            if payload:
+                contexts = json.loads(payload)
+                self._results.put(key, contexts)
+                source = "redis_hits"
+        with self._lock:
+            self._stats[source if contexts is not None else "misses"] += 1
+        if contexts is None:
+            return None
+        return [dict(ctx) for ctx in contexts]
+
+    def put(self, key: str, contexts: List[Dict], redis_cache=None):
+        contexts = [dict(ctx) for ctx in contexts]
+        self._results.put(key, contexts)
+        if redis_cache is not None and self.use_redis:
+            try:
+                redis_cache.setex(self._redis_key(key), self.redis_ttl, json.dumps(contexts, default=_to_builtin))
+            except Exception as e:
+                print(f"[RetrievalCache] Redis set error: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["redis_hits"] + self._stats["misses"]
+            return {
+                "results": len(self._results),
+                "max_results": self._results.max_entries,
+                "collections": len(self._handles),
+                "redis": self.use_redis,
+                **self._stats,
+                "hit_rate": round((self._stats["hits"] + self._stats["redis_hits"]) / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Xoá tầng trong process (kết quả trên Redis tự hết hạn theo TTL)"""
+        self._results.clear()
+        self._handles.clear()
+
+
+@lru_cache(maxsize=1)
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """
+    Singleton factory cho RetrievalCache, trả về None nếu RETRIEVAL_CACHE_ENABLED=false.
+    """
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None
+    return RetrievalCache()
+
+
+def bump_collection_version(collection_name: str) -> Optional[int]:
+    """Gọi sau mỗi thao tác ghi lên collection (ingest, clean, delete, rebuild index)"""
+    cache = get_retrieval_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.bump(collection_name)
+    except OSError as e:
+        # Không tăng được version thì ít nhất bỏ tầng trong process (Redis vẫn còn tới khi hết TTL)
+        print(f"[RetrievalCache] Bump version '{collection_name}' failed: {e}")
+        cache.clear()
+        return None
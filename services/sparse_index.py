@@ -0,0 +1,123 @@
+# services/sparse_index.py
+"""
+Sparse lexical index của từng collection: lexical weights của bge-m3 (encode_hybrid).
+
+Khác BM25 (services/lexical_index.py) ở chỗ trọng số term do model học ra (token id của tokenizer
+bge-m3 → weight), nên xử lý được đa ngôn ngữ và không cần tách từ. Dùng chung cấu trúc segment
+CSR + tombstone + merge của LexicalIndex; impacts chính là weight của document, score của query
+là tích vô hướng Σ w_query(t) · w_doc(t).
+
+Encode sparse tốn thêm 1 phép nhân trên token embeddings và không dùng được multi-process pool
+nên mặc định tắt (SPARSE_INDEX_ENABLED=false).
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.lexical_index import LexicalIndex, _Segment, iter_collection_documents
+
+load_dotenv()
+
+SPARSE_INDEX_ENABLED = os.getenv("SPARSE_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+SPARSE_INDEX_DIR = os.getenv(
+    "SPARSE_INDEX_DIR", os.path.join(os.getenv("CHROMADB_PATH", "./chroma_db"), "sparse")
+)
+
+
+class SparseIndex(LexicalIndex):
+    """
+    Index vector thưa {token_id: weight} của 1 collection. add(ids, vectors) / commit() / delete() /
+    rebuild(pages (ids, vectors)) giống LexicalIndex; search nhận sparse weights của query.
+    """
+
+    _log_name = "SparseIndex"
+    # Weight đã cố định theo document → merge giữ nguyên impacts
+    _recompute_impacts = False
+
+    def _build_segment(self, ids: Sequence[str], items: Sequence[Dict[int, float]]) -> _Segment:
+        return _Segment.build_weighted(ids, items)
+
+    def search(self, query_weights: Dict[int, float], top_k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k theo tích vô hướng sparse: list (id, score) giảm dần theo score"""
+        if not query_weights:
+            return []
+        token_ids = sorted(query_weights)
+        return self._search(
+            np.array(token_ids, dtype=np.uint64),
+            np.array([query_weights[t] for t in token_ids], dtype=np.float64),
+            top_k,
+        )
+
+
+def encode_sparse(embedding_service, texts: List[str], embedding_cache=None) -> List[Dict[int, float]]:
+    """Sparse weights của texts, đọc từ EmbeddingCache nếu có và chỉ encode phần miss"""
+    if embedding_cache is None:
+        _, sparse = embedding_service.encode_bulk(texts, return_sparse=True)
+        return sparse
+    model_key = embedding_service.cache_key
+    sparse = embedding_cache.get_sparse_many(model_key, texts)
+    misses = [i for i, weights in enumerate(sparse) if weights is None]
+    if misses:
+        missing_docs = [texts[i] for i in misses]
+        embeddings, encoded = embedding_service.encode_bulk(missing_docs, return_sparse=True)
+        embedding_cache.put_many(model_key, missing_docs, embeddings)
+        embedding_cache.put_sparse_many(model_key, missing_docs, encoded)
+        for i, weights in zip(misses, encoded):
+            sparse[i] = weights
+    return sparse
+
+
+def iter_collection_sparse(
+    collection, embedding_service, embedding_cache=None, page_size: int = 1000
+) -> Iterable[Tuple[List[str], List[Dict[int, float]]]]:
+    """Duyệt (ids, sparse weights) của collection theo trang, encode lại documents"""
+    for ids, documents in iter_collection_documents(collection, page_size):
+        yield ids, encode_sparse(embedding_service, [doc or "" for doc in documents], embedding_cache)
+
+
+_indexes: Dict[str, SparseIndex] = {}
+_indexes_lock = threading.Lock()
+_building: set = set()
+
+
+def get_sparse_index(collection_name: str) -> Optional[SparseIndex]:
+    """SparseIndex của collection (1 object / process), None nếu SPARSE_INDEX_ENABLED=false"""
+    if not SPARSE_INDEX_ENABLED:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = SparseIndex(os.path.join(SPARSE_INDEX_DIR, collection_name))
+            _indexes[collection_name] = index
+        return index
+
+
+def ensure_sparse_index(collection, embedding_service, embedding_cache=None) -> Optional[SparseIndex]:
+    """Index chưa từng được build (collection có từ trước) thì encode lại documents để build"""
+    index = get_sparse_index(collection.name)
+    if index is not None and not index.exists:
+        index.rebuild(iter_collection_sparse(collection, embedding_service, embedding_cache))
+    return index
+
+
+def build_sparse_index_in_background(collection, embedding_service, embedding_cache=None) -> bool:
+    """Build index trên thread nền (query path: request đầu tiên không phải chờ encode cả collection)"""
+    with _indexes_lock:
+        if collection.name in _building:
+            return False
+        _building.add(collection.name)
+
+    def run():
+        try:
+            ensure_sparse_index(collection, embedding_service, embedding_cache)
+        except Exception as e:
+            print(f"[SparseIndex] Build '{collection.name}' failed: {type(e).__name__}: {e}")
+        finally:
+            with _indexes_lock:
+                _building.discard(collection.name)
+
+    threading.Thread(target=run, name=f"sparse-build-{collection.name}", daemon=True).start()
+    return True
@@ -0,0 +1,683 @@
+# services/vector_store.py
+"""
+Vector store dùng chung cho RAGService và ingest app, chọn backend bằng VECTOR_STORE_BACKEND:
+
+- chroma: chromadb.PersistentClient (mặc định, HNSW xấp xỉ)
+- numpy: index chính xác trong process — ma trận vector float32/float16 memory-mapped, tìm top-k
+  bằng matmul + argpartition. Với collection nhỏ và vừa (< ~500k chunk) nhanh hơn và chính xác
+  hơn 1 vòng qua Chroma, mở lúc startup không phải copy dữ liệu (mmap). Collection nén
+  float16 (embedding_compression_dtype) lưu đúng float16 → giảm nửa RAM/disk, nhưng search chậm
+  hơn trên CPU không có lệnh convert fp16 nhanh (mỗi block phải cast sang float32 trước matmul).
+
+Collection của mọi backend có cùng API con của Chroma collection mà code đang dùng:
+name, id, metadata, count(), add(), get(), query(), delete(), modify().
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.embedding_compression import METADATA_DTYPE
+from utils.chroma_conn import get_chroma_client
+
+load_dotenv()
+
+VECTOR_STORE_BACKENDS = ("chroma", "numpy")
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma").lower()
+NUMPY_STORE_PATH = os.getenv(
+    "NUMPY_STORE_PATH", os.path.join(os.getenv("CHROMADB_PATH", "./chroma_db"), "numpy")
+)
+# Số segment tối đa trước khi gộp (mỗi lần add = 1 segment) và số dòng mỗi block khi matmul
+NUMPY_STORE_MAX_SEGMENTS = int(os.getenv("NUMPY_STORE_MAX_SEGMENTS", 16))
+NUMPY_STORE_BLOCK_ROWS = int(os.getenv("NUMPY_STORE_BLOCK_ROWS", 65536))
+
+_SEGMENT_ARRAYS = ("vectors", "norms", "ids", "id_order", "documents", "doc_offsets", "metadatas", "meta_offsets")
+_DEFAULT_GET_INCLUDE = ("metadatas", "documents")
+_DEFAULT_QUERY_INCLUDE = ("metadatas", "documents", "distances")
+
+
+class VectorStore:
+    """Interface chung (tập con của chromadb.ClientAPI mà RAGService và ingest dùng)"""
+
+    backend = None
+
+    def get_collection(self, name: str):
+        raise NotImplementedError
+
+    def get_or_create_collection(self, name: str, metadata: Dict = None):
+        """metadata chỉ áp dụng khi collection chưa tồn tại (collection có sẵn giữ nguyên metadata)"""
+        raise NotImplementedError
+
+    def create_collection(self, name: str, metadata: Dict = None, configuration=None):
+        raise NotImplementedError
+
+    def delete_collection(self, name: str):
+        raise NotImplementedError
+
+    def list_collections(self) -> List[str]:
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """Chroma collection đã có sẵn đúng API → chỉ chuyển tiếp sang PersistentClient"""
+
+    backend = "chroma"
+
+    def __init__(self, client=None):
+        self.client = client or get_chroma_client()
+
+    def get_collection(self, name: str):
+        return self.client.get_collection(name=name)
+
+    def get_or_create_collection(self, name: str, metadata: Dict = None):
+        return self.client.get_or_create_collection(name=name, metadata=metadata)
+
+    def create_collection(self, name: str, metadata: Dict = None, configuration=None):
+        if configuration is None:
+            return self.client.create_collection(name=name, metadata=metadata)
+        return self.client.create_collection(name=name, metadata=metadata, configuration=configuration)
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name=name)
+
+    def list_collections(self) -> List[str]:
+        return [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+
+
+def _pack(items: Sequence[bytes]):
+    """Nối list bytes thành (uint8 array, offsets int64 len+1) để đọc từng phần tử qua mmap"""
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    if items:
+        offsets[1:] = np.cumsum([len(item) for item in items])
+    data = np.frombuffer(b"".join(items), dtype=np.uint8) if offsets[-1] else np.zeros(0, dtype=np.uint8)
+    return data, offsets
+
+
+def _encode_ids(ids: Sequence[str]) -> np.ndarray:
+    if not len(ids):
+        return np.array([], dtype="S1")
+    return np.array([str(i).encode("utf-8") for i in ids], dtype=bytes)
+
+
+class _VectorSegment:
+    """
+    1 segment bất biến: vectors (n, d) float32/float16, norms (bình phương L2, float32), ids (bytes)
+    + id_order (argsort của ids, tra id bằng searchsorted), documents / metadatas (utf-8 / JSON nối liền
+    + offsets). deleted là tombstone (bool, ghi lại được).
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], deleted: np.ndarray = None, name: str = None):
+        self.name = name
+        for key in _SEGMENT_ARRAYS:
+            setattr(self, key, arrays[key])
+        self.deleted = deleted if deleted is not None else np.zeros(len(self.ids), dtype=bool)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        self.live_count = int(len(self.deleted) - self.deleted.sum())
+
+    @classmethod
+    def build(cls, ids, embeddings: np.ndarray, documents, metadatas, dtype: str) -> "_VectorSegment":
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32).astype(dtype)
+        documents_data, doc_offsets = _pack([(doc or "").encode("utf-8") for doc in documents])
+        metadatas_data, meta_offsets = _pack(
+            [json.dumps(meta, ensure_ascii=False).encode("utf-8") for meta in metadatas]
+        )
+        encoded_ids = _encode_ids(ids)
+        return cls({
+            "vectors": vectors,
+            "norms": np.einsum("ij,ij->i", vectors.astype(np.float32), vectors.astype(np.float32)),
+            "ids": encoded_ids,
+            "id_order": np.argsort(encoded_ids, kind="stable").astype(np.int64),
+            "documents": documents_data,
+            "doc_offsets": doc_offsets,
+            "metadatas": metadatas_data,
+            "meta_offsets": meta_offsets,
+        })
+
+    @classmethod
+    def merge(cls, segments: List["_VectorSegment"]) -> "_VectorSegment":
+        """Gộp nhiều segment thành 1, bỏ dòng đã bị tombstone"""
+        ids, vectors, documents, metadatas = [], [], [], []
+        for segment in segments:
+            rows = np.flatnonzero(~segment.deleted)
+            ids.extend(segment.ids[rows].tolist())
+            vectors.append(np.asarray(segment.vectors[rows]))
+            documents.extend(segment._slice(segment.documents, segment.doc_offsets, row) for row in rows)
+            metadatas.extend(segment._slice(segment.metadatas, segment.meta_offsets, row) for row in rows)
+        documents_data, doc_offsets = _pack(documents)
+        metadatas_data, meta_offsets = _pack(metadatas)
+        encoded_ids = np.array(ids, dtype=bytes) if ids else np.array([], dtype="S1")
+        stacked = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return cls({
+            "vectors": stacked,
+            "norms": np.concatenate([np.asarray(s.norms)[~s.deleted] for s in segments]).astype(np.float32),
+            "ids": encoded_ids,
+            "id_order": np.argsort(encoded_ids, kind="stable").astype(np.int64),
+            "documents": documents_data,
+            "doc_offsets": doc_offsets,
+            "metadatas": metadatas_data,
+            "meta_offsets": meta_offsets,
+        })
+
+    @classmethod
+    def load(cls, path: str, name: str) -> "_VectorSegment":
+        """Mở segment bằng mmap (không copy dữ liệu), chỉ tombstone được đọc vào memory"""
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in _SEGMENT_ARRAYS}
+        return cls(arrays, deleted=np.load(os.path.join(path, "deleted.npy")), name=name)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for key in _SEGMENT_ARRAYS:
+            np.save(os.path.join(tmp_path, f"{key}.npy"), getattr(self, key))
+        np.save(os.path.join(tmp_path, "deleted.npy"), self.deleted)
+        os.replace(tmp_path, path)
+
+    def save_deleted(self, path: str):
+        tmp_file = os.path.join(path, "deleted.tmp.npy")
+        np.save(tmp_file, self.deleted)
+        os.replace(tmp_file, os.path.join(path, "deleted.npy"))
+
+    @staticmethod
+    def _slice(data: np.ndarray, offsets: np.ndarray, row: int) -> bytes:
+        return data[offsets[row]:offsets[row + 1]].tobytes()
+
+    def document(self, row: int) -> str:
+        return self._slice(self.documents, self.doc_offsets, row).decode("utf-8")
+
+    def metadata(self, row: int) -> Optional[Dict]:
+        return json.loads(self._slice(self.metadatas, self.meta_offsets, row))
+
+    def find(self, ids: np.ndarray) -> np.ndarray:
+        """Dòng (còn sống) của từng id trong segment, -1 nếu không có"""
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        if not len(self.ids) or not len(ids):
+            return rows
+        sorted_ids = self.ids[self.id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        found = sorted_ids[pos] == ids
+        rows[found] = self.id_order[pos[found]]
+        rows[(rows >= 0) & self.deleted[np.maximum(rows, 0)]] = -1
+        return rows
+
+    def column(self, key: str) -> np.ndarray:
+        """Giá trị metadata[key] của mọi dòng (object array, cache lại vì segment bất biến)"""
+        values = self._columns.get(key)
+        if values is None:
+            values = np.empty(len(self.ids), dtype=object)
+            for row in range(len(self.ids)):
+                values[row] = (self.metadata(row) or {}).get(key)
+            self._columns[key] = values
+        return values
+
+    def where_mask(self, where: Optional[Dict]) -> np.ndarray:
+        """Mask dòng còn sống khớp filter kiểu Chroma ($and/$or, $eq/$ne/$in/$nin, so sánh bằng)"""
+        mask = ~self.deleted
+        if where:
+            mask &= self._match(where)
+        return mask
+
+    def _match(self, where: Dict) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._match(clause)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._match(clause)
+                mask &= any_mask
+                continue
+            values = self.column(key)
+            op, operand = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+            if op == "$eq":
+                mask &= values == operand
+            elif op == "$ne":
+                mask &= values != operand
+            elif op == "$in":
+                mask &= np.isin(values, list(operand))
+            elif op == "$nin":
+                mask &= ~np.isin(values, list(operand))
+            else:
+                raise ValueError(f"Unsupported where operator '{op}'")
+        return mask
+
+
+def _top_k_columns(dist: np.ndarray, k: int) -> np.ndarray:
+    """Chỉ số k cột có distance nhỏ nhất của từng dòng (chưa sắp xếp), (m, min(k, n))"""
+    if k >= dist.shape[1]:
+        return np.broadcast_to(np.arange(dist.shape[1]), dist.shape)
+    return np.argpartition(dist, k - 1, axis=1)[:, :k]
+
+
+def _locate(segments: List[_VectorSegment], encoded_ids: np.ndarray) -> List[Optional[tuple]]:
+    """(segment index, row) còn sống của từng id, None nếu không có"""
+    refs: List[Optional[tuple]] = [None] * len(encoded_ids)
+    for index, segment in enumerate(segments):
+        rows = segment.find(encoded_ids)
+        for i in np.flatnonzero(rows >= 0):
+            refs[i] = (index, int(rows[i]))
+    return refs
+
+
+class NumpyCollection:
+    """
+    Collection của NumpyVectorStore: các segment append-only (mỗi add() 1 segment, gộp khi vượt
+    NUMPY_STORE_MAX_SEGMENTS), delete() ghi tombstone. Manifest collection.json giữ id, metadata và
+    danh sách segment; mọi thao tác ghi giữ file lock, process khác đọc lại khi manifest đổi.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self.id = None
+        self._metadata: Dict = {}
+        self._lock = threading.RLock()
+        self._segments: List[_VectorSegment] = []
+        self._manifest_stamp = None
+        self._generation = 0
+        self._reload_if_changed()
+
+    # ===== Manifest / locking =====
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "collection.json")
+
+    @property
+    def metadata(self) -> Optional[Dict]:
+        with self._lock:
+            self._reload_if_changed()
+            return dict(self._metadata) or None
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._reload_if_changed()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self._manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _reload_if_changed(self):
+        """Process khác đã add/xoá/tạo lại collection → mở lại (segment cũ giữ nguyên mmap, chỉ đọc lại tombstone)"""
+        stamp = self._stamp()
+        if stamp == self._manifest_stamp:
+            return
+        if stamp is None:
+            self._segments, self._generation = [], 0
+        else:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            # Collection bị xoá rồi tạo lại (id mới) thì không dùng lại segment cũ
+            loaded = {s.name: s for s in self._segments} if manifest["id"] == self.id else {}
+            segments = []
+            for name in manifest["segments"]:
+                segment_path = os.path.join(self.path, name)
+                segment = loaded.get(name)
+                if segment is None:
+                    segment = _VectorSegment.load(segment_path, name)
+                else:
+                    segment.deleted = np.load(os.path.join(segment_path, "deleted.npy"))
+                    segment._refresh_stats()
+                segments.append(segment)
+            self.id = manifest["id"]
+            self._metadata = manifest.get("metadata") or {}
+            self._segments, self._generation = segments, manifest["generation"]
+        self._manifest_stamp = stamp
+
+    def _write_manifest(self):
+        self._generation += 1
+        manifest = {
+            "id": self.id,
+            "name": self.name,
+            "metadata": self._metadata,
+            "generation": self._generation,
+            "segments": [segment.name for segment in self._segments],
+            "updated_at": time.time(),
+        }
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._manifest_path)
+        self._manifest_stamp = self._stamp()
+
+    def _new_segment_name(self) -> str:
+        return f"seg_{self._generation + 1:08d}_{uuid.uuid4().hex[:8]}"
+
+    def _persist(self, segment: _VectorSegment):
+        segment.name = self._new_segment_name()
+        segment_path = os.path.join(self.path, segment.name)
+        segment.save(segment_path)
+        # Mở lại bằng mmap: không giữ bản copy trong memory của process ghi
+        self._segments.append(_VectorSegment.load(segment_path, segment.name))
+
+    def _maybe_merge(self):
+        """Quá NUMPY_STORE_MAX_SEGMENTS thì gộp các segment nhỏ nhất tới khi còn khoảng một nửa"""
+        if len(self._segments) <= NUMPY_STORE_MAX_SEGMENTS:
+            return
+        t0 = time.perf_counter()
+        by_size = sorted(self._segments, key=lambda s: s.live_count)
+        victims = by_size[:len(self._segments) - NUMPY_STORE_MAX_SEGMENTS // 2 + 1]
+        merged = _VectorSegment.merge(victims)
+        victim_names = {s.name for s in victims}
+        self._segments = [s for s in self._segments if s.name not in victim_names]
+        self._persist(merged)
+        self._write_manifest()
+        for name in victim_names:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        print(
+            f"[NumpyStore] '{self.name}': merged {len(victims)} segments "
+            f"({merged.live_count} rows) in {time.perf_counter() - t0:.2f} s"
+        )
+
+    def _check_exists(self):
+        if self.id is None:
+            raise ValueError(f"Collection {self.name} does not exist.")
+
+    # ===== Write =====
+
+    def add(self, ids: Sequence[str], embeddings, documents: Sequence[str] = None, metadatas: Sequence[Dict] = None):
+        """Append 1 segment; id đã có trong collection bị bỏ qua (giống Chroma)"""
+        if not len(ids):
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        documents = documents if documents is not None else [""] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        with self._write_lock():
+            self._check_exists()
+            dims = {s.vectors.shape[1] for s in self._segments if len(s.ids)}
+            if dims and embeddings.shape[1] not in dims:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match collection dimensionality {dims.pop()}")
+            existing = _locate(self._segments, _encode_ids(ids))
+            keep = [i for i in range(len(ids)) if existing[i] is None]
+            if len(keep) < len(ids):
+                print(f"[NumpyStore] '{self.name}': skipped {len(ids) - len(keep)} existing ids")
+            if not keep:
+                return
+            dtype = "float16" if self._metadata.get(METADATA_DTYPE) == "float16" else "float32"
+            segment = _VectorSegment.build(
+                [ids[i] for i in keep],
+                embeddings[keep],
+                [documents[i] for i in keep],
+                [metadatas[i] for i in keep],
+                dtype,
+            )
+            self._persist(segment)
+            self._write_manifest()
+            self._maybe_merge()
+
+    def delete(self, ids: Sequence[str] = None, where: Dict = None):
+        """Ghi tombstone cho ids (và/hoặc dòng khớp where)"""
+        with self._write_lock():
+            self._check_exists()
+            touched = set()
+            if ids is not None:
+                for ref in _locate(self._segments, _encode_ids(ids)):
+                    if ref is not None:
+                        self._segments[ref[0]].deleted[ref[1]] = True
+                        touched.add(ref[0])
+            if where:
+                for index, segment in enumerate(self._segments):
+                    mask = segment.where_mask(where)
+                    if mask.any():
+                        segment.deleted[mask] = True
+                        touched.add(index)
+            if not touched:
+                return
+            for index in touched:
+                segment = self._segments[index]
+                segment.save_deleted(os.path.join(self.path, segment.name))
+                segment._refresh_stats()
+            self._write_manifest()
+
+    def modify(self, name: str = None, metadata: Dict = None):
+        """Đổi metadata (giữ nguyên key hnsw:* như Chroma); đổi tên không được hỗ trợ"""
+        if name is not None and name != self.name:
+            raise ValueError("NumpyCollection does not support renaming")
+        if metadata is None:
+            return
+        with self._write_lock():
+            self._check_exists()
+            kept = {k: v for k, v in self._metadata.items() if k.startswith("hnsw:")}
+            self._metadata = {**kept, **metadata}
+            self._write_manifest()
+
+    # ===== Read =====
+
+    def _snapshot(self) -> List[_VectorSegment]:
+        with self._lock:
+            self._reload_if_changed()
+            self._check_exists()
+            return list(self._segments)
+
+    def count(self) -> int:
+        return sum(segment.live_count for segment in self._snapshot())
+
+    def _rows_result(self, refs, segments, include) -> Dict[str, object]:
+        result = {"ids": [segments[si].ids[row].decode("utf-8") for si, row in refs]}
+        result["documents"] = [segments[si].document(row) for si, row in refs] if "documents" in include else None
+        result["metadatas"] = [segments[si].metadata(row) for si, row in refs] if "metadatas" in include else None
+        if "embeddings" in include:
+            dim = next((s.vectors.shape[1] for s in segments if len(s.ids)), 0)
+            embeddings = np.empty((len(refs), dim), dtype=np.float32)
+            for i, (si, row) in enumerate(refs):
+                embeddings[i] = segments[si].vectors[row]
+            result["embeddings"] = embeddings
+        else:
+            result["embeddings"] = None
+        return result
+
+    def get(
+        self,
+        ids: Sequence[str] = None,
+        where: Dict = None,
+        limit: int = None,
+        offset: int = None,
+        include: Sequence[str] = _DEFAULT_GET_INCLUDE,
+    ) -> Dict[str, object]:
+        """Giống Chroma get: theo ids và/hoặc where, phân trang limit/offset theo thứ tự lưu"""
+        segments = self._snapshot()
+        if ids is not None:
+            refs = [ref for ref in _locate(segments, _encode_ids(ids)) if ref is not None]
+            if where:
+                masks = {si: segments[si].where_mask(where) for si in {si for si, _ in refs}}
+                refs = [(si, row) for si, row in refs if masks[si][row]]
+        else:
+            refs = []
+            skip = offset or 0
+            for si, segment in enumerate(segments):
+                rows = np.flatnonzero(segment.where_mask(where))
+                if skip >= len(rows):
+                    skip -= len(rows)
+                    continue
+                rows = rows[skip:]
+                skip = 0
+                if limit is not None:
+                    rows = rows[:limit - len(refs)]
+                refs.extend((si, int(row)) for row in rows)
+                if limit is not None and len(refs) >= limit:
+                    break
+        if ids is not None and (offset or limit is not None):
+            refs = refs[offset or 0:None if limit is None else (offset or 0) + limit]
+        return self._rows_result(refs, segments, include)
+
+    def query(
+        self,
+        query_embeddings,
+        n_results: int = 10,
+        where: Dict = None,
+        include: Sequence[str] = _DEFAULT_QUERY_INCLUDE,
+    ) -> Dict[str, object]:
+        """
+        Top-k chính xác cho nhiều query cùng lúc: mỗi block NUMPY_STORE_BLOCK_ROWS dòng 1 phép matmul
+        (m query × block), argpartition lấy k ứng viên mỗi block rồi gộp. Distance theo hnsw:space của
+        collection giống Chroma: l2 (bình phương), cosine (1 − cos), ip (1 − tích vô hướng).
+        """
+        if n_results < 1:
+            # Giống Chroma; k ≤ 0 làm argpartition nhận kth âm (lấy từ cuối) → kết quả sai thay vì lỗi
+            raise ValueError(f"Number of requested results {n_results}, cannot be negative, or zero.")
+        segments = self._snapshot()
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        space = self._metadata.get("hnsw:space", "l2")
+        if space == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        m = len(queries)
+
+        # Ứng viên theo từng query (m, k) của mỗi block: distance, segment, dòng
+        cand_dist: List[np.ndarray] = []
+        cand_seg: List[np.ndarray] = []
+        cand_row: List[np.ndarray] = []
+        for si, segment in enumerate(segments):
+            if not segment.live_count:
+                continue
+            mask = segment.where_mask(where)
+            for start in range(0, len(segment.ids), NUMPY_STORE_BLOCK_ROWS):
+                end = min(start + NUMPY_STORE_BLOCK_ROWS, len(segment.ids))
+                block_mask = mask[start:end]
+                if not block_mask.any():
+                    continue
+                # float32 mmap: không copy; float16: đổi sang float32 từng block (RAM tạm chỉ 1 block)
+                block = np.asarray(segment.vectors[start:end], dtype=np.float32)
+                dots = queries @ block.T  # (m, b): mỗi query 1 dòng liên tục → argpartition theo axis=1 nhanh
+                if space == "l2":
+                    dist = np.asarray(segment.norms[start:end])[None, :] - 2.0 * dots + query_norms[:, None]
+                elif space == "cosine":
+                    norms = np.sqrt(np.maximum(np.asarray(segment.norms[start:end]), 1e-24))
+                    dist = 1.0 - dots / norms[None, :]
+                else:
+                    dist = 1.0 - dots
+                dist[:, ~block_mask] = np.inf
+                top = _top_k_columns(dist, n_results)
+                cand_dist.append(np.take_along_axis(dist, top, axis=1))
+                cand_seg.append(np.full(top.shape, si, dtype=np.int64))
+                cand_row.append(top + start)
+
+        result_refs: List[List[tuple]] = [[] for _ in range(m)]
+        result_dist: List[List[float]] = [[] for _ in range(m)]
+        if cand_dist:
+            dist = np.concatenate(cand_dist, axis=1)
+            seg = np.concatenate(cand_seg, axis=1)
+            rows = np.concatenate(cand_row, axis=1)
+            top = _top_k_columns(dist, n_results)
+            order = np.argsort(np.take_along_axis(dist, top, axis=1), axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            for q in range(m):
+                for i in top[q]:
+                    if np.isfinite(dist[q, i]):
+                        result_refs[q].append((int(seg[q, i]), int(rows[q, i])))
+                        result_dist[q].append(float(max(dist[q, i], 0.0) if space == "l2" else dist[q, i]))
+
+        per_query = [self._rows_result(refs, segments, include) for refs in result_refs]
+        return {
+            "ids": [r["ids"] for r in per_query],
+            "documents": [r["documents"] for r in per_query] if "documents" in include else None,
+            "metadatas": [r["metadatas"] for r in per_query] if "metadatas" in include else None,
+            "embeddings": [r["embeddings"] for r in per_query] if "embeddings" in include else None,
+            "distances": result_dist if "distances" in include else None,
+        }
+
+
+class NumpyVectorStore(VectorStore):
+    """Mỗi collection 1 thư mục dưới NUMPY_STORE_PATH; object collection dùng chung trong process"""
+
+    backend = "numpy"
+
+    def __init__(self, path: str = None):
+        self.path = path or NUMPY_STORE_PATH
+        os.makedirs(self.path, exist_ok=True)
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(os.path.join(self.path, name), name)
+                self._collections[name] = collection
+            return collection
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        collection = self._collection(name)
+        collection._snapshot()  # Raise nếu collection chưa được tạo
+        return collection
+
+    def create_collection(self, name: str, metadata: Dict = None, configuration=None) -> NumpyCollection:
+        collection = self._collection(name)
+        with collection._write_lock():
+            if collection.id is not None:
+                raise ValueError(f"Collection {name} already exists")
+            collection.id = str(uuid.uuid4())
+            collection._metadata = dict(metadata or {})
+            collection._segments = []
+            collection._write_manifest()
+        print(f"[NumpyStore] Created collection '{name}'")
+        return collection
+
+    def get_or_create_collection(self, name: str, metadata: Dict = None) -> NumpyCollection:
+        """
+        Giống Chroma: collection đã tồn tại thì trả về nguyên trạng, `metadata` chỉ dùng khi tạo mới
+        (không ghi đè / so sánh); đổi metadata của collection có sẵn thì dùng collection.modify().
+        """
+        collection = self._collection(name)
+        with collection._lock:
+            collection._reload_if_changed()
+            if collection.id is not None:
+                return collection
+        try:
+            return self.create_collection(name, metadata=metadata)
+        except ValueError:
+            return collection  # Process / thread khác vừa tạo
+
+    def delete_collection(self, name: str):
+        collection = self._collection(name)
+        with collection._write_lock():
+            collection._check_exists()
+            names = [segment.name for segment in collection._segments]
+            os.remove(collection._manifest_path)
+            collection.id, collection._metadata, collection._segments = None, {}, []
+            collection._manifest_stamp = None
+            for segment_name in names:
+                shutil.rmtree(os.path.join(collection.path, segment_name), ignore_errors=True)
+
+    def list_collections(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.path)
+            if os.path.exists(os.path.join(self.path, name, "collection.json"))
+        )
+
+
+@lru_cache(maxsize=1)
+def get_vector_store() -> VectorStore:
+    """
+    Singleton VectorStore theo VECTOR_STORE_BACKEND, dùng chung cho chat (RAGService) và ingest.
+    """
+    if VECTOR_STORE_BACKEND not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unsupported VECTOR_STORE_BACKEND '{VECTOR_STORE_BACKEND}', expected one of {VECTOR_STORE_BACKENDS}")
+    if VECTOR_STORE_BACKEND == "numpy":
+        return NumpyVectorStore()
+    return ChromaVectorStore()
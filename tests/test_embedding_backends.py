@@ -0,0 +1,47 @@
+# tests/test_embedding_backends.py
+"""
+Parity test: embedding của backend ONNX (fp32 / int8) phải gần với torch fp32 trên cùng model
+(EMBEDDING_MODEL), để lỗi khi export hoặc quantize làm fail test thay vì chỉ lộ ra ở benchmark.
+Bỏ qua khi chưa cài ONNX Runtime (pip install "sentence-transformers[onnx]"). Lần đầu chạy sẽ
+export model sang EMBEDDING_ONNX_DIR nên mất vài phút.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("optimum.onnxruntime")
+
+from services.embedding_service import EmbeddingService  # noqa: E402
+
+# Ngưỡng cosine similarity tối thiểu so với torch fp32 (benchmark_embedding_backends.py in số liệu thực tế)
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.97}
+TEXTS = [
+    "Gợi ý sách phát triển bản thân cho người mới đi làm",
+    "Sách nào của Dale Carnegie nói về nghệ thuật giao tiếp?",
+    "Tiểu thuyết lịch sử Việt Nam hay nhất",
+    "Recommend a book about habits and productivity",
+    "Sách thiếu nhi dành cho trẻ 6 tuổi",
+    "Tư duy nhanh và chậm của Daniel Kahneman nói về điều gì? " * 8,
+    "ISBN: 978-604-1-23456-7 NXB Trẻ, 2019. Tái bản lần 3",
+]
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+@pytest.fixture(scope="module")
+def reference_embeddings() -> np.ndarray:
+    return EmbeddingService(backend="torch").encode(TEXTS)
+
+
+@pytest.mark.parametrize("backend", sorted(MIN_COSINE))
+def test_onnx_backend_matches_torch(backend, reference_embeddings):
+    embeddings = EmbeddingService(backend=backend).encode(TEXTS)
+    assert embeddings.shape == reference_embeddings.shape
+    sims = _cosine(reference_embeddings, embeddings)
+    assert sims.min() >= MIN_COSINE[backend], (
+        f"{backend} diverges from torch: min cosine {sims.min():.5f} < {MIN_COSINE[backend]}"
+    )
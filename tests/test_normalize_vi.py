@@ -0,0 +1,36 @@
+# tests/test_normalize_vi.py
+"""
+Golden test cho normalize_text_vi: data/normalize_vi_golden.jsonl là output của bản 5 lần re.sub
+cũ (corpus mẫu, mọi chuỗi ≤ 3 ký tự trên bảng chữ cái khó, fuzz ngẫu nhiên), bản 1 pass phải khớp từng dòng.
+"""
+import json
+import os
+
+import pytest
+
+from api.Ingest.utils.tokenizer import normalize_text_vi, normalize_texts_vi
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "data", "normalize_vi_golden.jsonl")
+
+
+def _load_golden():
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+GOLDEN = _load_golden()
+
+
+@pytest.mark.parametrize("case", GOLDEN[:40], ids=lambda case: repr(case["input"])[:40])
+def test_normalize_text_vi_samples(case):
+    assert normalize_text_vi(case["input"]) == case["expected"]
+
+
+def test_normalize_text_vi_golden():
+    mismatches = [case for case in GOLDEN if normalize_text_vi(case["input"]) != case["expected"]]
+    assert not mismatches, f"{len(mismatches)}/{len(GOLDEN)} mismatches, e.g. {mismatches[:3]!r}"
+
+
+def test_normalize_texts_vi_keeps_order():
+    inputs = [case["input"] for case in GOLDEN]
+    assert normalize_texts_vi(inputs) == [case["expected"] for case in GOLDEN]
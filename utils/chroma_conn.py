@@ -0,0 +1,16 @@
+import os
+from functools import lru_cache
+
+import chromadb
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@lru_cache(maxsize=1)
+def get_chroma_client() -> chromadb.ClientAPI:
+    """
+    Singleton PersistentClient dùng chung cho chat (RAGService) và ingest,
+    tránh mở 2 client trên cùng thư mục CHROMADB_PATH.
+    """
+    return chromadb.PersistentClient(path=os.getenv("CHROMADB_PATH", "./chroma_db"))
@@ -50,6 +50,17 @@ class MongodbConnection:
     def get_mongo_client(self):
         return self.mongo_client
 
+    async def check_connection(self) -> bool:
+        """Ping MongoDB server (AsyncIOMotorClient chỉ kết nối thật khi có lệnh đầu tiên)"""
+        if not self.is_connected or self.mongo_client is None:
+            return False
+        try:
+            await self.mongo_client.admin.command("ping")
+            return True
+        except Exception as e:
+            print(f"Error pinging MongoDB: {e}")
+            return False
+
 
 @lru_cache(maxsize=1)
 def get_mongodb_connection() -> MongodbConnection:
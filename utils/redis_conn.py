@@ -1,7 +1,10 @@
 # utils/redis_cache.py
 import redis
+import base64
+import hashlib
 import json
 import os
+import numpy as np
 from functools import lru_cache
 from typing import Optional
 from dotenv import load_dotenv
@@ -106,11 +109,24 @@ class RedisConnection:
         return self.get_conversation_messages(conversation_id)
     
     # Cache embeddings (query → embedding)
-    def cache_query_embedding(self, query: str, embedding: list, ttl=None):
+    # Lưu float16 (base64) thay vì JSON float: 1024-d chỉ ~2.7 KB thay vì ~20 KB.
+    # Key dùng sha1 (hash() của Python đổi theo process) + model_key để không lẫn giữa các model/backend
+    @staticmethod
+    def _query_embedding_key(query: str, model_key: str = "") -> str:
+        digest = hashlib.sha1(f"{model_key}\x00{query}".encode("utf-8")).hexdigest()
+        return f"embed:query:{digest}"
+
+    def cache_query_embedding(self, query: str, embedding, ttl=None, model_key: str = ""):
         if ttl is None:
             ttl = int(os.getenv("CACHE_EMBEDDING_TTL", 1800))
-        key = f"embed:query:{hash(query)}"
-        self.client.setex(key, ttl, json.dumps(embedding))
+        payload = base64.b64encode(np.asarray(embedding, dtype=np.float16).tobytes()).decode("ascii")
+        self.client.setex(self._query_embedding_key(query, model_key), ttl, payload)
+
+    def get_query_embedding(self, query: str, model_key: str = "") -> Optional[np.ndarray]:
+        payload = self.client.get(self._query_embedding_key(query, model_key))
+        if not payload:
+            return None
+        return np.frombuffer(base64.b64decode(payload), dtype=np.float16).astype(np.float32)
     
     # Rate limiting
     def check_rate_limit(self, user_id: str, limit=None, window=None) -> bool: